@@ -0,0 +1,145 @@
+"""
+团队/成员聚合统计 - 随记录写入增量维护
+按 (团队, 成员, 创建日期) 分桶,时间窗口统计只需累加窗口内的日桶
+"""
+
+from models import NegotiationRecord, VisitType, NegotiationOutcome, TodoStatus
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional
+
+
+class MemberStats:
+    """成员统计量(可加减,用于增量维护)"""
+
+    __slots__ = (
+        "visit_count", "negotiation_count", "success_count",
+        "total_score", "score_count",
+        "cost_optimization", "cost_reduction_count",
+        "total_todos", "completed_todos", "pending_todos"
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+        self.cost_optimization = 0.0
+
+    def add_record(self, record: NegotiationRecord, sign: int = 1):
+        """累加(sign=1)或扣减(sign=-1)一条记录的贡献"""
+        self.visit_count += sign
+        if record.visit_type == VisitType.NEGOTIATION:
+            self.negotiation_count += sign
+        if record.outcome == NegotiationOutcome.SUCCESS:
+            self.success_count += sign
+        if record.score:
+            self.total_score += sign * record.score
+            self.score_count += sign
+
+        # 成本优化(只统计降低的部分)
+        if record.metrics and record.metrics.cost_before and record.metrics.cost_after:
+            reduction = record.metrics.cost_before - record.metrics.cost_after
+            if reduction > 0:
+                self.cost_optimization += sign * reduction
+                self.cost_reduction_count += sign
+
+        # 待办事项
+        for todo in record.todos:
+            self.total_todos += sign
+            if todo.status == TodoStatus.COMPLETED:
+                self.completed_todos += sign
+            elif todo.status == TodoStatus.PENDING:
+                self.pending_todos += sign
+
+    def merge(self, other: "MemberStats"):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def is_empty(self) -> bool:
+        return self.visit_count == 0
+
+
+def stats_from_records(records: Iterable[NegotiationRecord]) -> Dict[str, MemberStats]:
+    """直接从记录计算各成员统计(无增量索引的存储后端使用)"""
+    stats: Dict[str, MemberStats] = {}
+    for record in records:
+        stats.setdefault(record.user_id, MemberStats()).add_record(record)
+    return stats
+
+
+class TeamAggregates:
+    """
+    团队聚合存储
+
+    totals: 团队 -> 成员 -> 全量统计
+    daily: 团队 -> 成员 -> 日期 -> 当日统计
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, MemberStats]] = {}
+        self.daily: Dict[str, Dict[str, Dict[date, MemberStats]]] = {}
+        self.last_day: Optional[date] = None
+
+    def clear(self):
+        self.totals.clear()
+        self.daily.clear()
+        self.last_day = None
+
+    def add(self, record: NegotiationRecord):
+        self._apply(record, 1)
+
+    def remove(self, record: NegotiationRecord):
+        self._apply(record, -1)
+
+    def _apply(self, record: NegotiationRecord, sign: int):
+        day = record.created_at.date()
+        if sign > 0 and (self.last_day is None or day > self.last_day):
+            self.last_day = day
+
+        totals = self.totals.setdefault(record.team_id, {})
+        total = totals.setdefault(record.user_id, MemberStats())
+        total.add_record(record, sign)
+        if total.is_empty():
+            del totals[record.user_id]
+
+        days = self.daily.setdefault(record.team_id, {}).setdefault(record.user_id, {})
+        bucket = days.setdefault(day, MemberStats())
+        bucket.add_record(record, sign)
+        if bucket.is_empty():
+            del days[day]
+
+    def member_stats(self, team_id: str, after_day: Optional[date] = None) -> Dict[str, MemberStats]:
+        """
+        获取团队各成员统计
+
+        Args:
+            team_id: 团队ID
+            after_day: 只统计创建日期晚于该日的记录;None表示全量
+
+        Returns:
+            成员ID -> 统计量(新对象,调用方可修改)
+        """
+        result: Dict[str, MemberStats] = {}
+
+        if after_day is None:
+            for user_id, total in self.totals.get(team_id, {}).items():
+                result[user_id] = MemberStats()
+                result[user_id].merge(total)
+            return result
+
+        if self.last_day is None or after_day >= self.last_day:
+            return result
+
+        window_days = [after_day + timedelta(days=i) for i in range(1, (self.last_day - after_day).days + 1)]
+        for user_id, days in self.daily.get(team_id, {}).items():
+            stats = MemberStats()
+            if len(days) < len(window_days):
+                for day, bucket in days.items():
+                    if day > after_day:
+                        stats.merge(bucket)
+            else:
+                for day in window_days:
+                    bucket = days.get(day)
+                    if bucket is not None:
+                        stats.merge(bucket)
+            if not stats.is_empty():
+                result[user_id] = stats
+        return result
@@ -3,17 +3,26 @@
 """
 
 from fastapi import HTTPException, Depends, Header
-from typing import Optional, List
+from typing import Optional, List, Dict, Set, Tuple
+from collections import OrderedDict
 from models import User, Role
 import jwt
+import threading
+import time
 from datetime import datetime, timedelta
 
+import database
+
 
 # JWT配置
 SECRET_KEY = "your-secret-key-here-change-in-production"  # 生产环境需要更换
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8小时
 
+# 已验证Token缓存
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL_SECONDS = 300  # 多worker时其他进程的用户变更最多延迟生效这么久
+
 
 # ===========================
 # 权限矩阵
@@ -74,18 +83,94 @@ def decode_access_token(token: str) -> dict:
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token已过期")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="无效的Token")
 
 
+# ===========================
+# 已验证Token缓存
+# ===========================
+
+# token -> (完整用户对象, 缓存过期时间戳)
+_TOKEN_CACHE: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+# 用户ID -> 该用户已缓存的token,用于用户变更时失效
+_TOKENS_BY_USER: Dict[str, Set[str]] = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(token: str) -> Optional[User]:
+    with _TOKEN_CACHE_LOCK:
+        entry = _TOKEN_CACHE.get(token)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            _cache_drop(token)
+            return None
+        _TOKEN_CACHE.move_to_end(token)
+        return user
+
+
+def _cache_put(token: str, user: User, expires_at: float):
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[token] = (user, min(expires_at, time.time() + TOKEN_CACHE_TTL_SECONDS))
+        _TOKEN_CACHE.move_to_end(token)
+        _TOKENS_BY_USER.setdefault(user.user_id, set()).add(token)
+        while len(_TOKEN_CACHE) > TOKEN_CACHE_SIZE:
+            _cache_drop(next(iter(_TOKEN_CACHE)))
+
+
+def _cache_drop(token: str):
+    """移除缓存项(调用方持有锁)"""
+    entry = _TOKEN_CACHE.pop(token, None)
+    if entry is None:
+        return
+    tokens = _TOKENS_BY_USER.get(entry[0].user_id)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del _TOKENS_BY_USER[entry[0].user_id]
+
+
+def invalidate_user(user_id: str):
+    """用户信息变更后失效其所有已缓存的token"""
+    with _TOKEN_CACHE_LOCK:
+        for token in list(_TOKENS_BY_USER.get(user_id, ())):
+            _cache_drop(token)
+
+
+database.USER_LISTENERS.append(invalidate_user)
+
+
 # ===========================
 # 依赖注入函数
 # ===========================
 
+def authenticate_token(token: str) -> User:
+    """
+    验证Token并返回用户(WebSocket等无法使用请求头依赖的场景直接调用)
+    已验证的Token缓存到过期为止,命中时跳过验签和对象构建
+    """
+    user = _cache_get(token)
+    if user is not None:
+        return user
+
+    # 解码token
+    payload = decode_access_token(token)
+
+    # 从用户库获取完整用户信息
+    user = database.get_user_by_id(payload["user_id"])
+    if user is None:
+        raise HTTPException(status_code=401, detail="用户不存在")
+
+    _cache_put(token, user, float(payload["exp"]))
+    return user
+
+
 async def get_current_user(authorization: Optional[str] = Header(None)) -> User:
     """
     获取当前登录用户
-    从请求头中提取Token并验证
+    从请求头中提取Token并验证,用户信息从用户库补全
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="未提供认证信息")
@@ -96,21 +181,10 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> User:
         if scheme.lower() != "bearer":
             raise HTTPException(status_code=401, detail="无效的认证方案")
 
-        # 解码token
-        payload = decode_access_token(token)
-
-        # 构建用户对象
-        user = User(
-            user_id=payload["user_id"],
-            name=payload.get("name", ""),  # 从数据库获取完整信息
-            role=Role(payload["role"]),
-            team_id=payload["team_id"],
-            department_id=payload["department_id"],
-            manager_id=payload.get("manager_id")
-        )
-
-        return user
+        return authenticate_token(token)
 
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=401, detail="无效的Token格式")
     except Exception as e:
@@ -0,0 +1,41 @@
+"""
+JWT认证基准: 签发、验签,以及 authenticate_token 的冷/热路径
+"""
+
+import pytest
+
+import auth
+
+
+def _token(user):
+    return auth.create_access_token(user.user_id, user.role.value, user.team_id, user.department_id)
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_create_access_token(benchmark, dataset):
+    benchmark(_token, dataset.employee)
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_decode_access_token(benchmark, dataset):
+    token = _token(dataset.employee)
+    assert benchmark(auth.decode_access_token, token)["user_id"] == dataset.employee.user_id
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_authenticate_token_cold(benchmark, dataset):
+    """每次都未命中Token缓存: 验签 + 查用户"""
+    token = _token(dataset.employee)
+
+    def run():
+        auth._cache_drop(token)
+        return auth.authenticate_token(token)
+
+    assert benchmark(run).user_id == dataset.employee.user_id
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_authenticate_token_cached(benchmark, dataset):
+    token = _token(dataset.employee)
+    auth.authenticate_token(token)
+    assert benchmark(auth.authenticate_token, token).user_id == dataset.employee.user_id
@@ -0,0 +1,51 @@
+"""
+看板基准: 团队看板、部门看板的完整计算,以及缓存命中路径
+"""
+
+import asyncio
+
+import pytest
+
+from routes_dashboard import (
+    DASHBOARD_CACHE, build_team_dashboard, build_department_dashboard,
+    get_team_dashboard, get_department_dashboard
+)
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.benchmark(group="team_dashboard")
+def bench_build_team_dashboard(benchmark, dataset):
+    benchmark(build_team_dashboard, dataset.team.team_id)
+
+
+@pytest.mark.benchmark(group="team_dashboard")
+def bench_get_team_dashboard_cached(benchmark, dataset, loop):
+    DASHBOARD_CACHE.clear()
+
+    def run():
+        return loop.run_until_complete(get_team_dashboard(
+            dataset.team.team_id, current_user=dataset.leader, if_none_match=None))
+
+    assert benchmark(run).status_code == 200
+
+
+@pytest.mark.benchmark(group="department_dashboard")
+def bench_build_department_dashboard(benchmark, dataset):
+    benchmark(build_department_dashboard, dataset.department_id)
+
+
+@pytest.mark.benchmark(group="department_dashboard")
+def bench_get_department_dashboard_cached(benchmark, dataset, loop):
+    DASHBOARD_CACHE.clear()
+
+    def run():
+        return loop.run_until_complete(get_department_dashboard(
+            dataset.department_id, current_user=dataset.director, if_none_match=None))
+
+    assert benchmark(run).status_code == 200
@@ -0,0 +1,50 @@
+"""
+记录内存占用: pydantic 模型与紧凑表示(CompactRecord)的每条记录字节数
+结果写入基准的 extra_info(bytes_per_record)并在结束时汇总输出,计时部分为构建耗时
+"""
+
+import gc
+import itertools
+import tracemalloc
+
+import pytest
+
+from compact_record import CompactRecord
+
+
+# 每次测量使用的记录条数(每条记录的占用与总规模基本无关)
+MEMORY_SAMPLE = 20000
+
+
+def _measure(build) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size / len(kept)
+
+
+def _sample(dataset):
+    return itertools.islice(dataset.data.records(), MEMORY_SAMPLE)
+
+
+@pytest.mark.benchmark(group="record_memory")
+def bench_record_memory_pydantic(benchmark, dataset, report):
+    per_record = benchmark.pedantic(lambda: _measure(lambda: list(_sample(dataset))), rounds=1, iterations=1)
+    benchmark.extra_info["bytes_per_record"] = round(per_record)
+    report("bytes_per_record", round(per_record), "B")
+
+
+@pytest.mark.benchmark(group="record_memory")
+def bench_record_memory_compact(benchmark, dataset, report):
+    """模型转换后即释放,只计紧凑表示(字符串池中已有的取值不重复计入)"""
+    def build():
+        return [CompactRecord.from_model(record) for record in _sample(dataset)]
+
+    per_record = benchmark.pedantic(lambda: _measure(build), rounds=1, iterations=1)
+    benchmark.extra_info["bytes_per_record"] = round(per_record)
+    report("bytes_per_record", round(per_record), "B")
@@ -0,0 +1,104 @@
+"""
+记录查询基准: get_records 各类过滤条件、list_records 分页、批量获取、到期待办
+"""
+
+import asyncio
+
+import pytest
+import database
+from auth import build_query_filter
+from models import BatchGetRecordsRequest
+from routes_records import list_records, list_due_todos, batch_get_records, encode_cursor
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_by_user(benchmark, dataset):
+    records = benchmark(database.get_records, {"user_id": dataset.employee.user_id})
+    assert records
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_by_team(benchmark, dataset):
+    records = benchmark(database.get_records, {"team_id": dataset.team.team_id})
+    assert records
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_by_department(benchmark, dataset):
+    records = benchmark(database.get_records, {"department_id": dataset.department_id})
+    assert records
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_by_funder(benchmark, dataset):
+    records = benchmark(database.get_records, {"funder_name": dataset.funder_name})
+    assert records
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_team_and_funder(benchmark, dataset):
+    benchmark(database.get_records, {"team_id": dataset.team.team_id, "funder_name": dataset.funder_name})
+
+
+@pytest.mark.benchmark(group="get_records")
+def bench_get_records_unindexed_filter(benchmark, dataset):
+    """无索引字段的过滤(全表扫描)"""
+    benchmark(database.get_records, {"department_id": dataset.department_id, "scene": "deposit"})
+
+
+@pytest.mark.benchmark(group="list_records")
+def bench_list_records_first_page(benchmark, dataset, loop):
+    def run():
+        return loop.run_until_complete(list_records(
+            current_user=dataset.director, user_id=None, team_id=None,
+            funder_name=None, limit=50, cursor=None))
+
+    assert benchmark(run).status_code == 200
+
+
+@pytest.mark.benchmark(group="list_records")
+def bench_list_records_deep_page(benchmark, dataset, loop):
+    """游标翻页到部门记录的中间位置"""
+    filter_dict = build_query_filter(dataset.director)
+    total = len(database.get_records(filter_dict))
+    records, _ = database.get_records_page(filter_dict, total // 2)
+    last = records[-1]
+    cursor = encode_cursor((last.created_at, last.record_id))
+
+    def run():
+        return loop.run_until_complete(list_records(
+            current_user=dataset.director, user_id=None, team_id=None,
+            funder_name=None, limit=50, cursor=cursor))
+
+    assert benchmark(run).status_code == 200
+
+
+@pytest.mark.benchmark(group="batch_get")
+def bench_batch_get_records(benchmark, dataset, loop):
+    """部门负责人一次获取200条记录详情"""
+    record_ids = [record.record_id for record in database.get_records_page(
+        build_query_filter(dataset.director), 200)[0]]
+    request = BatchGetRecordsRequest(record_ids=record_ids)
+
+    def run():
+        return loop.run_until_complete(batch_get_records(request=request, current_user=dataset.director))
+
+    assert benchmark(run).status_code == 200
+
+
+@pytest.mark.benchmark(group="due_todos")
+def bench_due_todos_department(benchmark, dataset, loop):
+    """部门负责人查看逾期/即将到期待办"""
+    def run():
+        return loop.run_until_complete(list_due_todos(
+            current_user=dataset.director, team_id=None, user_id=None, days=7, limit=50))
+
+    result = benchmark(run)
+    assert len(result["overdue"]) == 50
@@ -0,0 +1,31 @@
+"""
+持久化基准: 内存后端从快照重启(加载快照并重建全部索引)
+"""
+
+import pytest
+
+import database
+from storage_journal import Journal
+
+
+@pytest.fixture
+def snapshot_dir(dataset, tmp_path):
+    """把当前加载的数据集写为快照"""
+    journal = Journal(str(tmp_path), fsync=False, snapshot_every=0)
+    records = [record.to_model() for record in database.get_records()]
+    journal.write_snapshot(0, list(database.TEAMS_DB.values()), list(database.USERS_DB.values()),
+                           records, len(records))
+    yield str(tmp_path)
+    if database._journal is not None:
+        database._journal.close()
+        database._journal = None
+
+
+@pytest.mark.benchmark(group="restart")
+def bench_restart_from_snapshot(benchmark, dataset, snapshot_dir):
+    """清空存储后加载快照(记录按批写入),结束时存储内容与重启前一致"""
+    def restart():
+        database.open_journal(Journal(snapshot_dir, fsync=False, snapshot_every=0))
+
+    benchmark.pedantic(restart, setup=database.reset_storage, rounds=1, iterations=1)
+    assert len(database.RECORD_LOCATIONS) == dataset.n_records
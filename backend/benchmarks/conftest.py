@@ -0,0 +1,83 @@
+"""
+基准测试公共夹具
+数据集按 --bench-sizes 指定的规模逐个加载到内存存储,同一规模的基准共用一份数据
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from models import Role  # noqa: E402
+from synthetic_data import SyntheticDataset, load_dataset, SYNTHETIC_SEED  # noqa: E402
+
+
+DEFAULT_SIZES = "1000,10000"
+
+# 非计时类结果(如每条记录内存占用),测试结束时汇总输出
+_REPORT = []
+
+
+def pytest_addoption(parser):
+    parser.addoption("--bench-sizes", default=DEFAULT_SIZES,
+                     help="逗号分隔的记录规模,如 1000,10000,100000")
+    parser.addoption("--bench-seed", type=int, default=SYNTHETIC_SEED, help="数据生成种子")
+
+
+def pytest_generate_tests(metafunc):
+    if "dataset" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("--bench-sizes").split(",") if size]
+        metafunc.parametrize("dataset", sizes, indirect=True, scope="session", ids=lambda n: f"n={n}")
+
+
+class LoadedDataset:
+    """已加载到存储的数据集及基准常用的样本对象"""
+
+    def __init__(self, data: SyntheticDataset):
+        self.data = data
+        self.n_records = data.n_records
+        self.department_id = data.departments[0]
+        self.team = next(team for team in data.teams if team.department_id == self.department_id)
+        self.director = next(user for user in data.users
+                             if user.role == Role.DIRECTOR and user.department_id == self.department_id)
+        self.leader = database.get_user_by_id(self.team.leader_id)
+        # 记录数最多的一线人员和资方,代表最重的单用户/单资方查询
+        self.employee = database.get_user_by_id(_busiest("user_id"))
+        self.funder_name = _busiest("funder_name")
+
+
+def _busiest(field: str) -> str:
+    """记录数最多的字段值(按分片路由表中各部门的记录数求和)"""
+    counts = {
+        key[1]: sum(departments.values())
+        for key, departments in database.SCOPE_SHARDS.items() if key[0] == field
+    }
+    return max(counts, key=counts.get)
+
+
+@pytest.fixture
+def report(request):
+    """记录一项非计时结果: report(名称, 数值, 单位)"""
+    def add(name, value, unit):
+        _REPORT.append((request.node.name, name, value, unit))
+    return add
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _REPORT:
+        return
+    terminalreporter.section("extra results")
+    for test, name, value, unit in _REPORT:
+        terminalreporter.write_line(f"{test:<50} {name} = {value} {unit}")
+
+
+@pytest.fixture(scope="session")
+def dataset(request):
+    data = SyntheticDataset(request.param, seed=request.config.getoption("--bench-seed"))
+    database.reset_storage()
+    load_dataset(data)
+    yield LoadedDataset(data)
+    database.reset_storage()
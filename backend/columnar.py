@@ -0,0 +1,248 @@
+"""
+列式分析存储 - 记录分片的 NumPy 镜像
+重复字符串做字典编码(int32),枚举存为编码(int8),指标为float64(缺失为NaN),时间为datetime64,
+部门看板的统计用向量化掩码和 bincount 计算,不再逐条访问pydantic对象
+"""
+
+from models import NegotiationRecord, VisitType, NegotiationScene, NegotiationOutcome
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+
+SCENES = list(NegotiationScene)
+OUTCOMES = list(NegotiationOutcome)
+VISIT_TYPES = list(VisitType)
+
+SCENE_CODES = {scene: i for i, scene in enumerate(SCENES)}
+OUTCOME_CODES = {outcome: i for i, outcome in enumerate(OUTCOMES)}
+VISIT_TYPE_CODES = {visit_type: i for i, visit_type in enumerate(VISIT_TYPES)}
+SUCCESS = OUTCOME_CODES[NegotiationOutcome.SUCCESS]
+
+
+class Dictionary:
+    """字符串字典编码"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+# 列名 -> dtype
+COLUMNS = {
+    "alive": np.bool_,
+    "department": np.int32,
+    "team": np.int32,
+    "user": np.int32,
+    "user_name": np.int32,
+    "funder": np.int32,
+    "scene": np.int8,
+    "outcome": np.int8,
+    "visit_type": np.int8,
+    "cost_before": np.float64,
+    "cost_after": np.float64,
+    "volume_commitment": np.float64,
+    "created_at": "datetime64[us]",
+    "visit_date": "datetime64[us]",
+}
+
+
+def _float(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def _first_seen_order(codes: np.ndarray) -> np.ndarray:
+    """按首次出现的顺序返回去重后的编码(与逐条遍历时dict的插入顺序一致)"""
+    unique, first = np.unique(codes, return_index=True)
+    return unique[np.argsort(first, kind="stable")]
+
+
+class ColumnarStore:
+    """
+    列式镜像,作为记录观察者注册,随记录写入同步更新
+    记录更新时原地覆盖所在行,行号与写入顺序一致;
+    记录移出时只标记死行,死行多于存活行时(扩容前或统计前)压缩,保持存活行的相对顺序
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.dead = 0
+        self.rows: Dict[str, int] = {}
+        self.departments = Dictionary()
+        self.teams = Dictionary()
+        self.users = Dictionary()
+        self.user_names = Dictionary()
+        self.funders = Dictionary()
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(self.capacity, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+
+    @classmethod
+    def from_records(cls, records: Iterable[NegotiationRecord]) -> "ColumnarStore":
+        """从记录批量构建(无增量镜像的存储后端使用)"""
+        store = cls()
+        for record in records:
+            store.add(record)
+        return store
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[:len(column)] = column
+            self.columns[name] = grown
+
+    def _compact(self):
+        """丢弃死行并重新编号,rows 的插入顺序即行号顺序,压缩后顺序不变"""
+        alive = self._view("alive")
+        live_ids = [record_id for record_id, row in self.rows.items() if alive[row]]
+        keep = np.flatnonzero(alive)
+        capacity = max(self.capacity, len(keep) * 2)
+        for name, column in self.columns.items():
+            compacted = np.zeros(capacity, dtype=column.dtype)
+            compacted[:len(keep)] = column[keep]
+            self.columns[name] = compacted
+
+        self.rows = {record_id: i for i, record_id in enumerate(live_ids)}
+        self.size = len(keep)
+        self.dead = 0
+
+    def _maybe_compact(self) -> bool:
+        if self.dead > self.size - self.dead:
+            self._compact()
+            return True
+        return False
+
+    def add(self, record: NegotiationRecord):
+        row = self.rows.get(record.record_id)
+        if row is None:
+            if self.size == len(self.columns["alive"]) and not self._maybe_compact():
+                self._grow()
+            row = self.rows[record.record_id] = self.size
+            self.size += 1
+        elif not self.columns["alive"][row]:
+            self.dead -= 1
+
+        metrics = record.metrics
+        c = self.columns
+        c["alive"][row] = True
+        c["department"][row] = self.departments.encode(record.department_id)
+        c["team"][row] = self.teams.encode(record.team_id)
+        c["user"][row] = self.users.encode(record.user_id)
+        c["user_name"][row] = self.user_names.encode(record.user_name)
+        c["funder"][row] = self.funders.encode(record.funder_name)
+        c["scene"][row] = SCENE_CODES[record.scene]
+        c["outcome"][row] = OUTCOME_CODES[record.outcome]
+        c["visit_type"][row] = VISIT_TYPE_CODES[record.visit_type]
+        c["cost_before"][row] = _float(metrics.cost_before if metrics else None)
+        c["cost_after"][row] = _float(metrics.cost_after if metrics else None)
+        c["volume_commitment"][row] = _float(metrics.volume_commitment if metrics else None)
+        c["created_at"][row] = np.datetime64(record.created_at, "us")
+        c["visit_date"][row] = np.datetime64(record.visit_date, "us")
+
+    def remove(self, record: NegotiationRecord):
+        row = self.rows.get(record.record_id)
+        if row is not None and self.columns["alive"][row]:
+            self.columns["alive"][row] = False
+            self.dead += 1
+
+    def _view(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.size]
+
+    def department_analytics(self, department_id: str, start: datetime) -> Dict[str, Any]:
+        """
+        计算部门看板所需的统计
+
+        Args:
+            department_id: 部门ID
+            start: 近期窗口起点(created_at >= start)
+
+        Returns:
+            {
+                "total_records", "total_cost_saved", "earliest", "recent_visits",
+                "top_performer", "active_funders",
+                "teams": {team_id: {"visit_count", "success_count", "cost_optimization"}},
+                "scenes": [(scene, total, success)]
+            }
+            scenes 按首次出现顺序排列
+        """
+        result = {
+            "total_records": 0, "total_cost_saved": 0.0, "earliest": None, "recent_visits": 0,
+            "top_performer": None, "active_funders": 0, "teams": {}, "scenes": []
+        }
+
+        code = self.departments.codes.get(department_id)
+        if code is None:
+            return result
+
+        self._maybe_compact()
+
+        mask = self._view("alive") & (self._view("department") == code)
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return result
+
+        created_at = self._view("created_at")[rows]
+        recent = created_at >= np.datetime64(start, "us")
+        success = self._view("outcome")[rows] == SUCCESS
+
+        # 成本降低(前后成本都非空且非0,只计正值)
+        cost_before = self._view("cost_before")[rows]
+        cost_after = self._view("cost_after")[rows]
+        volume = self._view("volume_commitment")[rows]
+        has_cost = (np.nan_to_num(cost_before) != 0) & (np.nan_to_num(cost_after) != 0)
+        reduction = np.where(has_cost, np.nan_to_num(cost_before - cost_after), 0.0)
+        reduction = np.where(reduction > 0, reduction, 0.0)
+        volume = np.nan_to_num(volume)
+
+        result["total_records"] = int(rows.size)
+        result["total_cost_saved"] = float((reduction * volume / 100).sum())
+        result["earliest"] = created_at.min().astype(datetime)
+        result["recent_visits"] = int(recent.sum())
+
+        # top performer: 近期成功次数最多的人(并列时取最先出现者)
+        successful = self._view("user_name")[rows][recent & success]
+        if successful.size:
+            counts = np.bincount(successful, minlength=len(self.user_names))
+            order = _first_seen_order(successful)
+            result["top_performer"] = self.user_names.values[int(order[np.argmax(counts[order])])]
+
+        funders = self._view("funder")[rows]
+        result["active_funders"] = int(np.unique(funders[recent]).size)
+
+        # 团队对比(近期)
+        teams = self._view("team")[rows][recent]
+        n_teams = len(self.teams)
+        visits = np.bincount(teams, minlength=n_teams)
+        successes = np.bincount(teams, weights=success[recent], minlength=n_teams)
+        cost_opt = np.bincount(teams, weights=reduction[recent], minlength=n_teams)
+        for team_code in np.flatnonzero(visits):
+            result["teams"][self.teams.values[team_code]] = {
+                "visit_count": int(visits[team_code]),
+                "success_count": int(successes[team_code]),
+                "cost_optimization": float(cost_opt[team_code])
+            }
+
+        # 场景成功率(近期)
+        scenes = self._view("scene")[rows][recent]
+        scene_total = np.bincount(scenes, minlength=len(SCENES))
+        scene_success = np.bincount(scenes, weights=success[recent], minlength=len(SCENES))
+        for scene_code in _first_seen_order(scenes):
+            result["scenes"].append(
+                (SCENES[scene_code].value, int(scene_total[scene_code]), int(scene_success[scene_code]))
+            )
+
+        return result
@@ -0,0 +1,161 @@
+"""
+谈判记录的紧凑内存表示
+内存存储中每条记录不再保存完整的 pydantic 模型(每个实例及嵌套的待办、参会人、指标都带 __dict__ 和字段集合),
+改为 __slots__ 对象: 取值有限、反复出现的字符串(工号、姓名、团队、部门、资方、话术ID等)经字符串池去重后共享同一对象,
+参会人姓名和各类自由文本直接保存(字符串池只增不减,高基数的值入池会让池随写入无限增长),
+枚举字段保存枚举成员本身(全局单例),列表字段存为元组
+属性名与 NegotiationRecord 一致,内部只读访问可直接使用;需要 pydantic 模型时(接口响应、持久化)调用 to_model()
+"""
+
+from models import (
+    NegotiationRecord, TodoItem, NegotiationMetrics, Participant
+)
+from typing import Dict, Optional, Tuple
+
+
+class StringPool:
+    """字符串池(字典编码): 相同内容的字符串只保留一个对象,记录中保存对它的引用"""
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+
+    def __call__(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+# 全局字符串池: 条目不回收,只收录取值有限的字段(工号、姓名、团队、部门、资方、参会人公司/职位、话术ID),
+# 参会人姓名、目标、要点、纪要等高基数文本不入池
+STRING_POOL = StringPool()
+
+
+class CompactTodo:
+    __slots__ = ("content", "status", "deadline", "created_at", "completed_at")
+
+    def __init__(self, todo: TodoItem):
+        self.content = todo.content
+        self.status = todo.status
+        self.deadline = todo.deadline
+        self.created_at = todo.created_at
+        self.completed_at = todo.completed_at
+
+    def to_model(self) -> TodoItem:
+        return TodoItem.model_construct(
+            content=self.content, status=self.status, deadline=self.deadline,
+            created_at=self.created_at, completed_at=self.completed_at
+        )
+
+
+class CompactMetrics:
+    __slots__ = ("cost_before", "cost_after", "deposit_before", "deposit_after", "volume_commitment")
+
+    def __init__(self, metrics: NegotiationMetrics):
+        self.cost_before = metrics.cost_before
+        self.cost_after = metrics.cost_after
+        self.deposit_before = metrics.deposit_before
+        self.deposit_after = metrics.deposit_after
+        self.volume_commitment = metrics.volume_commitment
+
+    def to_model(self) -> NegotiationMetrics:
+        return NegotiationMetrics.model_construct(
+            cost_before=self.cost_before, cost_after=self.cost_after,
+            deposit_before=self.deposit_before, deposit_after=self.deposit_after,
+            volume_commitment=self.volume_commitment
+        )
+
+
+class CompactParticipant:
+    __slots__ = ("name", "role", "company", "is_our_side")
+
+    def __init__(self, participant: Participant):
+        self.name = participant.name
+        self.role = STRING_POOL(participant.role)
+        self.company = STRING_POOL(participant.company)
+        self.is_our_side = participant.is_our_side
+
+    def to_model(self) -> Participant:
+        return Participant.model_construct(
+            name=self.name, role=self.role, company=self.company, is_our_side=self.is_our_side
+        )
+
+
+class CompactRecord:
+    """
+    谈判记录的内存表示
+    视为只读: 修改记录时由存储层基于 to_model() 的结果生成新的 CompactRecord 整体替换
+    """
+
+    __slots__ = (
+        "record_id", "user_id", "user_name", "team_id", "department_id",
+        "funder_name", "visit_type", "visit_date", "scene",
+        "objective", "key_points", "our_position", "their_position", "result",
+        "metrics", "outcome", "score", "todos", "minutes",
+        "scripts_used", "scripts_effective", "participants", "created_at", "updated_at"
+    )
+
+    key_points: Tuple[str, ...]
+    todos: Tuple[CompactTodo, ...]
+    participants: Tuple[CompactParticipant, ...]
+    metrics: Optional[CompactMetrics]
+
+    @classmethod
+    def from_model(cls, record: NegotiationRecord) -> "CompactRecord":
+        compact = cls.__new__(cls)
+        compact.record_id = record.record_id
+        compact.user_id = STRING_POOL(record.user_id)
+        compact.user_name = STRING_POOL(record.user_name)
+        compact.team_id = STRING_POOL(record.team_id)
+        compact.department_id = STRING_POOL(record.department_id)
+        compact.funder_name = STRING_POOL(record.funder_name)
+        compact.visit_type = record.visit_type
+        compact.visit_date = record.visit_date
+        compact.scene = record.scene
+        compact.objective = record.objective
+        compact.key_points = tuple(record.key_points)
+        compact.our_position = record.our_position
+        compact.their_position = record.their_position
+        compact.result = record.result
+        compact.metrics = CompactMetrics(record.metrics) if record.metrics is not None else None
+        compact.outcome = record.outcome
+        compact.score = record.score
+        compact.todos = tuple(CompactTodo(todo) for todo in record.todos)
+        compact.minutes = record.minutes
+        compact.scripts_used = tuple(STRING_POOL(script) for script in record.scripts_used)
+        compact.scripts_effective = tuple(STRING_POOL(script) for script in record.scripts_effective)
+        compact.participants = tuple(CompactParticipant(p) for p in record.participants)
+        compact.created_at = record.created_at
+        compact.updated_at = record.updated_at
+        return compact
+
+    def to_model(self) -> NegotiationRecord:
+        """构建 pydantic 模型(数据入库时已校验,这里不再重复校验)"""
+        return NegotiationRecord.model_construct(
+            record_id=self.record_id,
+            user_id=self.user_id,
+            user_name=self.user_name,
+            team_id=self.team_id,
+            department_id=self.department_id,
+            funder_name=self.funder_name,
+            visit_type=self.visit_type,
+            visit_date=self.visit_date,
+            scene=self.scene,
+            objective=self.objective,
+            key_points=list(self.key_points),
+            our_position=self.our_position,
+            their_position=self.their_position,
+            result=self.result,
+            metrics=self.metrics.to_model() if self.metrics is not None else None,
+            outcome=self.outcome,
+            score=self.score,
+            todos=[todo.to_model() for todo in self.todos],
+            minutes=self.minutes,
+            scripts_used=list(self.scripts_used),
+            scripts_effective=list(self.scripts_effective),
+            participants=[p.to_model() for p in self.participants],
+            created_at=self.created_at,
+            updated_at=self.updated_at
+        )
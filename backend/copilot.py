@@ -0,0 +1,164 @@
+"""
+实时谈判助手会话
+每场谈判一个会话,服务端保留最近的对话窗口,转写片段到达时重新计算并推送话术推荐
+会话存于 LRU 存储中,超过空闲时间自动失效,断线后可凭 session_id 恢复
+"""
+
+from playbook import PlaybookIndex, script_response
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import re
+import threading
+import time
+import uuid
+
+
+# 会话配置
+COPILOT_MAX_SESSIONS = 1000
+COPILOT_IDLE_SECONDS = 600      # 空闲超时(秒),同时作为WebSocket接收超时
+COPILOT_WINDOW_SIZE = 20        # 服务端保留的对话片段数
+COPILOT_QUERY_FRAGMENTS = 3     # 参与话术匹配的最近对方发言数
+COPILOT_TOP_K = 3
+
+# 对方给出具体数字(比例、金额)时提示
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?\s*(?:%|个点|万|亿)")
+
+
+class CopilotSession:
+    """单场谈判的会话状态"""
+
+    __slots__ = ("session_id", "user_id", "scene", "window", "partial", "last_active", "last_pushed")
+
+    def __init__(self, session_id: str, user_id: str, scene: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.scene = scene
+        self.window: Deque[Tuple[str, str]] = deque(maxlen=COPILOT_WINDOW_SIZE)  # (发言方, 文本)
+        self.partial = ""           # 对方当前未结束的转写片段
+        self.last_active = time.monotonic()
+        self.last_pushed: Optional[List[str]] = None  # 上次推送的话术ID和提示,未变化时不重复推送
+
+    def add_fragment(self, speaker: str, text: str, final: bool = True):
+        """
+        追加转写片段
+        final=False 为流式转写的中间结果,只替换当前未结束片段,不进入窗口
+        """
+        if speaker == "opponent" and not final:
+            self.partial = text
+            return
+        if speaker == "opponent":
+            self.partial = ""
+        else:
+            # 我方发言(采用推荐话术或自定义回复)时客户端已清空推荐面板,之后即使推荐不变也要重新推送
+            self.last_pushed = None
+        self.window.append((speaker, text))
+
+    def query_text(self) -> str:
+        """用于话术匹配的文本: 最近几条对方发言 + 未结束片段"""
+        texts = [text for speaker, text in self.window if speaker == "opponent"][-COPILOT_QUERY_FRAGMENTS:]
+        if self.partial:
+            texts.append(self.partial)
+        return " ".join(texts)
+
+    def latest_opponent_text(self) -> str:
+        if self.partial:
+            return self.partial
+        for speaker, text in reversed(self.window):
+            if speaker == "opponent":
+                return text
+        return ""
+
+
+class SessionStore:
+    """LRU + 空闲超时的会话存储"""
+
+    def __init__(self, max_size: int = COPILOT_MAX_SESSIONS, idle_seconds: float = COPILOT_IDLE_SECONDS):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, CopilotSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        """清理空闲会话(调用方持有锁);按最近使用排序,从最旧的开始检查"""
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+
+    def open(self, user_id: str, session_id: Optional[str] = None,
+             scene: Optional[str] = None) -> CopilotSession:
+        """
+        打开会话: session_id 对应本人的有效会话时恢复,否则新建
+
+        Args:
+            user_id: 当前用户ID
+            session_id: 要恢复的会话ID
+            scene: 谈判场景(恢复会话时非空则覆盖)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None or session.user_id != user_id:
+                session = CopilotSession(uuid.uuid4().hex, user_id, scene)
+                self._sessions[session.session_id] = session
+                while len(self._sessions) > self.max_size:
+                    self._sessions.popitem(last=False)
+            elif scene:
+                session.scene = scene
+            session.last_active = now
+            self._sessions.move_to_end(session.session_id)
+            return session
+
+    def touch(self, session: CopilotSession):
+        with self._lock:
+            session.last_active = time.monotonic()
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+
+    def close(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def build_alerts(text: str) -> List[Dict[str, Any]]:
+    """基于对方发言的规则提示"""
+    alerts = []
+    if _NUMBER_RE.search(text):
+        alerts.append({
+            "type": "alert",
+            "priority": "high",
+            "content": "⚠️ 不要立即拒绝，先测试对方底线",
+            "reason": "对方提出具体数字，这是关键决策点"
+        })
+    return alerts
+
+
+def recommend(index: PlaybookIndex, session: CopilotSession) -> Optional[Dict[str, Any]]:
+    """
+    按会话窗口计算推荐
+
+    Returns:
+        推送消息;与上次推送的话术相同时返回 None
+    """
+    query = session.query_text()
+    if not query:
+        return None
+
+    matches = index.search(query, session.scene, COPILOT_TOP_K)
+    alerts = build_alerts(session.latest_opponent_text())
+    pushed = [script["id"] for _, script in matches] + [alert["reason"] for alert in alerts]
+    if pushed == session.last_pushed:
+        return None
+    session.last_pushed = pushed
+
+    return {
+        "type": "recommendations",
+        "session_id": session.session_id,
+        "data": [script_response(script, score) for score, script in matches],
+        "alerts": alerts
+    }
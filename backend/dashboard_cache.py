@@ -0,0 +1,111 @@
+"""
+看板响应缓存
+按 (看板类型, 范围ID) 缓存序列化后的响应,以数据版本号判断是否失效,
+并支持 ETag / If-None-Match 协商
+"""
+
+from models import NegotiationRecord
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+import hashlib
+import threading
+import time
+
+
+class ScopeVersions:
+    """
+    范围数据版本号
+    由存储路由层在记录写入前后调用 remove/add,团队/部门内任意记录变化时版本号+1
+    """
+
+    SCOPE_FIELDS = ("team_id", "department_id")
+
+    def __init__(self):
+        self.versions: Dict[Tuple[str, str], int] = {}
+
+    def get(self, scope_field: str, value: str) -> int:
+        return self.versions.get((scope_field, value), 0)
+
+    def bump(self, scope_field: str, value: str):
+        key = (scope_field, value)
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def add(self, record: NegotiationRecord):
+        for field in self.SCOPE_FIELDS:
+            self.bump(field, getattr(record, field))
+
+    def remove(self, record: NegotiationRecord):
+        self.add(record)
+
+    def clear(self):
+        """数据清空: 所有范围版本号+1(不归零,避免与已缓存的旧版本号重合)"""
+        for key in self.versions:
+            self.versions[key] += 1
+
+
+class CacheEntry:
+    """缓存项: 序列化后的响应体 + ETag"""
+
+    __slots__ = ("version", "body", "etag", "expires_at")
+
+    def __init__(self, version: int, body: bytes, expires_at: float):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.expires_at = expires_at
+
+
+class DashboardCache:
+    """
+    LRU + TTL 缓存
+    TTL用于滚动30天窗口等随时间变化的数据,版本号用于数据写入后立即失效
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[CacheEntry]:
+        """获取与当前版本一致且未过期的缓存项"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, version: int, body: bytes) -> CacheEntry:
+        entry = CacheEntry(version, body, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中(弱比较)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,108 @@
+"""
+看板聚合引擎
+单次遍历记录,把每条记录依次交给所有累加器,各看板分区由累加器组合而成
+"""
+
+from models import NegotiationRecord
+from aggregates import MemberStats
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+
+class Accumulator:
+    """累加器基类: add() 逐条接收记录, result() 返回结果"""
+
+    def add(self, record: NegotiationRecord):
+        raise NotImplementedError
+
+    def result(self) -> Any:
+        raise NotImplementedError
+
+
+class Windowed(Accumulator):
+    """只把时间落在 [start, end) 内的记录交给内部累加器"""
+
+    def __init__(self, inner: Accumulator, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, time_field: str = "created_at"):
+        self.inner = inner
+        self.start = start
+        self.end = end
+        self.time_field = time_field
+
+    def add(self, record: NegotiationRecord):
+        value = getattr(record, self.time_field)
+        if self.start is not None and value < self.start:
+            return
+        if self.end is not None and value >= self.end:
+            return
+        self.inner.add(record)
+
+    def result(self) -> Any:
+        return self.inner.result()
+
+
+class GroupStats(Accumulator):
+    """按键分组累计 MemberStats(拜访数、成功数、评分、成本优化、待办)"""
+
+    def __init__(self, key: Callable[[NegotiationRecord], Hashable]):
+        self.key = key
+        self.groups: Dict[Hashable, MemberStats] = {}
+
+    def add(self, record: NegotiationRecord):
+        key = self.key(record)
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = MemberStats()
+        stats.add_record(record)
+
+    def result(self) -> Dict[Hashable, MemberStats]:
+        return self.groups
+
+
+class CostSaved(Accumulator):
+    """节省的资金成本: 成本降低 * 业务量"""
+
+    def __init__(self):
+        self.total = 0.0
+
+    def add(self, record: NegotiationRecord):
+        metrics = record.metrics
+        if metrics and metrics.cost_before and metrics.cost_after:
+            reduction = metrics.cost_before - metrics.cost_after
+            if reduction > 0 and metrics.volume_commitment:
+                # 简化计算: 成本降低 * 业务量
+                self.total += reduction * metrics.volume_commitment / 100
+
+    def result(self) -> float:
+        return self.total
+
+
+def period_bucket(end: datetime, days: int = 30) -> Callable[[NegotiationRecord], int]:
+    """
+    按距 end 的周期分桶的键函数
+    第 i 桶覆盖 [end - days*(i+1), end - days*i),只应配合 Windowed(end=end) 使用
+    """
+    period = timedelta(days=days)
+
+    def key(record: NegotiationRecord) -> int:
+        return -((record.created_at - end) // period) - 1
+
+    return key
+
+
+def run_pass(records: Iterable[NegotiationRecord], accumulators: Dict[str, Accumulator]) -> Dict[str, Any]:
+    """
+    单次遍历记录,计算所有累加器
+
+    Args:
+        records: 记录(可以是生成器)
+        accumulators: 名称 -> 累加器
+
+    Returns:
+        名称 -> 累加结果
+    """
+    adders = [acc.add for acc in accumulators.values()]
+    for record in records:
+        for add in adders:
+            add(record)
+    return {name: acc.result() for name, acc in accumulators.items()}
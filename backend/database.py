@@ -5,9 +5,29 @@
 
 from models import User, Team, NegotiationRecord, Role, VisitType, NegotiationScene, NegotiationOutcome, TodoItem, TodoStatus, NegotiationMetrics, Participant
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict
+from typing import Annotated, List, Optional, Dict, Any, Tuple
+from collections import defaultdict
+import heapq
+import itertools
+import logging
+import os
+import threading
 import uuid
 
+from pydantic import TypeAdapter
+from pydantic_core import to_jsonable_python
+
+from aggregates import MemberStats
+from dashboard_cache import ScopeVersions
+from search_index import parse_query
+from columnar import ColumnarStore
+from compact_record import CompactRecord
+from funder_stats import merge_top
+from record_shard import RecordShard, ShardPool, TIME_INDEXED_FIELDS
+
+
+logger = logging.getLogger(__name__)
+
 
 # ===========================
 # 内存数据存储
@@ -19,16 +39,48 @@ USERS_DB: Dict[str, User] = {}
 # 团队数据
 TEAMS_DB: Dict[str, Team] = {}
 
-# 谈判记录
-RECORDS_DB: Dict[str, NegotiationRecord] = {}
+# 谈判记录按部门分片: 部门ID -> 分片(RecordShard,或worker进程中分片的代理 RemoteShard)
+# 每个分片自带二级索引、时间索引、成员聚合、列式镜像、全文索引、JSON缓存和锁;
+# 读接口直接返回紧凑记录(属性与 NegotiationRecord 一致),写接口返回 pydantic 模型
+RECORD_SHARDS: Dict[str, Any] = {}
+
+# 记录ID -> 所在分片的部门ID
+RECORD_LOCATIONS: Dict[str, str] = {}
+
+# 分片路由表: (字段, 字段值) -> {部门ID: 记录数}
+# 未指定部门的查询(员工按 user_id、组长按 team_id)据此只访问含有相关记录的分片;
+# 用户或团队调整过部门时,其历史记录仍在原部门的分片中,同样能被找到
+ROUTED_FIELDS = ("user_id", "team_id", "funder_name")
+SCOPE_SHARDS: Dict[Tuple[str, Any], Dict[str, int]] = {}
+
+# 团队/部门数据版本号(看板缓存失效依据)
+SCOPE_VERSIONS = ScopeVersions()
+
+# 记录写操作串行执行(读操作只取各分片自己的锁)
+_write_lock = threading.RLock()
+
+# 托管分片的worker进程池(NEGOTIA_SHARD_WORKERS > 0 时启用)
+_shard_pool: Optional[ShardPool] = None
+
+# 快照时每次从分片取出、启动加载快照时每批写入的记录数
+SNAPSHOT_CHUNK = 1000
+
+# 用户变更监听: 回调参数为 user_id(如认证模块的Token缓存失效)
+USER_LISTENERS: List[Any] = []
+
+# 持久化日志(仅内存后端且配置了日志目录时启用)
+_journal = None
+
+# 正在后台写快照的线程
+_snapshot_thread: Optional[threading.Thread] = None
 
 
 # ===========================
 # 初始化Demo数据
 # ===========================
 
-def init_demo_data():
-    """初始化Demo数据"""
+def build_demo_data() -> Tuple[List[Team], List[User], List[NegotiationRecord]]:
+    """构建Demo数据(团队、用户、谈判记录),不写入存储"""
 
     # 1. 创建团队
     team1 = Team(
@@ -47,8 +99,7 @@ def init_demo_data():
         members=["U006", "U007", "U008"]
     )
 
-    TEAMS_DB["team_001"] = team1
-    TEAMS_DB["team_002"] = team2
+    teams = [team1, team2]
 
     # 2. 创建用户
     users = [
@@ -118,9 +169,6 @@ def init_demo_data():
         )
     ]
 
-    for user in users:
-        USERS_DB[user.user_id] = user
-
     # 3. 创建谈判记录
     base_date = datetime.now()
 
@@ -239,8 +287,116 @@ def init_demo_data():
         )
     ]
 
+    return teams, users, records
+
+
+def init_demo_data():
+    """初始化Demo数据"""
+    teams, users, records = build_demo_data()
+
+    for team in teams:
+        create_team(team)
+    for user in users:
+        create_user(user)
     for record in records:
-        RECORDS_DB[record.record_id] = record
+        create_record(record)
+
+
+def reset_storage():
+    """清空内存存储及所有派生索引(基准测试切换数据规模时使用,不写持久化日志)"""
+    with _write_lock:
+        USERS_DB.clear()
+        TEAMS_DB.clear()
+        for shard in RECORD_SHARDS.values():
+            shard.clear()
+        RECORD_SHARDS.clear()
+        RECORD_LOCATIONS.clear()
+        SCOPE_SHARDS.clear()
+        SCOPE_VERSIONS.clear()
+
+
+# ===========================
+# 分片路由
+# ===========================
+
+def _shard(department_id: str):
+    """部门对应的分片,不存在时创建"""
+    shard = RECORD_SHARDS.get(department_id)
+    if shard is None:
+        if _shard_pool is not None:
+            shard = _shard_pool.shard(department_id)
+        else:
+            shard = RecordShard(department_id)
+        RECORD_SHARDS[department_id] = shard
+    return shard
+
+
+def _shards_for(filter_dict: Optional[dict]) -> List[Any]:
+    """查询需要访问的分片: 指定部门时只访问该部门;否则按路由表取包含相关用户/团队/资方记录的分片"""
+    if not filter_dict:
+        return list(RECORD_SHARDS.values())
+
+    if "department_id" in filter_dict:
+        shard = RECORD_SHARDS.get(filter_dict["department_id"])
+        return [shard] if shard is not None else []
+
+    departments = None
+    for field in ROUTED_FIELDS:
+        if field in filter_dict:
+            found = set(SCOPE_SHARDS.get((field, filter_dict[field]), ()))
+            departments = found if departments is None else departments & found
+    if departments is None:
+        return list(RECORD_SHARDS.values())
+    return [RECORD_SHARDS[department_id] for department_id in sorted(departments)]
+
+
+def _track(old: Optional[NegotiationRecord], new: Optional[NegotiationRecord]):
+    """记录写入分片后更新路由表和数据版本号(old/new 为修改前后的记录,新建/删除时为None)"""
+    if old is not None:
+        for field in ROUTED_FIELDS:
+            key = (field, getattr(old, field))
+            counts = SCOPE_SHARDS[key]
+            counts[old.department_id] -= 1
+            if not counts[old.department_id]:
+                del counts[old.department_id]
+                if not counts:
+                    del SCOPE_SHARDS[key]
+        SCOPE_VERSIONS.remove(old)
+        if new is None:
+            del RECORD_LOCATIONS[old.record_id]
+
+    if new is not None:
+        for field in ROUTED_FIELDS:
+            counts = SCOPE_SHARDS.setdefault((field, getattr(new, field)), {})
+            counts[new.department_id] = counts.get(new.department_id, 0) + 1
+        SCOPE_VERSIONS.add(new)
+        RECORD_LOCATIONS[new.record_id] = new.department_id
+
+
+def _put_records(models: List[NegotiationRecord]):
+    """写入/覆盖记录: 按部门分组写入各分片;覆盖的记录换了部门时先从原分片移除"""
+    groups: Dict[str, List[NegotiationRecord]] = defaultdict(list)
+    for model in models:
+        location = RECORD_LOCATIONS.get(model.record_id)
+        if location is not None and location != model.department_id:
+            _track(RECORD_SHARDS[location].delete_record(model.record_id), None)
+        groups[model.department_id].append(model)
+
+    for department_id, group in groups.items():
+        olds = _shard(department_id).put_records(group)
+        for old, model in zip(olds, group):
+            _track(old, model)
+
+
+def _apply_change(change: Optional[Tuple[CompactRecord, NegotiationRecord]]) -> Optional[NegotiationRecord]:
+    """分片修改记录后的收尾: 记录换了部门时写入新部门的分片(原分片已移除)"""
+    if change is None:
+        return None
+    old, model = change
+    if model.department_id != old.department_id:
+        _shard(model.department_id).put_records([model])
+    _track(old, model)
+    return model
 
 
 # ===========================
@@ -257,7 +413,36 @@ def get_team_by_id(team_id: str) -> Optional[Team]:
     return TEAMS_DB.get(team_id)
 
 
-def get_records(filter_dict: dict = None) -> List[NegotiationRecord]:
+def get_users_by_department(department_id: str) -> List[User]:
+    """获取部门下的所有用户"""
+    return [user for user in list(USERS_DB.values()) if user.department_id == department_id]
+
+
+def create_user(user: User) -> User:
+    """创建/覆盖用户"""
+    with _write_lock:
+        old = USERS_DB.get(user.user_id)
+        USERS_DB[user.user_id] = user
+        for u in filter(None, (old, user)):
+            SCOPE_VERSIONS.bump("team_id", u.team_id)
+            SCOPE_VERSIONS.bump("department_id", u.department_id)
+        _log("create_user", user=user.model_dump(mode="json"))
+    for listener in USER_LISTENERS:
+        listener(user.user_id)
+    return user
+
+
+def create_team(team: Team) -> Team:
+    """创建/覆盖团队"""
+    with _write_lock:
+        TEAMS_DB[team.team_id] = team
+        SCOPE_VERSIONS.bump("team_id", team.team_id)
+        SCOPE_VERSIONS.bump("department_id", team.department_id)
+        _log("create_team", team=team.model_dump(mode="json"))
+    return team
+
+
+def get_records(filter_dict: dict = None) -> List[CompactRecord]:
     """
     获取谈判记录列表
 
@@ -267,56 +452,539 @@ def get_records(filter_dict: dict = None) -> List[NegotiationRecord]:
     Returns:
         符合条件的记录列表
     """
-    if filter_dict is None:
-        return list(RECORDS_DB.values())
+    shards = _shards_for(filter_dict)
+    if len(shards) == 1:
+        return shards[0].get_records(filter_dict)
 
     results = []
-    for record in RECORDS_DB.values():
-        match = True
-        for key, value in filter_dict.items():
-            if not hasattr(record, key) or getattr(record, key) != value:
-                match = False
-                break
-        if match:
-            results.append(record)
-
+    for shard in shards:
+        results.extend(shard.get_records(filter_dict))
     return results
 
 
-def get_record_by_id(record_id: str) -> Optional[NegotiationRecord]:
+def get_records_in_range(scope: dict, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None,
+                         time_field: str = "created_at") -> List[CompactRecord]:
+    """
+    按时间范围获取记录(基于有序索引二分查找)
+
+    Args:
+        scope: 范围条件,如 {"team_id": "team_001"},至少包含一个
+               user_id/team_id/department_id
+        start: 起始时间(含),None表示不限
+        end: 结束时间(不含),None表示不限
+        time_field: 时间字段, created_at 或 visit_date
+
+    Returns:
+        按时间升序排列的记录列表
+    """
+    if time_field not in TIME_INDEXED_FIELDS:
+        raise ValueError(f"不支持的时间字段: {time_field}")
+
+    shards = _shards_for(scope)
+    if len(shards) == 1:
+        return shards[0].get_records_in_range(scope, start, end, time_field)
+
+    # 各分片结果已按时间有序,归并即可
+    parts = [shard.get_records_in_range(scope, start, end, time_field) for shard in shards]
+    return list(heapq.merge(*parts, key=lambda r: getattr(r, time_field)))
+
+
+def get_earliest_record_time(scope: dict, time_field: str = "created_at") -> Optional[datetime]:
+    """
+    范围内最早的记录时间(读各分片时间索引的首个条目,不遍历记录)
+
+    Args:
+        scope: 范围条件,同 get_records_in_range
+        time_field: 时间字段, created_at 或 visit_date
+
+    Returns:
+        最早时间,范围内没有记录时为None
+    """
+    if time_field not in TIME_INDEXED_FIELDS:
+        raise ValueError(f"不支持的时间字段: {time_field}")
+
+    values = [shard.earliest_time(scope, time_field) for shard in _shards_for(scope)]
+    return min(filter(None, values), default=None)
+
+
+def get_records_page(filter_dict: dict, limit: int,
+                     before: Optional[Tuple[datetime, str]] = None
+                     ) -> Tuple[List[CompactRecord], Optional[Tuple[datetime, str]]]:
+    """
+    按 (created_at, record_id) 倒序分页获取记录(keyset分页)
+
+    Args:
+        filter_dict: 过滤条件,需包含 user_id/team_id/department_id 之一
+        limit: 每页条数
+        before: 游标,只返回排在该键之后(更早)的记录
+
+    Returns:
+        (本页记录, 下一页游标);没有更多数据时游标为None
+    """
+    shards = _shards_for(filter_dict)
+    if len(shards) == 1:
+        return shards[0].get_records_page(filter_dict, limit, before)
+
+    # 每个分片各取一页后归并取前 limit 条;任一分片还有更多或归并结果超出 limit 时返回游标
+    has_more = False
+    merged = []
+    for shard in shards:
+        page, cursor = shard.get_records_page(filter_dict, limit, before)
+        merged.extend(page)
+        has_more = has_more or cursor is not None
+    merged.sort(key=lambda r: (r.created_at, r.record_id), reverse=True)
+    if len(merged) > limit:
+        merged = merged[:limit]
+        has_more = True
+    if has_more and merged:
+        last = merged[-1]
+        return merged, (last.created_at, last.record_id)
+    return merged, None
+
+
+def get_record_by_id(record_id: str) -> Optional[CompactRecord]:
     """根据记录ID获取记录"""
-    return RECORDS_DB.get(record_id)
+    location = RECORD_LOCATIONS.get(record_id)
+    if location is None:
+        return None
+    return RECORD_SHARDS[location].get_record(record_id)
+
+
+def get_records_by_ids(record_ids: List[str]) -> Dict[str, CompactRecord]:
+    """批量获取记录(按所在分片分组,每个分片只访问一次),不存在的ID不在结果中"""
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for record_id in record_ids:
+        location = RECORD_LOCATIONS.get(record_id)
+        if location is not None:
+            groups[location].append(record_id)
+
+    found = {}
+    for location, group in groups.items():
+        for record in RECORD_SHARDS[location].get_records_by_ids(group):
+            found[record.record_id] = record
+    return found
+
+
+def record_model(record: CompactRecord) -> NegotiationRecord:
+    """读接口返回的记录转为 pydantic 模型"""
+    return record.to_model()
 
 
 def create_record(record: NegotiationRecord) -> NegotiationRecord:
     """创建新记录"""
-    RECORDS_DB[record.record_id] = record
+    with _write_lock:
+        _put_records([record])
+        _log("create_record", record=record.model_dump(mode="json"))
     return record
 
 
+def create_records(records: List[NegotiationRecord]) -> List[NegotiationRecord]:
+    """
+    批量创建记录(批量导入使用)
+    整批只写一条日志;每个分片只调用一次,分片内时间索引每个键只合并排序一次
+    """
+    if not records:
+        return records
+    if len({record.record_id for record in records}) != len(records):
+        raise ValueError("批量创建的记录ID重复")
+
+    with _write_lock:
+        _put_records(records)
+        if _journal is not None:
+            _log("create_records", records=[record.model_dump(mode="json") for record in records])
+    return records
+
+
+def _update_record(record_id: str, updates: dict, now: datetime) -> Optional[NegotiationRecord]:
+    with _write_lock:
+        location = RECORD_LOCATIONS.get(record_id)
+        if location is None:
+            return None
+        return _apply_change(RECORD_SHARDS[location].update_record(record_id, updates, now))
+
+
+def _add_record_todo(record_id: str, todo: TodoItem, now: datetime) -> Optional[NegotiationRecord]:
+    with _write_lock:
+        location = RECORD_LOCATIONS.get(record_id)
+        if location is None:
+            return None
+        return _apply_change(RECORD_SHARDS[location].add_record_todo(record_id, todo, now))
+
+
+def _complete_record_todo(record_id: str, todo_index: int, now: datetime) -> Optional[NegotiationRecord]:
+    with _write_lock:
+        location = RECORD_LOCATIONS.get(record_id)
+        if location is None:
+            return None
+        return _apply_change(RECORD_SHARDS[location].complete_record_todo(record_id, todo_index, now))
+
+
 def update_record(record_id: str, updates: dict) -> Optional[NegotiationRecord]:
     """更新记录"""
-    record = RECORDS_DB.get(record_id)
-    if not record:
+    if record_id not in RECORD_LOCATIONS:
         return None
 
-    for key, value in updates.items():
-        if hasattr(record, key) and value is not None:
-            setattr(record, key, value)
+    now = datetime.now()
+    with _write_lock:
+        record = _update_record(record_id, updates, now)
+        if record is not None:
+            _log("update_record", record_id=record_id, updates=to_jsonable_python(updates), updated_at=now.isoformat())
+    return record
+
+
+def add_record_todo(record_id: str, todo: TodoItem) -> Optional[NegotiationRecord]:
+    """为记录追加待办事项"""
+    if record_id not in RECORD_LOCATIONS:
+        return None
+
+    now = datetime.now()
+    with _write_lock:
+        record = _add_record_todo(record_id, todo, now)
+        if record is not None:
+            _log("add_todo", record_id=record_id, todo=todo.model_dump(mode="json"), updated_at=now.isoformat())
+    return record
+
+
+def complete_record_todo(record_id: str, todo_index: int) -> Optional[NegotiationRecord]:
+    """将记录的第 todo_index 个待办标记为已完成"""
+    record = get_record_by_id(record_id)
+    if not record:
+        return None
 
-    record.updated_at = datetime.now()
+    if not -len(record.todos) <= todo_index < len(record.todos):
+        raise IndexError("待办索引无效")
+    now = datetime.now()
+    with _write_lock:
+        record = _complete_record_todo(record_id, todo_index, now)
+        if record is not None:
+            _log("complete_todo", record_id=record_id, todo_index=todo_index, completed_at=now.isoformat())
     return record
 
 
+def get_data_version(scope_field: str, value: str) -> int:
+    """获取团队(team_id)或部门(department_id)的数据版本号,范围内数据变化时递增"""
+    return SCOPE_VERSIONS.get(scope_field, value)
+
+
+def get_member_stats(team_id: str, start: Optional[datetime] = None) -> Dict[str, MemberStats]:
+    """
+    获取团队各成员的聚合统计(增量维护,耗时与成员数成正比)
+
+    Args:
+        team_id: 团队ID
+        start: 只统计 created_at >= start 的记录;None表示全量
+
+    Returns:
+        成员ID -> 统计量
+    """
+    shards = _shards_for({"team_id": team_id})
+    if len(shards) == 1:
+        return shards[0].get_member_stats(team_id, start)
+
+    # 团队调整过部门时,各分片的统计按成员合并
+    stats: Dict[str, MemberStats] = {}
+    for shard in shards:
+        for user_id, part in shard.get_member_stats(team_id, start).items():
+            stats.setdefault(user_id, MemberStats()).merge(part)
+    return stats
+
+
+def search_records(filter_dict: dict, query: str, limit: int = 20) -> Tuple[List[str], List[Tuple[float, NegotiationRecord]]]:
+    """
+    全文检索记录
+    跨分片检索时按各分片内的BM25得分归并(词频统计按分片计算)
+
+    Args:
+        filter_dict: 权限范围过滤条件(build_query_filter)
+        query: 查询串,空白分隔的词须全部出现,双引号内为短语
+        limit: 返回条数
+
+    Returns:
+        (解析后的词项, [(得分, 记录)])
+    """
+    terms = parse_query(query)
+    shards = _shards_for(filter_dict)
+    if len(shards) == 1:
+        return terms, shards[0].search(terms, filter_dict, limit)
+
+    results = []
+    for shard in shards:
+        results.extend(shard.search(terms, filter_dict, limit))
+    return terms, heapq.nlargest(limit, results, key=lambda item: item[0])
+
+
+def get_top_funders(scope_field: str, value: str, limit: Optional[int] = 10) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    获取团队(team_id)或部门(department_id)内业务量最高的资方(增量维护的排名,直接切片)
+
+    Returns:
+        [(资方, {"visit_count", "last_visit", "total_volume", "key_owner"})],按业务量降序;
+        limit 为None时返回全部资方
+    """
+    shards = _shards_for({scope_field: value})
+    if len(shards) == 1:
+        return shards[0].top_funders(scope_field, value, limit)
+
+    # 团队调整过部门时,各分片的统计按资方合并后再排名
+    return merge_top((shard.top_funders(scope_field, value, None) for shard in shards), limit)
+
+
+def get_due_todos(filter_dict: dict, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  limit: int = 50) -> List[Tuple[datetime, CompactRecord, int]]:
+    """
+    按截止时间获取未完成待办(待办索引二分定位,O(log n + k))
+
+    Args:
+        filter_dict: 范围条件,至少包含 user_id/team_id/department_id 之一
+        start: 截止时间下限(含),None表示不限
+        end: 截止时间上限(不含),None表示不限
+        limit: 返回条数
+
+    Returns:
+        [(截止时间, 记录, 待办下标)],按截止时间升序
+    """
+    shards = _shards_for(filter_dict)
+    if len(shards) == 1:
+        return shards[0].due_todos(filter_dict, start, end, limit)
+
+    parts = [shard.due_todos(filter_dict, start, end, limit) for shard in shards]
+    merged = heapq.merge(*parts, key=lambda item: (item[0], item[1].record_id, item[2]))
+    return list(itertools.islice(merged, limit))
+
+
+def encode_record(record: CompactRecord) -> bytes:
+    """记录的JSON字节(缓存,记录修改时失效)"""
+    shard = RECORD_SHARDS.get(record.department_id)
+    if shard is None:
+        return record.to_model().model_dump_json().encode()
+    return shard.encode_record(record)
+
+
+def get_department_analytics(department_id: str, start: datetime) -> Dict[str, Any]:
+    """获取部门看板统计(分片内列式镜像向量化计算),结构见 ColumnarStore.department_analytics"""
+    shard = RECORD_SHARDS.get(department_id)
+    if shard is None:
+        return ColumnarStore().department_analytics(department_id, start)
+    return shard.department_analytics(start)
+
+
 def get_users_by_team(team_id: str) -> List[User]:
     """获取团队成员列表"""
-    return [user for user in USERS_DB.values() if user.team_id == team_id]
+    return [user for user in list(USERS_DB.values()) if user.team_id == team_id]
 
 
 def get_teams_by_department(department_id: str) -> List[Team]:
     """获取部门下的所有团队"""
-    return [team for team in TEAMS_DB.values() if team.department_id == department_id]
+    return [team for team in list(TEAMS_DB.values()) if team.department_id == department_id]
 
 
-# 初始化Demo数据
-init_demo_data()
+def get_storage_stats() -> Dict[str, int]:
+    """存储规模: 记录数、用户数、团队数"""
+    return {"records": len(RECORD_LOCATIONS), "users": len(USERS_DB), "teams": len(TEAMS_DB)}
+
+
+def get_shard_stats() -> Dict[str, Dict[str, int]]:
+    """各分片的记录数和JSON缓存条目数(仅内存后端)"""
+    return {department_id: shard.stats() for department_id, shard in list(RECORD_SHARDS.items())}
+
+
+# ===========================
+# 持久化日志(内存后端)
+# ===========================
+
+# 按字段缓存的校验器,重放 update_record 日志时把JSON值还原为模型类型
+_FIELD_ADAPTERS: Dict[str, TypeAdapter] = {}
+
+
+def _log(op: str, **payload):
+    """
+    记录一条已成功应用的修改;调用方持有 _write_lock,日志顺序与内存中的应用顺序一致,
+    修改失败(抛异常)时不会留下日志。fsync 后调用方才确认请求
+    日志条目数达到阈值时在后台线程生成快照,不阻塞当前请求
+    """
+    if _journal is None:
+        return
+    _journal.append(op, **payload)
+    if _journal.should_snapshot():
+        snapshot_storage(wait=False)
+
+
+def _field_value(key: str, value):
+    adapter = _FIELD_ADAPTERS.get(key)
+    if adapter is None:
+        # 带上字段的校验器(如时间字段的时区换算),与模型校验一致
+        field = NegotiationRecord.model_fields[key]
+        annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        adapter = _FIELD_ADAPTERS[key] = TypeAdapter(annotation)
+    return adapter.validate_python(value)
+
+
+def _apply_journal_entry(entry: dict):
+    """重放一条日志"""
+    op = entry["op"]
+    if op == "create_record":
+        create_record(NegotiationRecord.model_validate(entry["record"]))
+    elif op == "create_records":
+        create_records([NegotiationRecord.model_validate(record) for record in entry["records"]])
+    elif op == "update_record":
+        updates = {
+            key: _field_value(key, value)
+            for key, value in entry["updates"].items() if key in NegotiationRecord.model_fields
+        }
+        _update_record(entry["record_id"], updates, datetime.fromisoformat(entry["updated_at"]))
+    elif op == "add_todo":
+        _add_record_todo(entry["record_id"], TodoItem.model_validate(entry["todo"]),
+                         datetime.fromisoformat(entry["updated_at"]))
+    elif op == "complete_todo":
+        _complete_record_todo(entry["record_id"], entry["todo_index"],
+                              datetime.fromisoformat(entry["completed_at"]))
+    elif op == "create_user":
+        create_user(User.model_validate(entry["user"]))
+    elif op == "create_team":
+        create_team(Team.model_validate(entry["team"]))
+    else:
+        raise ValueError(f"未知的日志操作: {op}")
+
+
+def _capture_snapshot() -> Tuple:
+    """
+    在写锁内截取一致的状态: 轮转日志,复制团队/用户列表,冻结各分片当前的记录
+    (紧凑记录修改时整条替换、不原地改动,冻结只复制引用)
+    """
+    seq = _journal.rotate()
+    shards = list(RECORD_SHARDS.values())
+    counts = [shard.freeze() for shard in shards]
+    return seq, list(TEAMS_DB.values()), list(USERS_DB.values()), shards, counts
+
+
+def _write_snapshot(seq: int, teams: List[Team], users: List[User], shards: List[Any], counts: List[int]):
+    """快照线程: 逐分片、分批取出冻结的记录模型写入快照(不整体物化)"""
+
+    def records():
+        for shard, count in zip(shards, counts):
+            for i in range(0, count, SNAPSHOT_CHUNK):
+                yield from shard.frozen_models(i, SNAPSHOT_CHUNK)
+
+    try:
+        _journal.write_snapshot(seq, teams, users, records(), sum(counts))
+    except Exception:
+        # 旧日志保留,下次快照或启动重放时仍可恢复
+        logger.exception("写入快照失败")
+    finally:
+        for shard in shards:
+            shard.release()
+
+
+def snapshot_storage(wait: bool = True):
+    """
+    生成快照: 写锁内截取一致状态后由后台线程写文件,写入期间读写请求照常进行
+    已有快照在写时不再发起新的快照;wait=True 时等待写完(初始化、退出时使用)
+    """
+    global _snapshot_thread
+
+    with _write_lock:
+        if _snapshot_thread is None or not _snapshot_thread.is_alive():
+            _snapshot_thread = threading.Thread(
+                target=_write_snapshot, args=_capture_snapshot(), name="negotia-snapshot", daemon=True
+            )
+            _snapshot_thread.start()
+        thread = _snapshot_thread
+
+    if wait:
+        thread.join()
+
+
+def open_journal(journal):
+    """
+    启用持久化日志
+    已有数据时加载快照并重放日志;否则初始化Demo数据并写入首个快照
+    """
+    global _journal
+
+    if journal.exists():
+        teams, users, records = journal.load_snapshot()
+        for team in teams:
+            create_team(team)
+        for user in users:
+            create_user(user)
+        # 快照记录按批写入(与批量导入同一路径),每个分片的时间索引每批只合并一次
+        while True:
+            chunk = list(itertools.islice(records, SNAPSHOT_CHUNK))
+            if not chunk:
+                break
+            create_records(chunk)
+        for entry in journal.replay():
+            try:
+                _apply_journal_entry(entry)
+            except Exception as exc:
+                # 单条日志无法应用时隔离该条目,不中断启动
+                journal.reject(entry, exc)
+                logger.warning("日志条目 %s 重放失败,已隔离到 %s: %s", entry.get("seq"), journal.rejected_path, exc)
+        _journal = journal
+    else:
+        init_demo_data()
+        _journal = journal
+        snapshot_storage()
+
+
+def close_storage():
+    """进程退出前调用: 等待进行中的快照,有未压缩的日志时再写一次快照,缩短下次启动重放时间;停止分片worker进程"""
+    if _journal is not None:
+        if _snapshot_thread is not None:
+            _snapshot_thread.join()
+        if _journal.entries_since_snapshot:
+            snapshot_storage()
+        _journal.close()
+    if _shard_pool is not None:
+        _shard_pool.close()
+
+# memory: 进程内dict(Demo默认,重启丢失);
+# sqlite: SQLite(WAL)持久化存储,多个uvicorn worker可共享同一文件
+STORAGE_BACKEND = os.getenv("NEGOTIA_STORAGE", "memory")
+SQLITE_PATH = os.getenv("NEGOTIA_SQLITE_PATH", os.path.join(os.path.dirname(__file__), "negotiapro.db"))
+
+# 内存后端的持久化日志目录,为空时不持久化(重启后重新生成Demo数据)
+JOURNAL_DIR = os.getenv("NEGOTIA_JOURNAL_DIR", "")
+JOURNAL_FSYNC = os.getenv("NEGOTIA_JOURNAL_FSYNC", "1") != "0"
+SNAPSHOT_EVERY = int(os.getenv("NEGOTIA_SNAPSHOT_EVERY", "50000"))
+
+# 内存后端托管记录分片的worker进程数,0 表示分片都在本进程内
+# 部门按哈希固定分配到worker,不同部门的查询和看板计算可在多个CPU核上并行
+SHARD_WORKERS = int(os.getenv("NEGOTIA_SHARD_WORKERS", "0"))
+
+# 存储引擎需要实现的接口,选择非内存后端时用引擎的同名方法替换本模块函数
+STORAGE_API = (
+    "get_user_by_id", "get_team_by_id", "get_users_by_team", "get_users_by_department",
+    "get_teams_by_department", "create_user", "create_team",
+    "get_records", "get_records_in_range", "get_earliest_record_time", "get_records_page",
+    "get_record_by_id", "get_records_by_ids", "create_record", "create_records", "update_record",
+    "add_record_todo", "complete_record_todo", "get_member_stats", "get_data_version",
+    "get_department_analytics", "search_records", "get_storage_stats", "encode_record", "record_model",
+    "get_due_todos", "get_top_funders",
+)
+
+
+def use_storage(store):
+    """将模块级存储函数切换到指定引擎"""
+    for name in STORAGE_API:
+        globals()[name] = getattr(store, name)
+
+
+if STORAGE_BACKEND == "memory" and SHARD_WORKERS > 0:
+    # 在存储初始化之前启动worker进程(此时尚无其他线程,可安全fork)
+    _shard_pool = ShardPool(SHARD_WORKERS)
+
+if STORAGE_BACKEND == "sqlite":
+    from storage_sqlite import SQLiteStore
+    _store = SQLiteStore(SQLITE_PATH, user_listeners=USER_LISTENERS)
+    _store.load_if_empty(*build_demo_data())
+    use_storage(_store)
+elif STORAGE_BACKEND == "memory" and JOURNAL_DIR:
+    from storage_journal import Journal
+    open_journal(Journal(JOURNAL_DIR, fsync=JOURNAL_FSYNC, snapshot_every=SNAPSHOT_EVERY))
+elif STORAGE_BACKEND == "memory":
+    # 初始化Demo数据
+    init_demo_data()
+else:
+    raise ValueError(f"未知的存储后端: {STORAGE_BACKEND}")
@@ -0,0 +1,153 @@
+"""
+资方统计增量索引
+按团队/部门维护每个资方的拜访次数、业务量合计、最近拜访日期及负责人,并保持按业务量排序的排名,
+看板取前N个资方时直接切片,不再扫描范围内的全部记录
+作为记录观察者注册: 记录修改前 remove(旧值),修改后 add(新值)
+"""
+
+from models import NegotiationRecord
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import bisect
+import heapq
+
+
+SCOPE_FIELDS = ("team_id", "department_id")
+
+# 排名键: 业务量降序,其次拜访次数降序,再按资方名称
+RankKey = Tuple[float, int, str]
+
+
+class FunderSummary:
+    """单个范围内单个资方的统计;visits 按 (拜访日期, 记录ID) 升序,末尾即最近一次拜访"""
+
+    __slots__ = ("visit_count", "total_volume", "visits")
+
+    def __init__(self):
+        self.visit_count = 0
+        self.total_volume = 0.0
+        self.visits: List[Tuple[datetime, str, str]] = []
+
+    def rank_key(self, funder_name: str) -> RankKey:
+        return (-self.total_volume, -self.visit_count, funder_name)
+
+    def result(self) -> Dict[str, Any]:
+        last_visit, _, key_owner = self.visits[-1]
+        return {
+            "visit_count": self.visit_count,
+            "last_visit": last_visit,
+            "total_volume": self.total_volume,
+            "key_owner": key_owner
+        }
+
+
+def _volume(record: NegotiationRecord) -> float:
+    if record.metrics and record.metrics.volume_commitment:
+        return record.metrics.volume_commitment
+    return 0.0
+
+
+class FunderStatsIndex:
+    """
+    (范围字段, 字段值) -> 资方 -> FunderSummary
+    rankings 为同一范围内各资方的排名键升序列表(即业务量降序),更新单条记录只移动一个资方的位置
+    资方拜访次数减到0时删除其统计和排名,范围内没有资方时删除整个范围
+    """
+
+    def __init__(self):
+        self.summaries: Dict[Tuple[str, Any], Dict[str, FunderSummary]] = {}
+        self.rankings: Dict[Tuple[str, Any], List[RankKey]] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[NegotiationRecord]) -> "FunderStatsIndex":
+        """从记录批量构建(无增量索引的存储后端使用)"""
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    def clear(self):
+        self.summaries.clear()
+        self.rankings.clear()
+
+    def add(self, record: NegotiationRecord):
+        self._apply(record, 1)
+
+    def remove(self, record: NegotiationRecord):
+        self._apply(record, -1)
+
+    def _apply(self, record: NegotiationRecord, sign: int):
+        funder_name = record.funder_name
+        visit = (record.visit_date, record.record_id, record.user_name)
+        for field in SCOPE_FIELDS:
+            scope = (field, getattr(record, field))
+            funders = self.summaries.get(scope)
+            summary = funders.get(funder_name) if funders is not None else None
+            if summary is None:
+                if sign < 0:
+                    continue
+                if funders is None:
+                    funders = self.summaries[scope] = {}
+                    self.rankings[scope] = []
+                summary = funders[funder_name] = FunderSummary()
+            ranking = self.rankings[scope]
+            if summary.visit_count > 0:
+                ranking.pop(bisect.bisect_left(ranking, summary.rank_key(funder_name)))
+
+            summary.visit_count += sign
+            summary.total_volume += sign * _volume(record)
+            if sign > 0:
+                bisect.insort(summary.visits, visit)
+            else:
+                pos = bisect.bisect_left(summary.visits, visit)
+                if pos < len(summary.visits) and summary.visits[pos] == visit:
+                    summary.visits.pop(pos)
+
+            if summary.visit_count > 0:
+                bisect.insort(ranking, summary.rank_key(funder_name))
+            else:
+                del funders[funder_name]
+                if not funders:
+                    del self.summaries[scope]
+                    del self.rankings[scope]
+
+    def top(self, scope_field: str, value: str, limit: Optional[int]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        范围内业务量最高的资方
+
+        Args:
+            scope_field: team_id 或 department_id
+            value: 字段值
+            limit: 返回个数,None表示全部
+
+        Returns:
+            [(资方, {"visit_count", "last_visit", "total_volume", "key_owner"})],按排名顺序
+        """
+        scope = (scope_field, value)
+        ranking = self.rankings.get(scope, [])
+        funders = self.summaries.get(scope, {})
+        keys = ranking if limit is None else ranking[:limit]
+        return [(key[2], funders[key[2]].result()) for key in keys]
+
+
+def merge_top(parts: Iterable[List[Tuple[str, Dict[str, Any]]]], limit: Optional[int]) -> List[Tuple[str, Dict[str, Any]]]:
+    """合并多个分片的完整资方统计(同一资方累加,最近拜访取较晚者)后取排名前 limit 个"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        for funder_name, stats in part:
+            total = merged.get(funder_name)
+            if total is None:
+                merged[funder_name] = dict(stats)
+                continue
+            total["visit_count"] += stats["visit_count"]
+            total["total_volume"] += stats["total_volume"]
+            if stats["last_visit"] > total["last_visit"]:
+                total["last_visit"] = stats["last_visit"]
+                total["key_owner"] = stats["key_owner"]
+
+    def rank(item):
+        return (-item[1]["total_volume"], -item[1]["visit_count"], item[0])
+
+    if limit is None:
+        return sorted(merged.items(), key=rank)
+    return heapq.nsmallest(limit, merged.items(), key=rank)
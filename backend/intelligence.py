@@ -0,0 +1,330 @@
+"""
+资方内参报告 - 数据源与报告缓存
+报告的每个分区(基本信息、业务、运营、商务条件、联系人、建议)由独立的异步数据源提供,并发获取,
+单个数据源超时或失败时返回部分报告并标注分区状态
+报告按资方名称缓存: TTL内直接返回,过期后在宽限期内先返回旧报告并后台刷新(stale-while-revalidate),
+同一资方并发未命中时只发起一次查询(single-flight)
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+
+# 报告缓存配置
+INTEL_CACHE_SIZE = 512
+INTEL_CACHE_TTL_SECONDS = 300           # 新鲜期
+INTEL_CACHE_STALE_SECONDS = 1800        # 过期后仍可先返回旧报告的宽限期
+
+# 本地模拟数据源的查询延迟(毫秒),用于模拟数仓查询耗时
+INTEL_SOURCE_LATENCY_MS = float(os.environ.get("NEGOTIA_INTEL_LATENCY_MS", "0"))
+# 单个数据源的超时(秒),超时的分区返回空值并标记状态
+INTEL_SOURCE_TIMEOUT_SECONDS = float(os.environ.get("NEGOTIA_INTEL_TIMEOUT_SECONDS", "2"))
+
+
+# ===========================
+# 数据源
+# ===========================
+
+class SectionProvider:
+    """
+    报告分区数据源基类
+    fetch() 返回该分区的字段;fallback 为数据源失败或超时时填充的空值,保证报告结构稳定
+    """
+
+    section = ""
+    fallback: Dict[str, Any] = {}
+
+    def __init__(self, timeout_seconds: float = INTEL_SOURCE_TIMEOUT_SECONDS):
+        self.timeout_seconds = timeout_seconds
+
+    async def fetch(self, funder_name: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class LocalSectionProvider(SectionProvider):
+    """
+    本地模拟数据源
+    替代真实的Dataphin查询,按配置的延迟返回模拟数据
+    """
+
+    def __init__(self, latency_ms: float = INTEL_SOURCE_LATENCY_MS,
+                 timeout_seconds: float = INTEL_SOURCE_TIMEOUT_SECONDS):
+        super().__init__(timeout_seconds)
+        self.latency_ms = latency_ms
+
+    async def fetch(self, funder_name: str) -> Dict[str, Any]:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.build(funder_name)
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class LocalProfileProvider(LocalSectionProvider):
+    """基本信息"""
+
+    section = "profile"
+    fallback = {"fund_type": None, "cooperation_status": None, "cooperation_duration": None}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        # 模拟数据（可以根据资方名称返回不同数据）
+        return {
+            "fund_type": "银行" if "银行" in funder_name else "资金方",
+            "cooperation_status": "正常合作",
+            "cooperation_duration": "24个月",
+        }
+
+
+class LocalBusinessProvider(LocalSectionProvider):
+    """业务数据"""
+
+    section = "business"
+    fallback = {"outstanding_balance": None, "last_month_loan": None,
+                "current_month_plan": None, "balance_ratio": None}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        return {
+            "outstanding_balance": 8750,   # 在贷余额(万元)
+            "last_month_loan": 1200,       # 上月放款
+            "current_month_plan": 800,     # 本月排期
+            "balance_ratio": 15.2,         # 占比
+        }
+
+
+class LocalOperationsProvider(LocalSectionProvider):
+    """运营数据"""
+
+    section = "operations"
+    fallback = {"approval_rate": None, "m3_overdue_rate": None, "avg_approval_days": None}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        return {
+            "approval_rate": 62.3,         # 审批通过率
+            "m3_overdue_rate": 4.8,        # M3+逾期率
+            "avg_approval_days": 2.1,      # 平均审批时长
+        }
+
+
+class LocalTermsProvider(LocalSectionProvider):
+    """商务条件"""
+
+    section = "terms"
+    fallback = {"funding_cost": None, "deposit_rate": None, "cooperation_mode": None}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        return {
+            "funding_cost": 7.2,           # 资金成本
+            "deposit_rate": 5.0,           # 保证金比例
+            "cooperation_mode": "风险共担",
+        }
+
+
+class LocalContactsProvider(LocalSectionProvider):
+    """关键联系人"""
+
+    section = "contacts"
+    fallback = {"contacts": []}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        return {
+            "contacts": [
+                {
+                    "name": "张总",
+                    "role": "分管副行长",
+                    "phone": "138****1234"
+                },
+                {
+                    "name": "李经理",
+                    "role": "风控部负责人",
+                    "phone": "139****5678"
+                }
+            ]
+        }
+
+
+class LocalSuggestionsProvider(LocalSectionProvider):
+    """谈判建议"""
+
+    section = "suggestions"
+    fallback = {"suggestions": []}
+
+    def build(self, funder_name: str) -> Dict[str, Any]:
+        return {
+            "suggestions": [
+                {
+                    "title": "方案A: 阶梯式保证金",
+                    "recommended": True,
+                    "content": "前3月保证金提至7%，如M3+控制在4%以内则恢复6%；超过4.5%接受提至8%。"
+                },
+                {
+                    "title": "方案B: 替代方案",
+                    "recommended": False,
+                    "content": "保证金维持6% + 增设500万风险准备金 + 引入第三方担保。"
+                },
+                {
+                    "title": "方案C: 折中方案",
+                    "recommended": False,
+                    "content": "保证金提至8% + 优先匹配优质客户 + 增加数据透明度。"
+                }
+            ]
+        }
+
+
+def local_providers() -> List[SectionProvider]:
+    """本地模拟数据源(每个分区一个)"""
+    return [
+        LocalProfileProvider(), LocalBusinessProvider(), LocalOperationsProvider(),
+        LocalTermsProvider(), LocalContactsProvider(), LocalSuggestionsProvider()
+    ]
+
+
+# ===========================
+# 报告组装
+# ===========================
+
+class ReportAssembler:
+    """
+    并发调用各分区数据源并合并为报告
+    报告耗时取决于最慢的数据源(且不超过其超时),而不是各数据源耗时之和
+    """
+
+    def __init__(self, providers: List[SectionProvider]):
+        self.providers = providers
+
+    async def _fetch_section(self, provider: SectionProvider, funder_name: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        start = time.monotonic()
+        try:
+            data = await asyncio.wait_for(provider.fetch(funder_name), provider.timeout_seconds)
+            status = {"status": "ok"}
+        except asyncio.TimeoutError:
+            data = provider.fallback
+            status = {"status": "timeout"}
+        except Exception as e:
+            data = provider.fallback
+            status = {"status": "error", "detail": str(e)}
+        status["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return data, status
+
+    async def fetch_report(self, funder_name: str) -> Dict[str, Any]:
+        """
+        组装报告
+
+        Returns:
+            各分区字段合并后的报告,另含:
+            sections: 分区 -> {"status": "ok"|"timeout"|"error", "elapsed_ms"}
+            complete: 是否所有分区都成功
+        """
+        results = await asyncio.gather(
+            *(self._fetch_section(provider, funder_name) for provider in self.providers)
+        )
+
+        report: Dict[str, Any] = {"fund_name": funder_name}
+        sections: Dict[str, Dict[str, Any]] = {}
+        for provider, (data, status) in zip(self.providers, results):
+            report.update(data)
+            sections[provider.section] = status
+
+        report["sections"] = sections
+        report["complete"] = all(status["status"] == "ok" for status in sections.values())
+        return report
+
+
+# ===========================
+# 报告缓存
+# ===========================
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ReportCache:
+    """
+    异步 LRU 缓存,支持 single-flight 和 stale-while-revalidate
+    cacheable 返回 False 的值不写入缓存(部分报告不应在整个TTL内替代完整报告)
+    只在事件循环线程中使用,无需加锁
+    """
+
+    def __init__(self, max_size: int = INTEL_CACHE_SIZE, ttl_seconds: float = INTEL_CACHE_TTL_SECONDS,
+                 stale_seconds: float = INTEL_CACHE_STALE_SECONDS,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.cacheable = cacheable
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        获取缓存值
+
+        Args:
+            key: 缓存键
+            loader: 未命中或需要刷新时调用的加载函数
+
+        Returns:
+            新鲜值;过期但在宽限期内时立即返回旧值并在后台刷新
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self._load(key, loader)
+                return entry.value
+            del self._entries[key]
+
+        # shield: 某个等待方被取消时不影响其他等待方和缓存写入
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """启动加载;同一键已有进行中的加载时复用"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(_consume_exception)
+        return task
+
+    async def _run(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            if self.cacheable is not None and not self.cacheable(value):
+                # 不缓存(如部分报告),只返回给本次合并的等待方
+                return value
+            now = time.monotonic()
+            self._entries[key] = _Entry(value, now + self.ttl_seconds, now + self.ttl_seconds + self.stale_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """失效指定键;不传则清空"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _consume_exception(task: asyncio.Task):
+    """后台刷新失败时旧值继续可用,这里只取走异常避免 'exception was never retrieved' 警告"""
+    if not task.cancelled():
+        task.exception()
@@ -3,10 +3,12 @@ NegotiaPro AI - Backend API
 FastAPI后端服务
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
+import asyncio
+import json
 import sys
 import os
 
@@ -16,7 +18,13 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..', 'negotiation
 # 导入路由
 from routes_auth import router as auth_router
 from routes_records import router as records_router
-from routes_dashboard import router as dashboard_router
+from routes_dashboard import router as dashboard_router, DASHBOARD_CACHE
+from database import close_storage, get_storage_stats, get_shard_stats
+from playbook import PlaybookIndex, script_response
+from auth import authenticate_token
+from copilot import SessionStore, recommend, COPILOT_IDLE_SECONDS
+from intelligence import ReportAssembler, ReportCache, local_providers
+from metrics import MetricsRegistry, MetricsMiddleware, PROMETHEUS_CONTENT_TYPE
 
 app = FastAPI(title="NegotiaPro AI API", version="1.0.0")
 
@@ -25,6 +33,23 @@ app.include_router(auth_router)
 app.include_router(records_router)
 app.include_router(dashboard_router)
 
+# 话术库(启动时加载并建索引)
+PLAYBOOK_INDEX = PlaybookIndex.from_file()
+
+# 实时谈判会话
+COPILOT_SESSIONS = SessionStore()
+
+# 资方内参数据源及报告缓存
+INTEL_SOURCE = ReportAssembler(local_providers())
+INTEL_CACHE = ReportCache(cacheable=lambda report: report["complete"])
+
+
+@app.on_event("shutdown")
+async def shutdown_storage():
+    """退出前压缩持久化日志"""
+    close_storage()
+
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -32,8 +57,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# 运行指标(最外层中间件,耗时包含CORS等中间件)
+METRICS = MetricsRegistry()
+METRICS.gauge("store_objects", "存储中的对象数", get_storage_stats, label="store")
+METRICS.gauge("cache_entries", "缓存条目数", lambda: {
+    "dashboard": len(DASHBOARD_CACHE),
+    "intelligence": len(INTEL_CACHE),
+    "record_json": sum(stats["record_json"] for stats in get_shard_stats().values()),
+}, label="cache")
+METRICS.gauge("shard_records", "各部门分片的记录数", lambda: {
+    department_id: stats["records"] for department_id, stats in get_shard_stats().items()
+}, label="department")
+METRICS.gauge("copilot_sessions", "实时谈判会话数", lambda: len(COPILOT_SESSIONS))
+app.add_middleware(MetricsMiddleware, registry=METRICS, routes=app.routes)
+
 # ===========================
 # 数据模型
 # ===========================
@@ -46,6 +86,7 @@ class PlaybookRequest(BaseModel):
     """话术查询请求"""
     user_input: str
     scene: Optional[str] = None
+    top_k: int = Field(3, ge=1, le=20)
 
 # ===========================
 # 路由 - Intelligence (对手画像)
@@ -58,67 +99,9 @@ async def generate_intelligence(request: IntelligenceRequest):
     对应CLI版本的 funder_intel_v2_integrated.py
     """
     try:
-        # 这里可以接入真实的Dataphin查询
-        # 现在返回模拟数据作为Demo
-
-        funder_name = request.funder_name
-
-        # 模拟数据（可以根据资方名称返回不同数据）
-        report = {
-            "fund_name": funder_name,
-            "fund_type": "银行" if "银行" in funder_name else "资金方",
-            "cooperation_status": "正常合作",
-            "cooperation_duration": "24个月",
-
-            # 业务数据
-            "outstanding_balance": 8750,   # 在贷余额(万元)
-            "last_month_loan": 1200,       # 上月放款
-            "current_month_plan": 800,     # 本月排期
-            "balance_ratio": 15.2,         # 占比
-
-            # 运营数据
-            "approval_rate": 62.3,         # 审批通过率
-            "m3_overdue_rate": 4.8,        # M3+逾期率
-            "avg_approval_days": 2.1,      # 平均审批时长
-
-            # 商务条件
-            "funding_cost": 7.2,           # 资金成本
-            "deposit_rate": 5.0,           # 保证金比例
-            "cooperation_mode": "风险共担",
-
-            # 关键联系人
-            "contacts": [
-                {
-                    "name": "张总",
-                    "role": "分管副行长",
-                    "phone": "138****1234"
-                },
-                {
-                    "name": "李经理",
-                    "role": "风控部负责人",
-                    "phone": "139****5678"
-                }
-            ],
-
-            # 谈判建议
-            "suggestions": [
-                {
-                    "title": "方案A: 阶梯式保证金",
-                    "recommended": True,
-                    "content": "前3月保证金提至7%，如M3+控制在4%以内则恢复6%；超过4.5%接受提至8%。"
-                },
-                {
-                    "title": "方案B: 替代方案",
-                    "recommended": False,
-                    "content": "保证金维持6% + 增设500万风险准备金 + 引入第三方担保。"
-                },
-                {
-                    "title": "方案C: 折中方案",
-                    "recommended": False,
-                    "content": "保证金提至8% + 优先匹配优质客户 + 增加数据透明度。"
-                }
-            ]
-        }
+        # 这里可以接入真实的Dataphin查询,现在由本地模拟数据源提供
+        funder_name = request.funder_name.strip()
+        report = await INTEL_CACHE.get(funder_name, lambda: INTEL_SOURCE.fetch_report(funder_name))
 
         return {"success": True, "data": report}
 
@@ -137,32 +120,8 @@ async def match_playbook(request: PlaybookRequest):
     对应CLI版本的 playbook_matcher.py
     """
     try:
-        # 这里可以接入真实的话术匹配引擎
-        # 现在返回模拟数据
-
-        user_input = request.user_input
-
-        # 模拟话术推荐
-        scripts = [
-            {
-                "id": "script_001",
-                "name": "阶梯式保证金方案",
-                "scene": "价格/条件谈判",
-                "content": "理解评审委员会的立场。10%确实超出了我们的承受能力，这会直接影响我们的资金使用效率。我想跟您探讨一个阶梯方案：前3个月保证金提至7%，如果这期间我们的资产M3+控制在4%以内，3个月后恢复到6%；如果超过4.5%，我们接受提至8%。",
-                "tips": "不直接拒绝，提出阶梯方案，与资产表现挂钩，给双方回旋余地",
-                "usage_count": 45,
-                "success_rate": 0.78
-            },
-            {
-                "id": "script_002",
-                "name": "数据拆解+改善计划",
-                "scene": "风险数据质疑",
-                "content": "您的数据我们也在密切关注。需要说明的是，4.8%包含了去年Q2的历史遗留资产（那批资产M3+达6.2%），如果只看近6个月新增资产，M3+已经降到3.9%，接近行业水平。",
-                "tips": "拆解数据，区分历史问题和当前表现，展示改善措施和承诺",
-                "usage_count": 32,
-                "success_rate": 0.82
-            }
-        ]
+        matches = PLAYBOOK_INDEX.search(request.user_input, request.scene, request.top_k)
+        scripts = [script_response(script, score) for score, script in matches]
 
         return {"success": True, "data": scripts}
 
@@ -209,6 +168,94 @@ async def realtime_recommend(request: PlaybookRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.websocket("/api/realtime/ws")
+async def realtime_session(websocket: WebSocket, token: str = "",
+                           session_id: Optional[str] = None, scene: Optional[str] = None):
+    """
+    实时谈判会话(WebSocket)
+    连接时用 ?token= 认证一次;传 session_id 可恢复断线前的会话
+
+    客户端消息:
+        {"type": "fragment", "speaker": "opponent"|"self", "text": "...", "final": true}
+        {"type": "scene", "scene": "deposit"}
+        {"type": "ping"} / {"type": "end"}
+    服务端推送:
+        {"type": "session", "session_id", "window"}
+        {"type": "recommendations", "session_id", "data": [话术], "alerts": [提示]}
+        {"type": "pong"} / {"type": "error", "detail"}
+    """
+    await websocket.accept()
+
+    try:
+        user = authenticate_token(token)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=4401)
+        return
+
+    session = COPILOT_SESSIONS.open(user.user_id, session_id, scene)
+    session.last_pushed = None
+    await websocket.send_json({
+        "type": "session",
+        "session_id": session.session_id,
+        "window": [{"speaker": speaker, "text": text} for speaker, text in session.window]
+    })
+
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.receive(), COPILOT_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="idle timeout")
+                return
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+
+            # 只接受文本帧;二进制帧在不同ASGI服务器中可能不带 text 键或 text 为 None
+            text = frame.get("text")
+            if text is None:
+                await websocket.close(code=1003, reason="unsupported data")
+                return
+            try:
+                message = json.loads(text)
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "消息必须是JSON"})
+                continue
+
+            COPILOT_SESSIONS.touch(session)
+            message_type = message.get("type") if isinstance(message, dict) else None
+
+            if message_type == "fragment":
+                text = str(message.get("text") or "").strip()
+                speaker = message.get("speaker", "opponent")
+                if not text:
+                    continue
+                session.add_fragment(speaker, text, bool(message.get("final", True)))
+                if speaker != "opponent":
+                    continue
+            elif message_type == "scene":
+                session.scene = message.get("scene") or None
+                session.last_pushed = None
+            elif message_type == "ping":
+                await websocket.send_json({"type": "pong"})
+                continue
+            elif message_type == "end":
+                COPILOT_SESSIONS.close(session.session_id)
+                await websocket.close(code=1000)
+                return
+            else:
+                await websocket.send_json({"type": "error", "detail": "未知的消息类型"})
+                continue
+
+            update = recommend(PLAYBOOK_INDEX, session)
+            if update is not None:
+                await websocket.send_json(update)
+
+    except WebSocketDisconnect:
+        # 会话保留到空闲超时,客户端可凭 session_id 重连恢复
+        return
+
+
 # ===========================
 # 健康检查
 # ===========================
@@ -219,6 +266,12 @@ async def health_check():
     return {"status": "ok", "message": "NegotiaPro AI API is running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标"""
+    return Response(content=METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -0,0 +1,203 @@
+"""
+运行指标
+按路由模板(如 /api/dashboard/team/{team_id})统计请求数、状态码、延迟直方图和处理中的请求数,
+另可注册存储规模、缓存条目等即时值,以 Prometheus 文本格式输出
+指标只在本进程内统计,多worker部署时由 Prometheus 分别抓取各worker再汇总
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import time
+
+from starlette.routing import Match
+
+
+# 延迟直方图的桶上界(秒),固定不变以便跨实例、跨版本汇总
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 未匹配任何路由的请求统一记为该路由,避免扫描类请求撑爆标签基数
+UNMATCHED_ROUTE = "<unmatched>"
+
+# 请求路径 -> 路由模板的缓存上限(满后清空重建)
+ROUTE_CACHE_SIZE = 10000
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    """固定桶直方图;counts[i] 为落在第i个桶(不含之前的桶)的次数,最后一个为 +Inf"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+GaugeValue = Union[float, Dict[str, float]]
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    请求指标由 MetricsMiddleware 写入,只在事件循环线程中更新,无需加锁
+    """
+
+    def __init__(self, prefix: str = "negotia", buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.requests: Dict[Tuple[str, str, int], int] = {}       # (方法, 路由, 状态码) -> 次数
+        self.latency: Dict[Tuple[str, str], Histogram] = {}       # (方法, 路由) -> 直方图
+        self.in_flight: Dict[Tuple[str, str], int] = {}           # (方法, 路由) -> 处理中请求数
+        self.gauges: List[Tuple[str, str, Optional[str], Callable[[], GaugeValue]]] = []
+        self.started_at = time.time()
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], GaugeValue], label: Optional[str] = None):
+        """
+        注册即时值,抓取时调用 collect 取值
+
+        Args:
+            name: 指标名(不含前缀)
+            help_text: 说明
+            collect: 返回数值;指定 label 时返回 {标签值: 数值}
+            label: 标签名
+        """
+        self.gauges.append((name, help_text, label, collect))
+
+    def request_started(self, method: str, route: str):
+        key = (method, route)
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route)
+        self.in_flight[key] -= 1
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        status_key = (method, route, status)
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        p = self.prefix
+        lines: List[str] = []
+
+        lines.append(f"# HELP {p}_http_requests_total HTTP请求数")
+        lines.append(f"# TYPE {p}_http_requests_total counter")
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"{p}_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines.append(f"# HELP {p}_http_request_duration_seconds HTTP请求处理耗时(含响应体发送)")
+        lines.append(f"# TYPE {p}_http_request_duration_seconds histogram")
+        for (method, route), histogram in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                labels = _labels(method=method, route=route, le=_number(bound))
+                lines.append(f"{p}_http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels(method=method, route=route, le="+Inf")
+            lines.append(f"{p}_http_request_duration_seconds_bucket{labels} {histogram.count}")
+            labels = _labels(method=method, route=route)
+            lines.append(f"{p}_http_request_duration_seconds_sum{labels} {_number(histogram.sum)}")
+            lines.append(f"{p}_http_request_duration_seconds_count{labels} {histogram.count}")
+
+        lines.append(f"# HELP {p}_http_requests_in_flight 处理中的HTTP请求数")
+        lines.append(f"# TYPE {p}_http_requests_in_flight gauge")
+        for (method, route), count in sorted(self.in_flight.items()):
+            lines.append(f"{p}_http_requests_in_flight{_labels(method=method, route=route)} {count}")
+
+        lines.append(f"# HELP {p}_process_start_time_seconds 进程启动时间(Unix时间戳)")
+        lines.append(f"# TYPE {p}_process_start_time_seconds gauge")
+        lines.append(f"{p}_process_start_time_seconds {_number(self.started_at)}")
+
+        for name, help_text, label, collect in self.gauges:
+            try:
+                value = collect()
+            except Exception:
+                # 单个指标取值失败不影响其他指标输出
+                continue
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            if label is None:
+                lines.append(f"{p}_{name} {_number(value)}")
+            else:
+                for key, item in sorted(value.items()):
+                    lines.append(f"{p}_{name}{_labels(**{label: key})} {_number(item)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: Any) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsMiddleware:
+    """
+    ASGI中间件: 统计每个HTTP请求
+    耗时统计到响应体发送完毕(流式导出等响应也计入完整耗时);未发出响应即抛异常的请求记为500
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, routes: List[Any]):
+        self.app = app
+        self.registry = registry
+        self.routes = routes            # 应用的路由列表(引用,之后注册的路由同样生效)
+        self._route_cache: Dict[Tuple[str, str], str] = {}
+
+    def route_template(self, scope: dict) -> str:
+        """请求对应的路由模板;只有方法不匹配的路由(405)也归到该路由"""
+        key = (scope["method"], scope["path"])
+        template = self._route_cache.get(key)
+        if template is not None:
+            return template
+
+        template = UNMATCHED_ROUTE
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+            if match == Match.PARTIAL and template == UNMATCHED_ROUTE:
+                template = route.path
+
+        if len(self._route_cache) >= ROUTE_CACHE_SIZE:
+            self._route_cache.clear()
+        self._route_cache[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self.route_template(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.registry.request_started(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.request_finished(method, route, status, time.perf_counter() - start)
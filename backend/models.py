@@ -2,12 +2,30 @@
 数据模型定义
 """
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 
 
+# ===========================
+# 时间类型
+# ===========================
+
+def to_local_naive(value: datetime) -> datetime:
+    """
+    带时区的时间换算为服务器本地时间并去掉时区
+    系统内的时间一律是 datetime.now() 产生的本地无时区时间,索引和比较要求同一种形式,
+    客户端传入的 "2026-10-01T10:00:00Z"、"+08:00" 等在模型/路由边界统一转换
+    """
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+LocalDatetime = Annotated[datetime, AfterValidator(to_local_naive)]
+
+
 # ===========================
 # 枚举类型
 # ===========================
@@ -61,7 +79,7 @@ class User(BaseModel):
     team_id: str = Field(..., description="所属团队ID")
     department_id: str = Field(..., description="所属部门ID")
     manager_id: Optional[str] = Field(None, description="直属上级ID")
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: LocalDatetime = Field(default_factory=datetime.now)
 
 
 class Team(BaseModel):
@@ -81,9 +99,9 @@ class TodoItem(BaseModel):
     """待办事项"""
     content: str = Field(..., description="待办内容")
     status: TodoStatus = Field(default=TodoStatus.PENDING)
-    deadline: Optional[datetime] = Field(None, description="截止日期")
-    created_at: datetime = Field(default_factory=datetime.now)
-    completed_at: Optional[datetime] = Field(None, description="完成时间")
+    deadline: Optional[LocalDatetime] = Field(None, description="截止日期")
+    created_at: LocalDatetime = Field(default_factory=datetime.now)
+    completed_at: Optional[LocalDatetime] = Field(None, description="完成时间")
 
 
 class NegotiationMetrics(BaseModel):
@@ -114,7 +132,7 @@ class NegotiationRecord(BaseModel):
     # 基本信息
     funder_name: str = Field(..., description="资方名称")
     visit_type: VisitType = Field(..., description="拜访类型")
-    visit_date: datetime = Field(..., description="拜访日期")
+    visit_date: LocalDatetime = Field(..., description="拜访日期")
     scene: NegotiationScene = Field(..., description="谈判场景")
 
     # 谈判内容
@@ -145,8 +163,8 @@ class NegotiationRecord(BaseModel):
     participants: List[Participant] = Field(default_factory=list, description="参会人员列表")
 
     # 时间戳
-    created_at: datetime = Field(default_factory=datetime.now)
-    updated_at: datetime = Field(default_factory=datetime.now)
+    created_at: LocalDatetime = Field(default_factory=datetime.now)
+    updated_at: LocalDatetime = Field(default_factory=datetime.now)
 
 
 # ===========================
@@ -171,7 +189,7 @@ class CreateRecordRequest(BaseModel):
     """创建谈判记录请求"""
     funder_name: str
     visit_type: VisitType
-    visit_date: datetime
+    visit_date: LocalDatetime
     scene: NegotiationScene
     objective: str
     key_points: List[str] = []
@@ -179,6 +197,12 @@ class CreateRecordRequest(BaseModel):
     their_position: str = ""
 
 
+class ImportRecordRequest(CreateRecordRequest):
+    """批量导入的单行记录: 可保留原记录的归属人和创建时间(需有该用户的权限)"""
+    user_id: Optional[str] = Field(None, description="归属人工号,默认为导入人")
+    created_at: Optional[LocalDatetime] = Field(None, description="创建时间,默认为导入时间")
+
+
 class UpdateRecordRequest(BaseModel):
     """更新谈判记录请求"""
     result: Optional[str] = None
@@ -188,6 +212,11 @@ class UpdateRecordRequest(BaseModel):
     metrics: Optional[NegotiationMetrics] = None
 
 
+class BatchGetRecordsRequest(BaseModel):
+    """批量获取记录请求"""
+    record_ids: List[str] = Field(..., min_length=1, max_length=500, description="记录ID列表")
+
+
 # ===========================
 # 看板数据模型
 # ===========================
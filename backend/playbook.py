@@ -0,0 +1,190 @@
+"""
+话术库与匹配引擎
+话术从本地JSON文件加载,按中文二元组(bigram)和英文/数字词建倒排索引,BM25打分后取Top-K
+倒排表存为 NumPy 数组,查询时向量化累加得分
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+import heapq
+import json
+import math
+import os
+import re
+import numpy as np
+
+
+PLAYBOOK_PATH = os.environ.get(
+    "NEGOTIA_PLAYBOOK_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "playbook_scripts.json")
+)
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 各字段的词频权重(标题和关键词比正文更能代表话术主题)
+FIELD_WEIGHTS = {"name": 2.0, "keywords": 3.0, "content": 1.0, "tips": 0.5}
+
+# 连续汉字串 / 英文数字串(保留 % + . 以便匹配 "10%"、"M3+"、"4.5%" 等)
+_TOKEN_RE = re.compile(r"[一-鿿]+|[A-Za-z0-9][A-Za-z0-9.%+]*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词: 汉字串切成相邻二元组(单字串保留单字),英文数字串整体小写作为一个词
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall(text or ""):
+        if run[0] < "一":
+            tokens.append(run.lower().rstrip("."))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+# 倒排表: (话术序号, 权重)
+Posting = Tuple[np.ndarray, np.ndarray]
+
+
+def _freeze(postings: Dict[str, List[Tuple[int, float]]]) -> Dict[str, Posting]:
+    return {
+        token: (np.fromiter((doc for doc, _ in entries), np.int32, len(entries)),
+                np.fromiter((weight for _, weight in entries), np.float64, len(entries)))
+        for token, entries in postings.items()
+    }
+
+
+class PlaybookIndex:
+    """
+    话术倒排索引
+
+    postings: 词 -> (话术序号数组, BM25权重数组),文档长度归一化在建索引时完成,查询时只需累加
+    scene_postings: 场景 -> 词 -> 同上(带场景过滤的查询只扫描该场景的倒排表)
+    """
+
+    def __init__(self, scripts: Iterable[Dict[str, Any]]):
+        self.scripts: List[Dict[str, Any]] = list(scripts)
+        self.postings: Dict[str, Posting] = {}
+        self.scene_postings: Dict[str, Dict[str, Posting]] = {}
+        self.scene_aliases: Dict[str, str] = {}
+        self._build()
+
+    @classmethod
+    def from_file(cls, path: str = PLAYBOOK_PATH) -> "PlaybookIndex":
+        """从JSON文件加载话术库(文件不存在时为空库)"""
+        if not os.path.exists(path):
+            return cls([])
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _build(self):
+        term_freqs: List[Counter] = []
+        for script in self.scripts:
+            tf: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = script.get(field) or ""
+                text = " ".join(value) if isinstance(value, list) else value
+                for token in tokenize(text):
+                    tf[token] += weight
+            term_freqs.append(tf)
+
+            scene = script.get("scene") or ""
+            self.scene_aliases[scene] = scene
+            if script.get("scene_name"):
+                self.scene_aliases[script["scene_name"]] = scene
+
+        n = len(self.scripts)
+        if n == 0:
+            return
+        lengths = [sum(tf.values()) for tf in term_freqs]
+        avg_length = sum(lengths) / n
+
+        doc_freq: Counter = Counter()
+        for tf in term_freqs:
+            doc_freq.update(tf.keys())
+        idf = {token: math.log(1 + (n - df + 0.5) / (df + 0.5)) for token, df in doc_freq.items()}
+
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        scene_postings: Dict[str, Dict[str, List[Tuple[int, float]]]] = {}
+        for doc, tf in enumerate(term_freqs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length)
+            by_scene = scene_postings.setdefault(self.scripts[doc].get("scene") or "", {})
+            for token, freq in tf.items():
+                entry = (doc, idf[token] * freq * (BM25_K1 + 1) / (freq + norm))
+                postings.setdefault(token, []).append(entry)
+                by_scene.setdefault(token, []).append(entry)
+
+        self.postings = _freeze(postings)
+        self.scene_postings = {scene: _freeze(entries) for scene, entries in scene_postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.scripts)
+
+    def resolve_scene(self, scene: Optional[str]) -> Optional[str]:
+        """场景过滤条件可以是场景ID(如 deposit)或场景名称(如 价格/条件谈判)"""
+        if not scene:
+            return None
+        return self.scene_aliases.get(scene, scene)
+
+    def search(self, query: str, scene: Optional[str] = None, top_k: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        匹配话术
+
+        Args:
+            query: 用户输入(对方的原话或谈判情境描述)
+            scene: 场景过滤,None表示不过滤
+            top_k: 返回条数
+
+        Returns:
+            [(得分, 话术)],按得分降序;无任何命中时按成功率和使用次数返回热门话术,得分为0
+        """
+        scene = self.resolve_scene(scene)
+        if scene is None:
+            postings = self.postings
+        else:
+            postings = self.scene_postings.get(scene, {})
+
+        scores = None
+        for token in set(tokenize(query)):
+            posting = postings.get(token)
+            if posting is None:
+                continue
+            if scores is None:
+                scores = np.zeros(len(self.scripts))
+            docs, weights = posting
+            scores[docs] += weights
+
+        if scores is not None:
+            hits = np.flatnonzero(scores)
+            if hits.size > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            best = sorted(hits.tolist(), key=lambda doc: (-scores[doc], doc))
+            return [(float(scores[doc]), self.scripts[doc]) for doc in best]
+
+        candidates = (
+            script for script in self.scripts
+            if scene is None or script.get("scene") == scene
+        )
+        popular = heapq.nlargest(
+            top_k, candidates,
+            key=lambda script: (script.get("success_rate", 0), script.get("usage_count", 0))
+        )
+        return [(0.0, script) for script in popular]
+
+
+def script_response(script: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """话术的API响应格式(scene 为展示用的场景名称,scene_id 为场景ID)"""
+    return {
+        "id": script["id"],
+        "name": script["name"],
+        "scene": script.get("scene_name") or script.get("scene"),
+        "scene_id": script.get("scene"),
+        "content": script["content"],
+        "tips": script.get("tips", ""),
+        "usage_count": script.get("usage_count", 0),
+        "success_rate": script.get("success_rate", 0.0),
+        "score": round(score, 4)
+    }
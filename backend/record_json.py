@@ -0,0 +1,65 @@
+"""
+记录JSON序列化缓存
+列表和详情接口直接拼接每条记录缓存的JSON字节,跳过 response_model 的逐条校验和重新序列化
+作为记录观察者注册: 记录修改前 remove() 丢弃缓存,下次读取时按需重新序列化
+"""
+
+from compact_record import CompactRecord
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+import threading
+
+
+# 缓存的记录数上限(按最近读取淘汰)
+RECORD_JSON_CACHE_SIZE = 100000
+
+
+def encode_records(parts: Iterable[bytes]) -> bytes:
+    """将逐条序列化的记录拼接为JSON数组"""
+    return b"[" + b",".join(parts) + b"]"
+
+
+class RecordJsonCache:
+    """
+    记录ID -> (记录, 序列化后的JSON字节)(LRU)
+
+    紧凑记录不可变,每次修改都整条替换,缓存条目以记录对象本身作为版本: 读取时只有对象相同才命中。
+    写入新记录时不序列化(批量导入等写路径不付序列化开销,只缓存被读取过的记录),remove 时丢弃,
+    读取时懒加载;回填由分片在分片锁内进行,且只回填分片中的当前记录(见 RecordShard.encode_record),
+    锁外读到的旧记录不会把旧内容写回缓存
+    """
+
+    def __init__(self, max_size: int = RECORD_JSON_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[CompactRecord, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record: CompactRecord) -> Optional[bytes]:
+        """record 这一版本的缓存,未缓存或缓存的是其他版本时返回 None"""
+        with self._lock:
+            entry = self._entries.get(record.record_id)
+            if entry is None or entry[0] is not record:
+                return None
+            self._entries.move_to_end(record.record_id)
+            return entry[1]
+
+    def put(self, record: CompactRecord, body: bytes):
+        with self._lock:
+            self._entries[record.record_id] = (record, body)
+            self._entries.move_to_end(record.record_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def add(self, record: CompactRecord):
+        pass
+
+    def remove(self, record: CompactRecord):
+        with self._lock:
+            self._entries.pop(record.record_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
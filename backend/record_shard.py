@@ -0,0 +1,538 @@
+"""
+谈判记录分片
+内存存储按 department_id 把记录划分为多个分片,每个分片持有自己的记录、二级索引、时间索引、
+派生数据(成员聚合、资方统计、列式镜像、全文索引、JSON缓存、待办索引)和锁,不同部门的读写互不阻塞
+分片可放在本进程内(RecordShard),也可托管在独立的worker进程中(ShardPool + RemoteShard),
+由 database.py 的路由层按部门分发请求
+"""
+
+from models import NegotiationRecord, TodoItem, TodoStatus
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import bisect
+import functools
+import multiprocessing
+import threading
+import zlib
+
+from aggregates import MemberStats, TeamAggregates
+from search_index import RecordSearchIndex
+from columnar import ColumnarStore
+from record_json import RecordJsonCache
+from todo_index import TodoIndex
+from funder_stats import FunderStatsIndex
+from compact_record import CompactRecord
+
+
+# 记录二级索引字段: 字段 -> 字段值 -> 记录ID(有序dict当作有序集合,保持插入顺序)
+INDEXED_FIELDS = ("user_id", "team_id", "department_id", "funder_name")
+
+# 时间有序索引: (范围字段, 字段值, 时间字段) -> [(时间, 记录ID)] 升序
+TIME_SCOPE_FIELDS = ("user_id", "team_id", "department_id")
+TIME_INDEXED_FIELDS = ("created_at", "visit_date")
+
+# 批量写入时,新条目不超过该数量则逐条二分插入时间索引,超过则与交错的尾部合并排序
+TIME_INDEX_INSORT_MAX = 32
+
+PageKey = Tuple[datetime, str]
+
+
+def match_filter(record: NegotiationRecord, filter_dict: dict) -> bool:
+    """逐字段比较过滤条件"""
+    for key, value in filter_dict.items():
+        if not hasattr(record, key) or getattr(record, key) != value:
+            return False
+    return True
+
+
+def _locked(method: Callable) -> Callable:
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# ===========================
+# 进程内分片
+# ===========================
+
+class RecordShard:
+    """
+    单个部门的记录分片
+    分片内只保存 department_id 等于本分片部门的记录;修改导致记录换部门时,记录从本分片移除,
+    由路由层写入新部门的分片。所有公开方法在分片锁内执行
+    """
+
+    def __init__(self, department_id: str):
+        self.department_id = department_id
+        self.lock = threading.RLock()
+        self.records: Dict[str, CompactRecord] = {}
+        self.frozen: List[CompactRecord] = []         # 快照进行中时冻结的记录
+        self.indexes: Dict[str, Dict[Any, Dict[str, None]]] = {field: {} for field in INDEXED_FIELDS}
+        self.time_indexes: Dict[Tuple[str, Any, str], List[Tuple[datetime, str]]] = {}
+        self.aggregates = TeamAggregates()
+        self.columnar = ColumnarStore()
+        self.search_index = RecordSearchIndex()
+        self.json_cache = RecordJsonCache()
+        self.todos = TodoIndex()
+        self.funder_stats = FunderStatsIndex()
+        # 记录派生数据的观察者,需实现 add(record) / remove(record) / clear();
+        # 记录每次修改前调用 remove(旧值),修改后调用 add(新值)
+        self.observers: List[Any] = [
+            self.aggregates, self.funder_stats, self.columnar, self.search_index, self.json_cache, self.todos
+        ]
+
+    # ---------- 索引维护 ----------
+
+    def _index_add(self, record: CompactRecord):
+        for field in INDEXED_FIELDS:
+            self.indexes[field].setdefault(getattr(record, field), {})[record.record_id] = None
+
+        for scope_field in TIME_SCOPE_FIELDS:
+            for time_field in TIME_INDEXED_FIELDS:
+                key = (scope_field, getattr(record, scope_field), time_field)
+                bisect.insort(self.time_indexes.setdefault(key, []), (getattr(record, time_field), record.record_id))
+
+    def _index_remove(self, record: CompactRecord):
+        for field in INDEXED_FIELDS:
+            bucket = self.indexes[field].get(getattr(record, field))
+            if bucket is None:
+                continue
+            bucket.pop(record.record_id, None)
+            if not bucket:
+                del self.indexes[field][getattr(record, field)]
+
+        for scope_field in TIME_SCOPE_FIELDS:
+            for time_field in TIME_INDEXED_FIELDS:
+                key = (scope_field, getattr(record, scope_field), time_field)
+                entries = self.time_indexes.get(key)
+                if not entries:
+                    continue
+                entry = (getattr(record, time_field), record.record_id)
+                pos = bisect.bisect_left(entries, entry)
+                if pos < len(entries) and entries[pos] == entry:
+                    entries.pop(pos)
+                if not entries:
+                    del self.time_indexes[key]
+
+    def _drop(self, record: CompactRecord):
+        del self.records[record.record_id]
+        self._index_remove(record)
+        for observer in self.observers:
+            observer.remove(record)
+
+    # ---------- 读 ----------
+
+    @_locked
+    def get_record(self, record_id: str) -> Optional[CompactRecord]:
+        return self.records.get(record_id)
+
+    @_locked
+    def get_records_by_ids(self, record_ids: List[str]) -> List[CompactRecord]:
+        return [self.records[record_id] for record_id in record_ids if record_id in self.records]
+
+    @_locked
+    def get_records(self, filter_dict: Optional[dict] = None) -> List[CompactRecord]:
+        if filter_dict is None:
+            return list(self.records.values())
+
+        # 等值条件走索引: 从最小的候选集开始求交集
+        buckets = []
+        rest = {}
+        for key, value in filter_dict.items():
+            if key in self.indexes:
+                buckets.append(self.indexes[key].get(value, {}))
+            else:
+                rest[key] = value
+
+        if not buckets:
+            return [record for record in self.records.values() if match_filter(record, rest)]
+
+        buckets.sort(key=len)
+        smallest, others = buckets[0], buckets[1:]
+
+        results = []
+        for record_id in smallest:
+            if any(record_id not in bucket for bucket in others):
+                continue
+            record = self.records[record_id]
+            if rest and not match_filter(record, rest):
+                continue
+            results.append(record)
+        return results
+
+    @_locked
+    def get_records_in_range(self, scope: dict, start: Optional[datetime], end: Optional[datetime],
+                             time_field: str) -> List[CompactRecord]:
+        candidates = [
+            self.time_indexes.get((key, value, time_field), [])
+            for key, value in scope.items() if key in TIME_SCOPE_FIELDS
+        ]
+        if not candidates:
+            records = [
+                r for r in self.get_records(scope)
+                if (start is None or getattr(r, time_field) >= start)
+                and (end is None or getattr(r, time_field) < end)
+            ]
+            records.sort(key=lambda r: getattr(r, time_field))
+            return records
+
+        entries = min(candidates, key=len)
+        lo = bisect.bisect_left(entries, (start,)) if start is not None else 0
+        hi = bisect.bisect_left(entries, (end,)) if end is not None else len(entries)
+
+        results = []
+        for _, record_id in entries[lo:hi]:
+            record = self.records[record_id]
+            if len(scope) > 1 and not match_filter(record, scope):
+                continue
+            results.append(record)
+        return results
+
+    @_locked
+    def earliest_time(self, scope: dict, time_field: str) -> Optional[datetime]:
+        """范围内最早的时间: 取时间索引的首个条目(多个条件时顺序找到第一条满足的记录)"""
+        candidates = [
+            self.time_indexes.get((key, value, time_field), [])
+            for key, value in scope.items() if key in TIME_SCOPE_FIELDS
+        ]
+        if not candidates:
+            return min((getattr(r, time_field) for r in self.get_records(scope)), default=None)
+
+        for value, record_id in min(candidates, key=len):
+            if len(scope) == 1 or match_filter(self.records[record_id], scope):
+                return value
+        return None
+
+    @_locked
+    def get_records_page(self, filter_dict: dict, limit: int,
+                         before: Optional[PageKey]) -> Tuple[List[CompactRecord], Optional[PageKey]]:
+        candidates = [
+            self.time_indexes.get((key, value, "created_at"), [])
+            for key, value in filter_dict.items() if key in TIME_SCOPE_FIELDS
+        ]
+        buckets = [
+            self.indexes[key].get(value, {})
+            for key, value in filter_dict.items()
+            if key in self.indexes and key not in TIME_SCOPE_FIELDS
+        ]
+        entries = min(candidates, key=len) if candidates else None
+        smallest_bucket = min(buckets, key=len) if buckets else None
+
+        # 其他等值条件更有选择性(如指定资方)时,先按索引取候选再排序
+        if entries is None or (smallest_bucket is not None and len(smallest_bucket) < len(entries)):
+            entries = sorted((r.created_at, r.record_id) for r in self.get_records(filter_dict))
+            check = False
+        else:
+            check = len(filter_dict) > 1
+
+        pos = bisect.bisect_left(entries, before) if before is not None else len(entries)
+
+        page = []
+        while pos > 0 and len(page) <= limit:
+            pos -= 1
+            record = self.records[entries[pos][1]]
+            if check and not match_filter(record, filter_dict):
+                continue
+            page.append(record)
+
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            return page, (last.created_at, last.record_id)
+        return page, None
+
+    @_locked
+    def get_member_stats(self, team_id: str, start: Optional[datetime]) -> Dict[str, MemberStats]:
+        if start is None:
+            return self.aggregates.member_stats(team_id)
+
+        # 整日部分走日桶,起始当天不足一天的部分按时间索引精确补齐
+        stats = self.aggregates.member_stats(team_id, after_day=start.date())
+        day_end = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+        for record in self.get_records_in_range({"team_id": team_id}, start, day_end, "created_at"):
+            stats.setdefault(record.user_id, MemberStats()).add_record(record)
+        return stats
+
+    @_locked
+    def search(self, terms: List[str], filter_dict: dict, limit: int) -> List[Tuple[float, CompactRecord]]:
+        return self.search_index.search(
+            terms, filter_dict, self.records.get, lambda record: match_filter(record, filter_dict), limit
+        )
+
+    @_locked
+    def due_todos(self, scope: dict, start: Optional[datetime], end: Optional[datetime],
+                  limit: int) -> List[Tuple[datetime, CompactRecord, int]]:
+        keys = self.todos.due(scope, start, end, limit, lambda key: match_filter(self.records[key[1]], scope))
+        return [(deadline, self.records[record_id], i) for deadline, record_id, i in keys]
+
+    @_locked
+    def top_funders(self, scope_field: str, value: str, limit: Optional[int]) -> List[Tuple[str, Dict[str, Any]]]:
+        return self.funder_stats.top(scope_field, value, limit)
+
+    @_locked
+    def department_analytics(self, start: datetime) -> Dict[str, Any]:
+        return self.columnar.department_analytics(self.department_id, start)
+
+    def encode_record(self, record: CompactRecord) -> bytes:
+        """记录的JSON字节(与 response_model=NegotiationRecord 的输出等价);序列化在锁外进行"""
+        body = self.json_cache.get(record)
+        if body is not None:
+            return body
+        body = record.to_model().model_dump_json().encode()
+        with self.lock:
+            # 只缓存分片中的当前记录: 锁外读到的记录可能已被替换
+            if self.records.get(record.record_id) is record:
+                self.json_cache.put(record, body)
+        return body
+
+    # ---------- 快照 ----------
+
+    @_locked
+    def freeze(self) -> int:
+        """冻结当前记录(只复制引用,之后的修改整条替换记录,不影响冻结的内容),返回条数"""
+        self.frozen = list(self.records.values())
+        return len(self.frozen)
+
+    def frozen_models(self, start: int, count: int) -> List[NegotiationRecord]:
+        return [record.to_model() for record in self.frozen[start:start + count]]
+
+    def release(self):
+        self.frozen = []
+
+    @_locked
+    def stats(self) -> Dict[str, int]:
+        return {"records": len(self.records), "record_json": len(self.json_cache)}
+
+    @_locked
+    def clear(self):
+        self.records.clear()
+        for index in self.indexes.values():
+            index.clear()
+        self.time_indexes.clear()
+        for observer in self.observers:
+            observer.clear()
+
+    # ---------- 写 ----------
+
+    @_locked
+    def put_records(self, models: List[NegotiationRecord]) -> List[Optional[CompactRecord]]:
+        """
+        写入/覆盖记录(均属于本分片部门),返回各条被覆盖的旧记录
+        时间索引每个键只合并排序一次,不再逐条插入
+        """
+        # 先在修改任何状态之前构建紧凑记录和排好序的时间索引条目,出错时分片保持原样
+        records = [CompactRecord.from_model(model) for model in models]
+        time_entries: Dict[tuple, list] = {}
+        for record in records:
+            for scope_field in TIME_SCOPE_FIELDS:
+                for time_field in TIME_INDEXED_FIELDS:
+                    key = (scope_field, getattr(record, scope_field), time_field)
+                    time_entries.setdefault(key, []).append((getattr(record, time_field), record.record_id))
+        for new_entries in time_entries.values():
+            new_entries.sort()
+
+        olds = []
+        for record in records:
+            old = self.records.get(record.record_id)
+            if old is not None:
+                self._drop(old)
+            olds.append(old)
+            self.records[record.record_id] = record
+
+            for field in INDEXED_FIELDS:
+                self.indexes[field].setdefault(getattr(record, field), {})[record.record_id] = None
+            for observer in self.observers:
+                observer.add(record)
+
+        for key, new_entries in time_entries.items():
+            entries = self.time_indexes.setdefault(key, [])
+            pos = bisect.bisect_left(entries, new_entries[0])
+            if pos == len(entries):
+                entries.extend(new_entries)
+            elif len(new_entries) <= TIME_INDEX_INSORT_MAX:
+                # 新条目很少(单条写入、重放): 逐条插入只移动指针,不复制和重排尾部
+                for entry in new_entries:
+                    bisect.insort(entries, entry)
+            else:
+                # 只重排与新条目交错的尾部(两段各自有序,timsort 线性合并)
+                tail = entries[pos:]
+                del entries[pos:]
+                tail.extend(new_entries)
+                tail.sort()
+                entries.extend(tail)
+        return olds
+
+    @_locked
+    def delete_record(self, record_id: str) -> Optional[CompactRecord]:
+        old = self.records.get(record_id)
+        if old is not None:
+            self._drop(old)
+        return old
+
+    def _replace(self, old: CompactRecord, model: NegotiationRecord,
+                 reindex: bool) -> Tuple[CompactRecord, NegotiationRecord]:
+        """用修改后的模型整体替换记录(reindex: 是否涉及索引字段);换部门的记录只移除"""
+        if model.department_id != self.department_id:
+            self._drop(old)
+            return old, model
+
+        if reindex:
+            self._index_remove(old)
+        for observer in self.observers:
+            observer.remove(old)
+        record = self.records[old.record_id] = CompactRecord.from_model(model)
+        if reindex:
+            self._index_add(record)
+        for observer in self.observers:
+            observer.add(record)
+        return old, model
+
+    @_locked
+    def update_record(self, record_id: str, updates: dict,
+                      now: datetime) -> Optional[Tuple[CompactRecord, NegotiationRecord]]:
+        old = self.records.get(record_id)
+        if old is None:
+            return None
+
+        model = old.to_model()
+        for key, value in updates.items():
+            if hasattr(model, key) and value is not None:
+                setattr(model, key, value)
+        model.updated_at = now
+
+        reindex = any(key in self.indexes or key in TIME_INDEXED_FIELDS for key in updates)
+        return self._replace(old, model, reindex)
+
+    @_locked
+    def add_record_todo(self, record_id: str, todo: TodoItem,
+                        now: datetime) -> Optional[Tuple[CompactRecord, NegotiationRecord]]:
+        old = self.records.get(record_id)
+        if old is None:
+            return None
+
+        model = old.to_model()
+        model.todos.append(todo)
+        model.updated_at = now
+        return self._replace(old, model, False)
+
+    @_locked
+    def complete_record_todo(self, record_id: str, todo_index: int,
+                             now: datetime) -> Optional[Tuple[CompactRecord, NegotiationRecord]]:
+        old = self.records.get(record_id)
+        if old is None:
+            return None
+
+        model = old.to_model()
+        todo = model.todos[todo_index]
+        todo.status = TodoStatus.COMPLETED
+        todo.completed_at = now
+        model.updated_at = now
+        return self._replace(old, model, False)
+
+
+# ===========================
+# worker进程托管的分片
+# ===========================
+
+# RemoteShard 转发到worker进程的方法
+REMOTE_METHODS = frozenset((
+    "get_record", "get_records_by_ids", "get_records", "get_records_in_range", "earliest_time", "get_records_page", "get_member_stats",
+    "search", "due_todos", "top_funders", "department_analytics", "freeze", "frozen_models", "release", "stats", "clear",
+    "put_records", "delete_record", "update_record", "add_record_todo", "complete_record_todo",
+))
+
+
+def _serve(conn):
+    """worker进程主循环: 按 (部门, 方法, 参数) 调用本进程内的分片,逐个请求串行处理"""
+    shards: Dict[str, RecordShard] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        department_id, method, args = message
+        shard = shards.get(department_id)
+        if shard is None:
+            shard = shards[department_id] = RecordShard(department_id)
+        try:
+            result = ("ok", getattr(shard, method)(*args))
+        except Exception as e:
+            result = ("error", e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # 异常对象无法序列化时退化为 RuntimeError
+            conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class ShardWorker:
+    """一个worker进程及与之通信的管道;管道非线程安全,请求-响应整体在锁内完成"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.lock = threading.Lock()
+
+    def call(self, department_id: str, method: str, args: tuple):
+        with self.lock:
+            self.conn.send((department_id, method, args))
+            status, result = self.conn.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class RemoteShard:
+    """
+    托管在worker进程中的分片代理,接口与 RecordShard 一致
+    记录JSON在本进程序列化,不缓存(缓存的记录对象在worker进程中)
+    """
+
+    def __init__(self, worker: ShardWorker, department_id: str):
+        self.worker = worker
+        self.department_id = department_id
+
+    def __getattr__(self, name: str):
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+        return lambda *args: self.worker.call(self.department_id, name, args)
+
+    def encode_record(self, record: CompactRecord) -> bytes:
+        return record.to_model().model_dump_json().encode()
+
+
+class ShardPool:
+    """
+    worker进程池: 部门按 crc32(department_id) 固定分配到某个worker,一个worker可托管多个部门分片
+    workers 个进程并行处理不同部门的请求,单个部门内的请求在其worker中串行执行
+    """
+
+    def __init__(self, workers: int):
+        # 支持 fork 的平台用 fork: spawn 会在子进程中重新导入主模块(进而重新初始化存储)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.workers = [ShardWorker(context) for _ in range(workers)]
+
+    def shard(self, department_id: str) -> RemoteShard:
+        worker = self.workers[zlib.crc32(department_id.encode()) % len(self.workers)]
+        return RemoteShard(worker, department_id)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
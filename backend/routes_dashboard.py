@@ -2,8 +2,9 @@
 Dashboard API路由 - 团队和部门看板
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional, Callable, Hashable
 from datetime import datetime, timedelta
 from collections import defaultdict
 
@@ -13,13 +14,61 @@ from models import (
 )
 from auth import get_current_user, check_resource_access
 from database import (
-    get_records, get_users_by_team, get_teams_by_department,
-    get_team_by_id, get_user_by_id
+    get_records_in_range, get_earliest_record_time, get_users_by_team, get_teams_by_department,
+    get_users_by_department, get_team_by_id, get_user_by_id, get_member_stats,
+    get_data_version, get_department_analytics, get_top_funders
 )
+from aggregates import MemberStats
+from dashboard_cache import DashboardCache, etag_matches
+from dashboard_engine import run_pass, Windowed, GroupStats, period_bucket
 
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
+# 场景中文名
+SCENE_NAMES = {
+    "cost": "资金成本谈判",
+    "deposit": "保证金条款谈判",
+    "risk": "风险质疑",
+    "compliance": "合规施压",
+    "volume": "业务量承诺",
+    "icebreaking": "新机构破冰"
+}
+
+# 月度趋势覆盖的月数(每月按30天计)
+TREND_MONTHS = 6
+
+# 团队资方覆盖、部门资方健康度展示的资方数(按业务量排名)
+FUNDER_COVERAGE_TOP_N = 20
+FUNDER_HEALTH_TOP_N = 10
+
+# 看板响应缓存: 数据版本变化立即失效,TTL兜底滚动时间窗口
+DASHBOARD_CACHE = DashboardCache(max_size=256, ttl_seconds=300)
+
+
+def _months_since(earliest: Optional[datetime]) -> float:
+    """从最早记录至今的月数(至少为1),用于计算月均拜访次数"""
+    if earliest is None:
+        return 1
+    return max((datetime.now() - earliest).days / 30, 1)
+
+
+async def _cached_response(key: Hashable, version: int, build: Callable, if_none_match: Optional[str]) -> Response:
+    """
+    返回缓存的看板响应
+    未命中时在线程池中计算并缓存序列化结果(不阻塞事件循环,各部门分片的计算可并行);
+    If-None-Match 命中ETag时返回空的304
+    """
+    entry = DASHBOARD_CACHE.get(key, version)
+    if entry is None:
+        body = await run_in_threadpool(lambda: build().model_dump_json().encode("utf-8"))
+        entry = DASHBOARD_CACHE.put(key, version, body)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 
 # ===========================
 # 团队看板
@@ -28,11 +77,13 @@ router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 @router.get("/team/{team_id}", response_model=TeamDashboardData)
 async def get_team_dashboard(
     team_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     获取团队看板数据
     权限: team_leader(本组), director(本部门所有组)
+    支持 ETag / If-None-Match,数据未变化时返回304
     """
     # 权限检查
     if current_user.role == Role.EMPLOYEE:
@@ -51,113 +102,78 @@ async def get_team_dashboard(
     if current_user.role == Role.DIRECTOR and current_user.department_id != team.department_id:
         raise HTTPException(status_code=403, detail="只能查看本部门的团队")
 
-    # 获取团队所有记录
-    records = get_records({"team_id": team_id})
+    return await _cached_response(
+        ("team", team_id),
+        get_data_version("team_id", team_id),
+        lambda: build_team_dashboard(team_id),
+        if_none_match
+    )
 
+
+def build_team_dashboard(team_id: str) -> TeamDashboardData:
+    """计算团队看板数据"""
     # 计算日期范围(最近30天)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
-    recent_records = [r for r in records if r.created_at >= start_date]
-
-    # 1. 顶部概览
-    total_visits = len(recent_records)
-    total_negotiations = len([r for r in recent_records if r.visit_type.value == "negotiation"])
-    success_count = len([r for r in recent_records if r.outcome.value == "success"])
-    success_rate = (success_count / len(recent_records) * 100) if recent_records else 0
-
-    # 计算平均成本降低幅度
-    cost_reductions = []
-    for r in recent_records:
-        if r.metrics and r.metrics.cost_before and r.metrics.cost_after:
-            reduction = r.metrics.cost_before - r.metrics.cost_after
-            if reduction > 0:
-                cost_reductions.append(reduction)
-    avg_cost_reduction = sum(cost_reductions) / len(cost_reductions) if cost_reductions else 0
-
-    # 计算待办事项统计
-    total_todos = sum(len(r.todos) for r in records)  # 使用全部记录
-    completed_todos = sum(len([t for t in r.todos if t.status.value == "completed"]) for r in records)
-    pending_todos = sum(len([t for t in r.todos if t.status.value == "pending"]) for r in records)
+    trend_start = end_date - timedelta(days=30 * TREND_MONTHS)
+
+    # 1. 顶部概览(增量聚合,按成员累加)
+    recent_stats = get_member_stats(team_id, start_date)
+    all_stats = get_member_stats(team_id)
+
+    window = MemberStats()
+    for stats in recent_stats.values():
+        window.merge(stats)
+    total = MemberStats()
+    for stats in all_stats.values():
+        total.merge(stats)
+
+    total_visits = window.visit_count
+    success_rate = (window.success_count / total_visits * 100) if total_visits else 0
+    avg_cost_reduction = (
+        window.cost_optimization / window.cost_reduction_count if window.cost_reduction_count else 0
+    )
 
     overview = {
         "totalVisits": total_visits,
-        "totalNegotiations": total_negotiations,
+        "totalNegotiations": window.negotiation_count,
         "successRate": round(success_rate, 1),
         "avgCostReduction": round(avg_cost_reduction, 2),
-        "totalRecords": len(records),  # 总谈判记录数
-        "totalTodos": total_todos,  # 总待办事项数
-        "completedTodos": completed_todos,  # 已完成待办
-        "pendingTodos": pending_todos  # 待完成待办
+        "totalRecords": total.visit_count,  # 总谈判记录数
+        "totalTodos": total.total_todos,  # 总待办事项数(全部记录)
+        "completedTodos": total.completed_todos,  # 已完成待办
+        "pendingTodos": total.pending_todos  # 待完成待办
     }
 
     # 2. 成员业绩分析
-    member_stats = defaultdict(lambda: {
-        "visit_count": 0,
-        "negotiation_count": 0,
-        "success_count": 0,
-        "total_score": 0,
-        "score_count": 0,
-        "cost_optimization": 0.0,
-        "pending_todos": 0
-    })
-
-    for record in recent_records:
-        user_id = record.user_id
-        stats = member_stats[user_id]
-
-        stats["visit_count"] += 1
-        if record.visit_type.value == "negotiation":
-            stats["negotiation_count"] += 1
-        if record.outcome.value == "success":
-            stats["success_count"] += 1
-        if record.score:
-            stats["total_score"] += record.score
-            stats["score_count"] += 1
-
-        # 成本优化
-        if record.metrics and record.metrics.cost_before and record.metrics.cost_after:
-            reduction = record.metrics.cost_before - record.metrics.cost_after
-            if reduction > 0:
-                stats["cost_optimization"] += reduction
-
-        # 待办事项
-        stats["pending_todos"] += len([t for t in record.todos if t.status.value == "pending"])
-
     member_performance = []
     team_members = get_users_by_team(team_id)
     for member in team_members:
-        stats = member_stats.get(member.user_id, {})
-        visit_count = stats.get("visit_count", 0)
-        success_count = stats.get("success_count", 0)
-        score_count = stats.get("score_count", 0)
+        stats = recent_stats.get(member.user_id) or MemberStats()
+        visit_count = stats.visit_count
+        score_count = stats.score_count
 
         member_performance.append(MemberPerformance(
             user_id=member.user_id,
             user_name=member.name,
             visit_count=visit_count,
-            negotiation_count=stats.get("negotiation_count", 0),
-            success_rate=round(success_count / visit_count * 100, 1) if visit_count > 0 else 0,
-            avg_score=round(stats.get("total_score", 0) / score_count, 1) if score_count > 0 else 0,
-            cost_optimization=round(stats.get("cost_optimization", 0), 2),
-            pending_todos=stats.get("pending_todos", 0)
+            negotiation_count=stats.negotiation_count,
+            success_rate=round(stats.success_count / visit_count * 100, 1) if visit_count > 0 else 0,
+            avg_score=round(stats.total_score / score_count, 1) if score_count > 0 else 0,
+            cost_optimization=round(stats.cost_optimization, 2),
+            pending_todos=stats.pending_todos
         ))
 
-    # 3. 资方覆盖情况
-    funder_stats = defaultdict(lambda: {
-        "last_visit": None,
-        "visit_count": 0,
-        "key_owner": ""
+    # 场景分布、月度趋势: 单次遍历趋势窗口内的记录(时间索引定位,不扫描全部历史)
+    result = run_pass(get_records_in_range({"team_id": team_id}, trend_start), {
+        "scenes": Windowed(GroupStats(lambda r: r.scene.value), start_date),
+        "monthly": Windowed(GroupStats(period_bucket(end_date)), trend_start, end_date)
     })
 
-    for record in records:  # 使用全部记录
-        funder = record.funder_name
-        funder_stats[funder]["visit_count"] += 1
-        if not funder_stats[funder]["last_visit"] or record.visit_date > funder_stats[funder]["last_visit"]:
-            funder_stats[funder]["last_visit"] = record.visit_date
-            funder_stats[funder]["key_owner"] = record.user_name
-
+    # 3. 资方覆盖情况(业务量前N的资方)
+    months = _months_since(get_earliest_record_time({"team_id": team_id}))
     funder_coverage = []
-    for funder_name, stats in funder_stats.items():
+    for funder_name, stats in get_top_funders("team_id", team_id, FUNDER_COVERAGE_TOP_N):
         last_visit = stats["last_visit"]
         days_since_visit = (datetime.now() - last_visit).days if last_visit else 999
 
@@ -169,53 +185,33 @@ async def get_team_dashboard(
         else:
             relationship = "冷淡"
 
-        # 月均拜访次数(按全部记录计算)
-        total_days = (datetime.now() - min([r.created_at for r in records])).days
-        months = max(total_days / 30, 1)
-        visit_frequency = round(stats["visit_count"] / months, 1)
-
         funder_coverage.append(FunderCoverage(
             funder_name=funder_name,
             last_visit_date=last_visit,
-            visit_frequency=visit_frequency,
+            visit_frequency=round(stats["visit_count"] / months, 1),  # 月均拜访次数(按全部记录计算)
             relationship_status=relationship,
             key_owner=stats["key_owner"]
         ))
 
     # 4. 场景分布
     scene_distribution = defaultdict(int)
-    for record in recent_records:
-        scene_name = {
-            "cost": "资金成本谈判",
-            "deposit": "保证金条款谈判",
-            "risk": "风险质疑",
-            "compliance": "合规施压",
-            "volume": "业务量承诺",
-            "icebreaking": "新机构破冰"
-        }.get(record.scene.value, "其他")
-        scene_distribution[scene_name] += 1
+    for scene, stats in result["scenes"].items():
+        scene_distribution[SCENE_NAMES.get(scene, "其他")] += stats.visit_count
 
     # 5. 月度趋势(最近6个月)
     monthly_trend = []
-    for i in range(5, -1, -1):
+    for i in range(TREND_MONTHS - 1, -1, -1):
         month_start = end_date - timedelta(days=30 * (i + 1))
-        month_end = end_date - timedelta(days=30 * i)
-        month_records = [r for r in records if month_start <= r.created_at < month_end]
-
-        month_success = len([r for r in month_records if r.outcome.value == "success"])
-        month_success_rate = (month_success / len(month_records) * 100) if month_records else 0
+        stats = result["monthly"].get(i) or MemberStats()
 
-        month_cost_reductions = []
-        for r in month_records:
-            if r.metrics and r.metrics.cost_before and r.metrics.cost_after:
-                reduction = r.metrics.cost_before - r.metrics.cost_after
-                if reduction > 0:
-                    month_cost_reductions.append(reduction)
-        month_avg_reduction = sum(month_cost_reductions) / len(month_cost_reductions) if month_cost_reductions else 0
+        month_success_rate = (stats.success_count / stats.visit_count * 100) if stats.visit_count else 0
+        month_avg_reduction = (
+            stats.cost_optimization / stats.cost_reduction_count if stats.cost_reduction_count else 0
+        )
 
         monthly_trend.append({
             "month": month_start.strftime("%Y-%m"),
-            "visitCount": len(month_records),
+            "visitCount": stats.visit_count,
             "successRate": round(month_success_rate, 1),
             "avgCostReduction": round(month_avg_reduction, 2)
         })
@@ -236,11 +232,13 @@ async def get_team_dashboard(
 @router.get("/department/{department_id}", response_model=DepartmentDashboardData)
 async def get_department_dashboard(
     department_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     获取部门看板数据
     权限: 仅director
+    支持 ETag / If-None-Match,数据未变化时返回304
     """
     # 权限检查
     if current_user.role != Role.DIRECTOR:
@@ -249,40 +247,32 @@ async def get_department_dashboard(
     if current_user.department_id != department_id:
         raise HTTPException(status_code=403, detail="只能查看自己的部门")
 
-    # 获取部门所有记录
-    records = get_records({"department_id": department_id})
+    return await _cached_response(
+        ("department", department_id),
+        get_data_version("department_id", department_id),
+        lambda: build_department_dashboard(department_id),
+        if_none_match
+    )
+
 
-    # 最近30天记录
+def build_department_dashboard(department_id: str) -> DepartmentDashboardData:
+    """计算部门看板数据"""
+    # 最近30天
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
-    recent_records = [r for r in records if r.created_at >= start_date]
 
-    # 1. 部门整体概览
-    success_count = len([r for r in recent_records if r.outcome.value == "success"])
-    total_cost_saved = 0
-    for r in records:
-        if r.metrics and r.metrics.cost_before and r.metrics.cost_after:
-            reduction = r.metrics.cost_before - r.metrics.cost_after
-            if reduction > 0 and r.metrics.volume_commitment:
-                # 简化计算: 成本降低 * 业务量
-                total_cost_saved += reduction * r.metrics.volume_commitment / 100
-
-    # 找出top performer
-    user_success_count = defaultdict(int)
-    for r in recent_records:
-        if r.outcome.value == "success":
-            user_success_count[r.user_name] += 1
-    top_performer = max(user_success_count.items(), key=lambda x: x[1])[0] if user_success_count else "N/A"
-
-    # 活跃资方数
-    active_funders = set([r.funder_name for r in recent_records])
+    # 列式镜像向量化统计
+    analytics = get_department_analytics(department_id, start_date)
+    total_cost_saved = analytics["total_cost_saved"]
+    recent_teams = analytics["teams"]
 
+    # 1. 部门整体概览
     department_overview = {
-        "totalVisits": len(recent_records),
-        "totalMembers": len([u for u in database.USERS_DB.values() if u.department_id == department_id]),
-        "topPerformer": top_performer,
+        "totalVisits": analytics["recent_visits"],
+        "totalMembers": len(get_users_by_department(department_id)),
+        "topPerformer": analytics["top_performer"] or "N/A",
         "totalCostSaved": round(total_cost_saved, 2),
-        "activeFunders": len(active_funders)
+        "activeFunders": analytics["active_funders"]
     }
 
     # 2. 团队对比分析
@@ -290,23 +280,14 @@ async def get_department_dashboard(
     team_comparison = []
 
     for team in teams:
-        team_records = [r for r in recent_records if r.team_id == team.team_id]
-        team_members = get_users_by_team(team.team_id)
-        member_count = len(team_members)
+        stats = recent_teams.get(team.team_id, {"visit_count": 0, "success_count": 0, "cost_optimization": 0.0})
+        visit_count = stats["visit_count"]
+        member_count = len(get_users_by_team(team.team_id))
 
-        success_count = len([r for r in team_records if r.outcome.value == "success"])
-        success_rate = (success_count / len(team_records) * 100) if team_records else 0
+        success_rate = (stats["success_count"] / visit_count * 100) if visit_count else 0
 
         # 人均拜访次数
-        efficiency = len(team_records) / member_count if member_count > 0 else 0
-
-        # 成本优化
-        team_cost_opt = 0
-        for r in team_records:
-            if r.metrics and r.metrics.cost_before and r.metrics.cost_after:
-                reduction = r.metrics.cost_before - r.metrics.cost_after
-                if reduction > 0:
-                    team_cost_opt += reduction
+        efficiency = visit_count / member_count if member_count > 0 else 0
 
         # 获取组长名字
         leader = get_user_by_id(team.leader_id)
@@ -317,38 +298,19 @@ async def get_department_dashboard(
             team_name=team.team_name,
             leader_name=leader_name,
             member_count=member_count,
-            visit_count=len(team_records),
+            visit_count=visit_count,
             success_rate=round(success_rate, 1),
             efficiency=round(efficiency, 1),
-            cost_optimization=round(team_cost_opt, 2)
+            cost_optimization=round(stats["cost_optimization"], 2)
         ))
 
-    # 3. 资方健康度评估
-    funder_stats = defaultdict(lambda: {
-        "last_visit": None,
-        "visit_count": 0,
-        "total_volume": 0
-    })
-
-    for record in records:
-        funder = record.funder_name
-        funder_stats[funder]["visit_count"] += 1
-        if not funder_stats[funder]["last_visit"] or record.visit_date > funder_stats[funder]["last_visit"]:
-            funder_stats[funder]["last_visit"] = record.visit_date
-
-        if record.metrics and record.metrics.volume_commitment:
-            funder_stats[funder]["total_volume"] += record.metrics.volume_commitment
-
+    # 3. 资方健康度评估(业务量前N的资方)
+    months = _months_since(analytics["earliest"])
     funder_health = []
-    for funder_name, stats in list(funder_stats.items())[:10]:  # Top 10
+    for funder_name, stats in get_top_funders("department_id", department_id, FUNDER_HEALTH_TOP_N):
         last_visit = stats["last_visit"]
         days_since = (datetime.now() - last_visit).days if last_visit else 999
 
-        # 拜访频率
-        total_days = (datetime.now() - min([r.created_at for r in records])).days
-        months = max(total_days / 30, 1)
-        visit_freq = round(stats["visit_count"] / months, 1)
-
         # 风险等级(简化判断)
         if days_since > 90:
             risk_level = "高"
@@ -369,7 +331,7 @@ async def get_department_dashboard(
             funder_name=funder_name,
             business_volume=stats["total_volume"],
             last_visit_date=last_visit,
-            visit_frequency=visit_freq,
+            visit_frequency=round(stats["visit_count"] / months, 1),
             cost_trend="稳定",  # 简化处理
             risk_level=risk_level,
             strategic_priority=priority
@@ -377,19 +339,10 @@ async def get_department_dashboard(
 
     # 4. 能力诊断
     scene_success = defaultdict(lambda: {"total": 0, "success": 0})
-    for record in recent_records:
-        scene_name = {
-            "cost": "资金成本谈判",
-            "deposit": "保证金条款谈判",
-            "risk": "风险质疑",
-            "compliance": "合规施压",
-            "volume": "业务量承诺",
-            "icebreaking": "新机构破冰"
-        }.get(record.scene.value, "其他")
-
-        scene_success[scene_name]["total"] += 1
-        if record.outcome.value == "success":
-            scene_success[scene_name]["success"] += 1
+    for scene, total, success in analytics["scenes"]:
+        scene_name = SCENE_NAMES.get(scene, "其他")
+        scene_success[scene_name]["total"] += total
+        scene_success[scene_name]["success"] += success
 
     # 计算成功率
     scene_rates = {
@@ -408,7 +361,7 @@ async def get_department_dashboard(
     }
 
     # 5. ROI分析
-    total_time = len(records) * 2  # 假设每次拜访2小时
+    total_time = analytics["total_records"] * 2  # 假设每次拜访2小时
 
     roi_analysis = {
         "totalTimeInvested": total_time,
@@ -424,7 +377,3 @@ async def get_department_dashboard(
         skill_analysis=skill_analysis,
         roi_analysis=roi_analysis
     )
-
-
-# 导入database模块用于访问USERS_DB
-import database
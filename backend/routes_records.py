@@ -2,32 +2,226 @@
 记录管理API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+import base64
+import csv
+import io
+import json
 import uuid
 
 from models import (
-    User, NegotiationRecord, CreateRecordRequest, UpdateRecordRequest,
-    TodoItem, TodoStatus
+    User, Role, NegotiationRecord, CreateRecordRequest, ImportRecordRequest, UpdateRecordRequest,
+    BatchGetRecordsRequest, TodoItem, TodoStatus, to_local_naive
 )
-from auth import get_current_user, check_resource_access, build_query_filter
-from database import get_records, get_record_by_id, create_record, update_record
+from auth import get_current_user, check_permission, check_resource_access, build_query_filter
+from database import (
+    get_user_by_id, get_records_page, get_record_by_id, get_records_by_ids, create_record, create_records, update_record,
+    add_record_todo, complete_record_todo, search_records, encode_record, record_model, get_due_todos
+)
+from search_index import snippets
+from record_json import encode_records
 
 
 router = APIRouter(prefix="/api/records", tags=["records"])
 
+# 分页游标响应头
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# 批量导入配置
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000            # 响应中最多返回的错误行数(失败总数仍完整统计)
+IMPORT_MAX_LINE_BYTES = 1 << 20     # 单行大小上限
+
+# 导出配置
+EXPORT_PAGE_SIZE = 1000             # 每次从存储读取的记录数
+EXPORT_CHUNK_ROWS = 500             # 每个响应分块包含的行数
+EXPORT_FIELDS = tuple(NegotiationRecord.model_fields)
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def encode_cursor(key: Tuple[datetime, str]) -> str:
+    """将 (created_at, record_id) 编码为不透明游标"""
+    created_at, record_id = key
+    raw = f"{created_at.isoformat()}|{record_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析分页游标"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, record_id = raw.split("|", 1)
+        return to_local_naive(datetime.fromisoformat(created_at)), record_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def build_record(request: CreateRecordRequest, user: User,
+                 created_at: Optional[datetime] = None) -> NegotiationRecord:
+    """由创建请求构建记录,归属 user;created_at 为空时取当前时间"""
+    now = datetime.now()
+    return NegotiationRecord(
+        record_id=str(uuid.uuid4()),
+        user_id=user.user_id,
+        user_name=user.name,
+        team_id=user.team_id,
+        department_id=user.department_id,
+        funder_name=request.funder_name,
+        visit_type=request.visit_type,
+        visit_date=request.visit_date,
+        scene=request.scene,
+        objective=request.objective,
+        key_points=request.key_points,
+        our_position=request.our_position,
+        their_position=request.their_position,
+        created_at=created_at or now,
+        updated_at=now
+    )
+
+
+def _import_owner(current_user: User, user_id: Optional[str], owners: Dict[str, User]) -> User:
+    """
+    导入记录的归属人: 未指定时为导入人;指定他人时需有其记录的权限
+    (组长限本组成员,部门负责人限本部门),否则抛 ValueError 作为该行的错误
+    """
+    if not user_id or user_id == current_user.user_id:
+        return current_user
+
+    owner = owners.get(user_id)
+    if owner is None:
+        owner = get_user_by_id(user_id)
+        if owner is None:
+            raise ValueError(f"用户不存在: {user_id}")
+        owners[user_id] = owner
+
+    allowed = check_resource_access(current_user, owner.user_id, owner.team_id)
+    if current_user.role == Role.DIRECTOR:
+        allowed = owner.department_id == current_user.department_id
+    if not allowed:
+        raise ValueError(f"无权为用户 {user_id} 导入记录")
+    return owner
+
+
+async def _ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+    """
+    将流式请求体按行切分,只缓冲当前未结束的一行
+    超过 IMPORT_MAX_LINE_BYTES 的行丢弃内容并返回 None
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            yield None if oversized or end - start > IMPORT_MAX_LINE_BYTES else buffer[start:end]
+            oversized = False
+            start = end + 1
+        buffer = buffer[start:]
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            oversized = True
+            buffer = b""
+    if oversized:
+        yield None
+    elif buffer:
+        yield buffer
+
+
+def _format_errors(error: ValidationError) -> str:
+    """校验错误转为一行可读文本"""
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in item['loc']) or 'line'}: {item['msg']}"
+        for item in error.errors(include_url=False)
+    )
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """解析导出字段列表"""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in EXPORT_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"未知的导出字段: {', '.join(unknown)}")
+    return selected
+
+
+def _iter_records(filter_dict: dict, start: Optional[datetime],
+                  end: Optional[datetime]) -> Iterator[NegotiationRecord]:
+    """按创建时间倒序逐页读取 [start, end) 内的记录,同一时刻只持有一页"""
+    before = (end, "") if end is not None else None
+    while True:
+        page, before = get_records_page(filter_dict, EXPORT_PAGE_SIZE, before)
+        for record in page:
+            if start is not None and record.created_at < start:
+                return
+            yield record
+        if before is None:
+            return
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv_chunks(records: Iterator[NegotiationRecord], fields: List[str]) -> Iterator[str]:
+    """CSV输出(带BOM,便于Excel识别UTF-8),每 EXPORT_CHUNK_ROWS 行输出一块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(fields)
+
+    include = set(fields)
+    rows = 0
+    for record in records:
+        data = record_model(record).model_dump(mode="json", include=include)
+        writer.writerow([_csv_value(data[name]) for name in fields])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(records: Iterator[NegotiationRecord], fields: List[str]) -> Iterator[str]:
+    """NDJSON输出,每 EXPORT_CHUNK_ROWS 行输出一块"""
+    include = set(fields)
+    lines = []
+    for record in records:
+        lines.append(record_model(record).model_dump_json(include=include))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
 
 @router.get("/", response_model=List[NegotiationRecord])
 async def list_records(
     current_user: User = Depends(get_current_user),
     user_id: str = None,
     team_id: str = None,
-    funder_name: str = None
+    funder_name: str = None,
+    limit: int = Query(50, ge=1, le=200, description="每页条数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的游标")
 ):
     """
     获取谈判记录列表
-    根据用户权限自动过滤数据
+    根据用户权限自动过滤数据,按创建时间倒序分页,
+    下一页游标通过 X-Next-Cursor 响应头返回
+    响应直接拼接每条记录缓存的JSON(response_model 仅用于接口文档)
     """
     # 构建基础查询过滤器
     filter_dict = build_query_filter(current_user)
@@ -40,12 +234,134 @@ async def list_records(
     if funder_name:
         filter_dict["funder_name"] = funder_name
 
-    records = get_records(filter_dict)
+    before = decode_cursor(cursor) if cursor else None
+    records, next_key = get_records_page(filter_dict, limit, before)
+
+    headers = {}
+    if next_key is not None:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(next_key)
+
+    body = encode_records(encode_record(record) for record in records)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/export")
+async def export_records(
+    current_user: User = Depends(get_current_user),
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="导出格式: csv / ndjson"),
+    fields: Optional[str] = Query(None, description="导出字段,逗号分隔,默认全部"),
+    start: Optional[datetime] = Query(None, description="创建时间下限(含)"),
+    end: Optional[datetime] = Query(None, description="创建时间上限(不含)"),
+    team_id: str = None,
+    user_id: str = None
+):
+    """
+    导出谈判记录
+    组长导出本组(export_team_report),部门负责人导出本部门(export_all_reports);
+    按创建时间倒序分页读取并逐块输出,内存占用与导出总量无关
+    """
+    if not (check_permission(current_user, ["export_team_report"])
+            or check_permission(current_user, ["export_all_reports"])):
+        raise HTTPException(status_code=403, detail="没有导出权限")
+
+    selected = _parse_fields(fields)
 
-    # 按创建时间倒序排序
-    records.sort(key=lambda x: x.created_at, reverse=True)
+    # 额外条件只能缩小权限范围
+    filter_dict = build_query_filter(current_user)
+    for key, value in (("team_id", team_id), ("user_id", user_id)):
+        if value:
+            if key in filter_dict and filter_dict[key] != value:
+                raise HTTPException(status_code=403, detail="无权导出该范围的记录")
+            filter_dict[key] = value
+
+    # 时间索引中为本地无时区时间,带时区的参数先换算
+    if start is not None:
+        start = to_local_naive(start)
+    if end is not None:
+        end = to_local_naive(end)
+
+    records = _iter_records(filter_dict, start, end)
+    chunks = _csv_chunks(records, selected) if format == "csv" else _ndjson_chunks(records, selected)
+    filename = f"records_{datetime.now().strftime('%Y%m%d%H%M%S')}.{format}"
+
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
-    return records
+
+@router.get("/search")
+async def search_records_fulltext(
+    q: str = Query(..., min_length=1, description="检索词,空格分隔表示同时包含,双引号内为短语"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    全文检索谈判记录(目标、要点、双方立场、结果、纪要)
+    只检索当前用户权限范围内的记录,按相关度排序并返回高亮摘要;中文检索词至少两个字
+    """
+    filter_dict = build_query_filter(current_user)
+    terms, results = search_records(filter_dict, q, limit)
+    if not terms:
+        raise HTTPException(status_code=400, detail="检索词无效")
+
+    return [
+        {
+            "record_id": record.record_id,
+            "funder_name": record.funder_name,
+            "user_name": record.user_name,
+            "visit_date": record.visit_date,
+            "scene": record.scene,
+            "outcome": record.outcome,
+            "score": round(score, 4),
+            "snippets": snippets(record, terms)
+        }
+        for score, record in results
+    ]
+
+
+@router.get("/todos/due")
+async def list_due_todos(
+    current_user: User = Depends(get_current_user),
+    team_id: str = None,
+    user_id: str = None,
+    days: int = Query(7, ge=1, le=90, description="即将到期的时间窗口(天)"),
+    limit: int = Query(50, ge=1, le=200, description="逾期/即将到期各返回的条数")
+):
+    """
+    获取权限范围内未完成的逾期待办和即将到期待办
+    均按截止时间升序(逾期最久的排在最前);未设置截止时间的待办不在其中
+    """
+    # 额外条件只能缩小权限范围
+    filter_dict = build_query_filter(current_user)
+    for key, value in (("team_id", team_id), ("user_id", user_id)):
+        if value:
+            if key in filter_dict and filter_dict[key] != value:
+                raise HTTPException(status_code=403, detail="无权查看该范围的待办")
+            filter_dict[key] = value
+
+    now = datetime.now()
+    overdue = get_due_todos(filter_dict, None, now, limit)
+    upcoming = get_due_todos(filter_dict, now, now + timedelta(days=days), limit)
+
+    def items(entries):
+        return [
+            {
+                "record_id": record.record_id,
+                "todo_index": i,
+                "content": record.todos[i].content,
+                "deadline": deadline,
+                "created_at": record.todos[i].created_at,
+                "funder_name": record.funder_name,
+                "user_id": record.user_id,
+                "user_name": record.user_name,
+                "team_id": record.team_id
+            }
+            for deadline, record, i in entries
+        ]
+
+    return {"overdue": items(overdue), "upcoming": items(upcoming)}
 
 
 @router.get("/{record_id}", response_model=NegotiationRecord)
@@ -67,7 +383,42 @@ async def get_record_detail(
     ):
         raise HTTPException(status_code=403, detail="无权访问此记录")
 
-    return record
+    return Response(content=encode_record(record), media_type="application/json")
+
+
+@router.post("/batch")
+async def batch_get_records(
+    request: BatchGetRecordsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量获取记录详情(一次请求代替逐条调用详情接口)
+    逐条做与详情接口相同的权限检查,返回 {"records": [...], "forbidden": [ID], "missing": [ID]},
+    均按请求中的顺序(重复ID只返回一次)
+    """
+    record_ids = list(dict.fromkeys(request.record_ids))
+    found = get_records_by_ids(record_ids)
+
+    records, forbidden, missing = [], [], []
+    for record_id in record_ids:
+        record = found.get(record_id)
+        if record is None:
+            missing.append(record_id)
+        elif check_resource_access(
+            current_user,
+            resource_user_id=record.user_id,
+            resource_team_id=record.team_id
+        ):
+            records.append(record)
+        else:
+            forbidden.append(record_id)
+
+    body = (
+        b'{"records":' + encode_records(encode_record(record) for record in records)
+        + b',"forbidden":' + json.dumps(forbidden).encode()
+        + b',"missing":' + json.dumps(missing).encode() + b'}'
+    )
+    return Response(content=body, media_type="application/json")
 
 
 @router.post("/", response_model=NegotiationRecord)
@@ -78,28 +429,68 @@ async def create_new_record(
     """创建新的谈判记录"""
 
     # 创建记录
-    new_record = NegotiationRecord(
-        record_id=str(uuid.uuid4()),
-        user_id=current_user.user_id,
-        user_name=current_user.name,
-        team_id=current_user.team_id,
-        department_id=current_user.department_id,
-        funder_name=request.funder_name,
-        visit_type=request.visit_type,
-        visit_date=request.visit_date,
-        scene=request.scene,
-        objective=request.objective,
-        key_points=request.key_points,
-        our_position=request.our_position,
-        their_position=request.their_position,
-        created_at=datetime.now(),
-        updated_at=datetime.now()
-    )
+    new_record = build_record(request, current_user)
 
     created = create_record(new_record)
     return created
 
 
+@router.post("/import")
+async def import_records(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量导入谈判记录(NDJSON)
+    请求体每行一个 ImportRecordRequest 格式的JSON对象,流式读取,
+    每 IMPORT_BATCH_SIZE 行在线程池中批量写入一次;空行忽略,失败的行不影响其他行
+    行内的 visit_date/created_at/user_id 原样保留,user_id 指向他人时需有其记录的权限
+    """
+    imported = 0
+    failed = 0
+    errors = []
+    batch: List[NegotiationRecord] = []
+    owners: Dict[str, User] = {}
+
+    line_no = 0
+    async for line in _ndjson_lines(request.stream()):
+        line_no += 1
+        if line is not None and not line.strip():
+            continue
+
+        error = None
+        if line is None:
+            error = f"单行超过 {IMPORT_MAX_LINE_BYTES} 字节"
+        else:
+            try:
+                item = ImportRecordRequest.model_validate_json(line)
+                owner = _import_owner(current_user, item.user_id, owners)
+                batch.append(build_record(item, owner, item.created_at))
+            except ValidationError as e:
+                error = _format_errors(e)
+            except ValueError as e:
+                error = str(e)
+
+        if error is not None:
+            failed += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line_no, "error": error})
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += len(await run_in_threadpool(create_records, batch))
+            batch = []
+
+    if batch:
+        imported += len(await run_in_threadpool(create_records, batch))
+
+    return {
+        "success": failed == 0,
+        "imported": imported,
+        "failed": failed,
+        "errors": errors
+    }
+
+
 @router.put("/{record_id}", response_model=NegotiationRecord)
 async def update_existing_record(
     record_id: str,
@@ -158,10 +549,7 @@ async def add_todo_to_record(
         created_at=datetime.now()
     )
 
-    record.todos.append(new_todo)
-    record.updated_at = datetime.now()
-
-    return record
+    return add_record_todo(record_id, new_todo)
 
 
 @router.put("/{record_id}/todos/{todo_index}/complete")
@@ -183,8 +571,6 @@ async def complete_todo(
     if todo_index < 0 or todo_index >= len(record.todos):
         raise HTTPException(status_code=400, detail="待办索引无效")
 
-    record.todos[todo_index].status = TodoStatus.COMPLETED
-    record.todos[todo_index].completed_at = datetime.now()
-    record.updated_at = datetime.now()
+    complete_record_todo(record_id, todo_index)
 
     return {"success": True, "message": "待办已完成"}
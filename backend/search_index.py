@@ -0,0 +1,342 @@
+"""
+谈判记录全文检索
+对目标、要点、双方立场、结果、纪要建倒排索引(中文二元组 + 英文数字词),随记录写入增量维护;
+查询按词项求交集得到候选,BM25排序后逐条核对原文(支持短语和多词AND),生成高亮摘要
+"""
+
+from models import NegotiationRecord
+from playbook import tokenize
+from columnar import Dictionary
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import html
+import math
+import re
+import numpy as np
+
+
+# 参与检索的字段(同时是摘要字段的优先顺序)
+SEARCH_FIELDS = ("objective", "key_points", "our_position", "their_position", "result", "minutes")
+
+# 在索引内过滤的权限范围字段(与 build_query_filter 一致)
+SCOPE_FIELDS = ("user_id", "team_id", "department_id")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_RADIUS = 30         # 摘要在命中位置前后保留的字数
+SNIPPETS_PER_RECORD = 3
+
+# 双引号内为短语,其余按空白切分,各词之间为AND
+_QUERY_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def field_texts(record: NegotiationRecord) -> List[Tuple[str, str]]:
+    """记录的可检索文本: [(字段名, 文本)]"""
+    texts = []
+    for field in SEARCH_FIELDS:
+        value = getattr(record, field)
+        if not value:
+            continue
+        texts.append((field, "\n".join(value) if isinstance(value, (list, tuple)) else value))
+    return texts
+
+
+def record_text(record: NegotiationRecord) -> str:
+    """用于索引和核对的全文(小写,字段间换行分隔,保证词项不跨字段)"""
+    return "\n".join(text for _, text in field_texts(record)).lower()
+
+
+def parse_query(query: str) -> List[str]:
+    """解析查询为词项(小写);不含任何可索引字符的词项忽略"""
+    terms = []
+    for phrase, word in _QUERY_RE.findall(query or ""):
+        term = (phrase or word).strip().lower()
+        if term and tokenize(term):
+            terms.append(term)
+    return terms
+
+
+def _grown(array: np.ndarray, size: int) -> np.ndarray:
+    grown = np.zeros(size, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _Posting:
+    """单个词的倒排表: 文档号(递增)和词频,追加写入;删除只做标记,死条目过半时压缩"""
+
+    __slots__ = ("docs", "tfs", "size", "count", "dead")
+
+    def __init__(self):
+        self.docs = np.zeros(4, dtype=np.int32)
+        self.tfs = np.zeros(4, dtype=np.int32)
+        self.size = 0
+        self.count = 0      # 存活文档数(文档频率)
+        self.dead = 0
+
+    def append(self, doc: int, tf: int):
+        if self.size == len(self.docs):
+            self.docs = _grown(self.docs, self.size * 2)
+            self.tfs = _grown(self.tfs, self.size * 2)
+        self.docs[self.size] = doc
+        self.tfs[self.size] = tf
+        self.size += 1
+        self.count += 1
+
+    def compact(self, alive: np.ndarray):
+        keep = alive[self.docs[:self.size]]
+        self.docs = self.docs[:self.size][keep].copy()
+        self.tfs = self.tfs[:self.size][keep].copy()
+        self.size = len(self.docs)
+        self.dead = 0
+
+    def view(self, alive: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dead > self.count:
+            self.compact(alive)
+        return self.docs[:self.size], self.tfs[:self.size]
+
+
+class RecordSearchIndex:
+    """
+    记录倒排索引,作为记录观察者注册
+
+    每个索引版本的记录分配一个递增文档号,倒排表按文档号有序追加,求交集、权限过滤和打分都向量化;
+    记录文本变化时旧文档号标记为删除,新文本分配新文档号
+
+    写入时观察者先收到 remove(旧记录) 再收到 add(新记录)(同一次写操作内,分片锁保护);
+    remove 立即把文档标记为删除并暂存旧文本,紧随的 add 文本未变(如只改了待办、指标)时恢复原文档,不重建。
+    记录移出分片(换部门、删除)时只有 remove 没有 add,暂存条目在下一次 remove 或检索时清理,
+    文档号随之释放,不会在检索中重复出现
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.postings: Dict[str, _Posting] = {}
+        self.docs: Dict[str, int] = {}          # 记录ID -> 当前文档号
+        self.record_ids: List[str] = []         # 文档号 -> 记录ID
+        self.alive = np.zeros(self.capacity, dtype=np.bool_)
+        self.lengths = np.zeros(self.capacity, dtype=np.int32)
+        self.scopes: Dict[str, Dictionary] = {field: Dictionary() for field in SCOPE_FIELDS}
+        self.scope_codes: Dict[str, np.ndarray] = {
+            field: np.zeros(self.capacity, dtype=np.int32) for field in SCOPE_FIELDS
+        }
+        self.total_length = 0
+        self._detached: Dict[str, str] = {}    # 已标记删除、等待同一写操作的 add 的记录: 记录ID -> 旧文本
+
+    @classmethod
+    def from_records(cls, records: Iterable[NegotiationRecord]) -> "RecordSearchIndex":
+        """从记录批量构建(无增量索引的存储后端使用)"""
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    def add(self, record: NegotiationRecord):
+        text = record_text(record)
+        doc = self.docs.get(record.record_id)
+        old = self._detached.pop(record.record_id, None)
+        if doc is not None:
+            if old is None:
+                self._set_scope(doc, record)
+                return
+            if old == text:
+                self._revive(doc, text)
+                self._set_scope(doc, record)
+                return
+        self._index(record, text)
+
+    def remove(self, record: NegotiationRecord):
+        # 之前暂存的条目没有等到 add,说明记录已移出分片
+        self._release_detached()
+        doc = self.docs.get(record.record_id)
+        if doc is not None:
+            text = record_text(record)
+            self._kill(doc, text)
+            self._detached[record.record_id] = text
+
+    def _release_detached(self):
+        """释放已移出分片的记录的文档号(文档已标记删除,倒排表中的死条目随压缩清除)"""
+        for record_id in self._detached:
+            del self.docs[record_id]
+        self._detached.clear()
+
+    def _set_scope(self, doc: int, record: NegotiationRecord):
+        for field in SCOPE_FIELDS:
+            self.scope_codes[field][doc] = self.scopes[field].encode(getattr(record, field))
+
+    def _grow(self):
+        size = len(self.alive) * 2
+        self.alive = _grown(self.alive, size)
+        self.lengths = _grown(self.lengths, size)
+        for field, codes in self.scope_codes.items():
+            self.scope_codes[field] = _grown(codes, size)
+
+    def _index(self, record: NegotiationRecord, text: str):
+        doc = len(self.record_ids)
+        if doc == len(self.alive):
+            self._grow()
+        self.record_ids.append(record.record_id)
+        self.docs[record.record_id] = doc
+
+        counts = Counter(tokenize(text))
+        for token, count in counts.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = _Posting()
+            posting.append(doc, count)
+        length = sum(counts.values())
+        self.alive[doc] = True
+        self.lengths[doc] = length
+        self.total_length += length
+        self._set_scope(doc, record)
+
+    def _kill(self, doc: int, text: str):
+        self.alive[doc] = False
+        self.total_length -= int(self.lengths[doc])
+        for token in set(tokenize(text)):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.count -= 1
+                posting.dead += 1
+
+    def _revive(self, doc: int, text: str):
+        """撤销 _kill(只在同一次写操作内调用,其间不会压缩倒排表)"""
+        self.alive[doc] = True
+        self.total_length += int(self.lengths[doc])
+        for token in set(tokenize(text)):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.count += 1
+                posting.dead -= 1
+
+    def __len__(self) -> int:
+        return len(self.docs) - len(self._detached)
+
+    def search(self, terms: List[str], scope: Dict[str, Any],
+               get_record: Callable[[str], Optional[NegotiationRecord]],
+               accept: Callable[[NegotiationRecord], bool],
+               limit: int) -> List[Tuple[float, NegotiationRecord]]:
+        """
+        检索
+
+        Args:
+            terms: parse_query() 得到的词项,须全部出现(短语按原文连续出现)
+            scope: 权限范围条件,其中 SCOPE_FIELDS 内的字段在索引内向量化过滤
+            get_record: 按ID取记录
+            accept: 权限范围的完整校验
+            limit: 返回条数
+
+        Returns:
+            [(得分, 记录)],按得分降序
+        """
+        self._release_detached()
+        if not terms or not self.docs:
+            return []
+
+        tokens = set()
+        for term in terms:
+            tokens.update(tokenize(term))
+        postings = []
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None or posting.count == 0:
+                return []
+            postings.append(posting)
+        postings.sort(key=lambda posting: posting.count)
+
+        # 从最短的倒排表开始,在其余有序倒排表中二分查找求交集
+        views = [posting.view(self.alive) for posting in postings]
+        candidates = views[0][0]
+        candidates = candidates[self.alive[candidates]]
+        for field, value in scope.items():
+            if field in self.scopes:
+                code = self.scopes[field].codes.get(value)
+                if code is None:
+                    return []
+                candidates = candidates[self.scope_codes[field][candidates] == code]
+        for docs, _ in views[1:]:
+            if candidates.size == 0:
+                return []
+            pos = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            candidates = candidates[docs[pos] == candidates]
+        if candidates.size == 0:
+            return []
+
+        # BM25
+        n = len(self.docs)
+        avg_length = max(self.total_length / n, 1.0)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[candidates] / avg_length)
+        scores = np.zeros(candidates.size)
+        for posting, (docs, tfs) in zip(postings, views):
+            tf = tfs[np.searchsorted(docs, candidates)]
+            idf = math.log(1 + (n - posting.count + 0.5) / (posting.count + 0.5))
+            scores += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        # 按得分从高到低逐条核对原文,凑够 limit 条即停止
+        order = np.argsort(-scores, kind="stable")
+        results = []
+        for i in order.tolist():
+            record = get_record(self.record_ids[candidates[i]])
+            if record is None or not accept(record):
+                continue
+            text = record_text(record)
+            if all(term in text for term in terms):
+                results.append((float(scores[i]), record))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def snippets(record: NegotiationRecord, terms: List[str]) -> List[Dict[str, str]]:
+    """
+    高亮摘要: 每个命中字段截取首个命中位置附近的文本,命中词用 <em> 标记(其余内容已做HTML转义)
+    """
+    result = []
+    for field, text in field_texts(record):
+        lower = text.lower()
+        hits = [(lower.find(term), term) for term in terms]
+        hits = [(pos, term) for pos, term in hits if pos >= 0]
+        if not hits:
+            continue
+
+        first = min(pos for pos, _ in hits)
+        start = max(0, first - SNIPPET_RADIUS)
+        end = min(len(text), first + SNIPPET_RADIUS + max(len(term) for _, term in hits))
+        result.append({"field": field, "snippet": _highlight(text, start, end, terms)})
+        if len(result) >= SNIPPETS_PER_RECORD:
+            break
+    return result
+
+
+def _highlight(text: str, start: int, end: int, terms: List[str]) -> str:
+    window = text[start:end]
+    lower = window.lower()
+
+    # 标记命中区间并合并重叠
+    spans = []
+    for term in terms:
+        pos = lower.find(term)
+        while pos >= 0:
+            spans.append((pos, pos + len(term)))
+            pos = lower.find(term, pos + 1)
+    spans.sort()
+    merged = []
+    for s, e in spans:
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+
+    parts = ["…" if start > 0 else ""]
+    cursor = 0
+    for s, e in merged:
+        parts.append(html.escape(window[cursor:s]))
+        parts.append("<em>" + html.escape(window[s:e]) + "</em>")
+        cursor = e
+    parts.append(html.escape(window[cursor:]))
+    parts.append("…" if end < len(text) else "")
+    return "".join(parts).replace("\n", " ")
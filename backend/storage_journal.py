@@ -0,0 +1,216 @@
+"""
+内存存储的持久化: 追加写日志(WAL) + 定期快照
+启动时加载最新快照并重放其后的日志,替代 init_demo_data()
+生成快照时先轮转日志(当前日志改名为 journal.prev.ndjson),快照写完后再删除旧日志,
+快照写入期间新的修改照常追加到新日志
+注意: 日志文件只允许单进程写入,内存后端请以单worker运行
+"""
+
+from models import User, Team, NegotiationRecord
+from typing import Iterable, Iterator, List, Tuple
+import itertools
+import json
+import os
+import shutil
+import threading
+
+
+SNAPSHOT_FILE = "snapshot.ndjson"
+JOURNAL_FILE = "journal.ndjson"
+PREV_JOURNAL_FILE = "journal.prev.ndjson"       # 已轮转、等待快照写完的日志
+REJECTED_FILE = "journal.rejected.ndjson"       # 重放失败、被隔离的条目
+
+
+def _fsync_dir(directory: str):
+    """rename之后同步目录项,保证快照替换落盘"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    追加写日志
+
+    日志每行一个JSON条目: {"seq": 序号, "op": 操作, ...}
+    快照首行为头信息 {"seq": 快照包含的最后序号, "teams": n, "users": n, "records": n},
+    其后依次是团队、用户、记录的JSON,每行一个
+    """
+
+    def __init__(self, directory: str, fsync: bool = True, snapshot_every: int = 50000):
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.entries_since_snapshot = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    @property
+    def prev_journal_path(self) -> str:
+        return os.path.join(self.directory, PREV_JOURNAL_FILE)
+
+    @property
+    def rejected_path(self) -> str:
+        return os.path.join(self.directory, REJECTED_FILE)
+
+    def exists(self) -> bool:
+        """是否已有可恢复的数据"""
+        return any(os.path.exists(path) for path in (self.snapshot_path, self.journal_path, self.prev_journal_path))
+
+    # ===========================
+    # 恢复
+    # ===========================
+
+    def load_snapshot(self) -> Tuple[List[Team], List[User], Iterator[NegotiationRecord]]:
+        """
+        读取快照
+
+        Returns:
+            (团队列表, 用户列表, 记录迭代器);记录按行流式解析,不整体读入内存
+        """
+        if not os.path.exists(self.snapshot_path):
+            return [], [], iter(())
+
+        f = open(self.snapshot_path, "r", encoding="utf-8")
+        header = json.loads(f.readline())
+        self.seq = header["seq"]
+
+        teams = [Team.model_validate_json(f.readline()) for _ in range(header["teams"])]
+        users = [User.model_validate_json(f.readline()) for _ in range(header["users"])]
+
+        def records() -> Iterator[NegotiationRecord]:
+            with f:
+                for _ in range(header["records"]):
+                    yield NegotiationRecord.model_validate_json(f.readline())
+
+        return teams, users, records()
+
+    def replay(self) -> Iterator[dict]:
+        """按顺序返回快照之后的日志条目(先旧日志,再当前日志)"""
+        yield from self._read_entries(self.prev_journal_path)
+        yield from self._read_entries(self.journal_path)
+
+    def _read_entries(self, path: str) -> Iterator[dict]:
+        """
+        末尾未写完整的条目属于未确认的写入,丢弃并截断,避免后续追加接在残行后面
+        """
+        if not os.path.exists(path):
+            return
+
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+
+                if entry["seq"] <= self.seq:
+                    # 快照已包含(快照替换后、旧日志删除前崩溃)
+                    continue
+                self.seq = entry["seq"]
+                self.entries_since_snapshot += 1
+                yield entry
+
+        if valid_bytes < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def reject(self, entry: dict, error: Exception):
+        """隔离重放失败的条目(连同错误信息写入 journal.rejected.ndjson),启动继续"""
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            record = {"error": f"{type(error).__name__}: {error}", "entry": entry}
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    # ===========================
+    # 写入
+    # ===========================
+
+    def append(self, op: str, **payload) -> int:
+        """追加一条已应用的修改,fsync后返回,调用方随后才确认请求"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "a", encoding="utf-8")
+
+            self.seq += 1
+            entry = {"seq": self.seq, "op": op, **payload}
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+            self.entries_since_snapshot += 1
+            return self.seq
+
+    def should_snapshot(self) -> bool:
+        return self.snapshot_every > 0 and self.entries_since_snapshot >= self.snapshot_every
+
+    def rotate(self) -> int:
+        """
+        轮转日志,返回轮转时的最后序号(即随后写出的快照包含的序号)
+        上一次快照未写成时旧日志仍在,当前日志接在其后,不丢条目
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.prev_journal_path):
+                    with open(self.prev_journal_path, "ab") as dst, open(self.journal_path, "rb") as src:
+                        shutil.copyfileobj(src, dst)
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.prev_journal_path)
+                _fsync_dir(self.directory)
+
+            self.entries_since_snapshot = 0
+            return self.seq
+
+    def write_snapshot(self, seq: int, teams: List[Team], users: List[User],
+                       records: Iterable[NegotiationRecord], record_count: int):
+        """
+        写入快照(临时文件+原子替换),然后删除已轮转的旧日志
+        调用方先 rotate() 并传入截取的一致状态;写入期间不持有日志锁,追加照常进行
+        records 可为生成器,条数由 record_count 给出
+        """
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            header = {"seq": seq, "teams": len(teams), "users": len(users), "records": record_count}
+            f.write(json.dumps(header) + "\n")
+            for item in itertools.chain(teams, users, records):
+                f.write(item.model_dump_json() + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(self.directory)
+
+        if os.path.exists(self.prev_journal_path):
+            os.remove(self.prev_journal_path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,434 @@
+"""
+SQLite存储后端
+WAL模式 + 连接池,实现 database.py 的存储接口,多个worker可共享同一数据库文件
+"""
+
+from models import User, Team, NegotiationRecord, TodoItem, TodoStatus
+from aggregates import MemberStats, stats_from_records
+from columnar import ColumnarStore
+from search_index import RecordSearchIndex, parse_query
+from todo_index import TodoIndex
+from funder_stats import FunderStatsIndex
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Iterator
+from contextlib import contextmanager
+import queue
+import sqlite3
+
+
+# 可直接下推到SQL的等值过滤列
+FILTER_COLUMNS = ("user_id", "team_id", "department_id", "funder_name")
+
+# 可做范围查询的时间列
+TIME_COLUMNS = ("created_at", "visit_date")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    team_id TEXT NOT NULL,
+    department_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_team ON users (team_id);
+CREATE INDEX IF NOT EXISTS idx_users_department ON users (department_id);
+
+CREATE TABLE IF NOT EXISTS teams (
+    team_id TEXT PRIMARY KEY,
+    department_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_teams_department ON teams (department_id);
+
+CREATE TABLE IF NOT EXISTS records (
+    record_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    department_id TEXT NOT NULL,
+    funder_name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    visit_date TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_user_created ON records (user_id, created_at, record_id);
+CREATE INDEX IF NOT EXISTS idx_records_team_created ON records (team_id, created_at, record_id);
+CREATE INDEX IF NOT EXISTS idx_records_department_created ON records (department_id, created_at, record_id);
+CREATE INDEX IF NOT EXISTS idx_records_funder_created ON records (funder_name, created_at, record_id);
+CREATE INDEX IF NOT EXISTS idx_records_team_visit ON records (team_id, visit_date);
+CREATE INDEX IF NOT EXISTS idx_records_department_visit ON records (department_id, visit_date);
+
+CREATE TABLE IF NOT EXISTS scope_versions (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+SQL_UPSERT_USER = "INSERT OR REPLACE INTO users (user_id, team_id, department_id, data) VALUES (?, ?, ?, ?)"
+SQL_UPSERT_TEAM = "INSERT OR REPLACE INTO teams (team_id, department_id, data) VALUES (?, ?, ?)"
+SQL_UPSERT_RECORD = (
+    "INSERT OR REPLACE INTO records "
+    "(record_id, user_id, team_id, department_id, funder_name, created_at, visit_date, data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_GET_USER = "SELECT data FROM users WHERE user_id = ?"
+SQL_GET_TEAM = "SELECT data FROM teams WHERE team_id = ?"
+SQL_GET_RECORD = "SELECT data FROM records WHERE record_id = ?"
+SQL_USERS_BY_TEAM = "SELECT data FROM users WHERE team_id = ?"
+SQL_USERS_BY_DEPARTMENT = "SELECT data FROM users WHERE department_id = ?"
+SQL_TEAMS_BY_DEPARTMENT = "SELECT data FROM teams WHERE department_id = ?"
+SQL_COUNT_STORES = (
+    "SELECT (SELECT COUNT(*) FROM records), (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM teams)"
+)
+SQL_GET_VERSION = "SELECT version FROM scope_versions WHERE scope = ?"
+SQL_BUMP_VERSION = (
+    "INSERT INTO scope_versions (scope, version) VALUES (?, 1) "
+    "ON CONFLICT(scope) DO UPDATE SET version = version + 1"
+)
+
+
+def _ts(value: datetime) -> str:
+    """定长时间字符串,保证字典序与时间序一致"""
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _record_row(record: NegotiationRecord) -> tuple:
+    return (
+        record.record_id, record.user_id, record.team_id, record.department_id,
+        record.funder_name, _ts(record.created_at), _ts(record.visit_date),
+        record.model_dump_json()
+    )
+
+
+def _scope_keys(*items) -> set:
+    """记录/用户/团队所属的团队和部门版本号键"""
+    keys = set()
+    for item in items:
+        if item is not None:
+            keys.add(f"team_id:{item.team_id}")
+            keys.add(f"department_id:{item.department_id}")
+    return keys
+
+
+def _where(filter_dict: dict) -> Tuple[str, list, dict]:
+    """
+    将过滤条件拆分为SQL条件和需要在Python中比较的剩余条件
+
+    Returns:
+        (WHERE子句, 参数列表, 剩余条件)
+    """
+    clauses, params, rest = [], [], {}
+    for key, value in (filter_dict or {}).items():
+        if key in FILTER_COLUMNS:
+            clauses.append(f"{key} = ?")
+            params.append(value)
+        else:
+            rest[key] = value
+    return (" AND ".join(clauses) or "1 = 1"), params, rest
+
+
+def _match(record: NegotiationRecord, filter_dict: dict) -> bool:
+    for key, value in filter_dict.items():
+        if not hasattr(record, key) or getattr(record, key) != value:
+            return False
+    return True
+
+
+class SQLiteStore:
+    """SQLite存储引擎"""
+
+    def __init__(self, path: str, pool_size: int = 8, busy_timeout_ms: int = 5000,
+                 user_listeners: Optional[list] = None):
+        self.path = path
+        self.user_listeners = user_listeners if user_listeners is not None else []
+        self.busy_timeout_ms = busy_timeout_ms
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=pool_size)
+
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: 由我们显式控制事务; cached_statements: 预编译语句缓存
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出连接"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务,BEGIN IMMEDIATE 提前拿写锁避免多worker读改写冲突"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _query_records(self, sql: str, params: list) -> List[NegotiationRecord]:
+        with self._connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [NegotiationRecord.model_validate_json(row[0]) for row in rows]
+
+    # ===========================
+    # 初始化
+    # ===========================
+
+    def load_if_empty(self, teams: List[Team], users: List[User], records: List[NegotiationRecord]):
+        """数据库为空时写入初始数据(同一事务内检查,多worker并发启动只写一次)"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+                return
+            conn.executemany(SQL_UPSERT_TEAM, [(t.team_id, t.department_id, t.model_dump_json()) for t in teams])
+            conn.executemany(
+                SQL_UPSERT_USER,
+                [(u.user_id, u.team_id, u.department_id, u.model_dump_json()) for u in users]
+            )
+            conn.executemany(SQL_UPSERT_RECORD, [_record_row(r) for r in records])
+
+    # ===========================
+    # 用户/团队
+    # ===========================
+
+    def get_user_by_id(self, user_id: str) -> Optional[User]:
+        with self._connection() as conn:
+            row = conn.execute(SQL_GET_USER, (user_id,)).fetchone()
+        return User.model_validate_json(row[0]) if row else None
+
+    def get_team_by_id(self, team_id: str) -> Optional[Team]:
+        with self._connection() as conn:
+            row = conn.execute(SQL_GET_TEAM, (team_id,)).fetchone()
+        return Team.model_validate_json(row[0]) if row else None
+
+    def get_users_by_team(self, team_id: str) -> List[User]:
+        with self._connection() as conn:
+            rows = conn.execute(SQL_USERS_BY_TEAM, (team_id,)).fetchall()
+        return [User.model_validate_json(row[0]) for row in rows]
+
+    def get_users_by_department(self, department_id: str) -> List[User]:
+        with self._connection() as conn:
+            rows = conn.execute(SQL_USERS_BY_DEPARTMENT, (department_id,)).fetchall()
+        return [User.model_validate_json(row[0]) for row in rows]
+
+    def get_teams_by_department(self, department_id: str) -> List[Team]:
+        with self._connection() as conn:
+            rows = conn.execute(SQL_TEAMS_BY_DEPARTMENT, (department_id,)).fetchall()
+        return [Team.model_validate_json(row[0]) for row in rows]
+
+    def create_user(self, user: User) -> User:
+        with self._transaction() as conn:
+            row = conn.execute(SQL_GET_USER, (user.user_id,)).fetchone()
+            old = User.model_validate_json(row[0]) if row else None
+            conn.execute(SQL_UPSERT_USER, (user.user_id, user.team_id, user.department_id, user.model_dump_json()))
+            self._bump_versions(conn, _scope_keys(old, user))
+        for listener in self.user_listeners:
+            listener(user.user_id)
+        return user
+
+    def create_team(self, team: Team) -> Team:
+        with self._transaction() as conn:
+            conn.execute(SQL_UPSERT_TEAM, (team.team_id, team.department_id, team.model_dump_json()))
+            self._bump_versions(conn, _scope_keys(team))
+        return team
+
+    def record_model(self, record: NegotiationRecord) -> NegotiationRecord:
+        return record
+
+    def encode_record(self, record: NegotiationRecord) -> bytes:
+        # 每次查询都重新解析出新对象,缓存无法命中,直接序列化
+        return record.model_dump_json().encode()
+
+    def get_storage_stats(self) -> Dict[str, int]:
+        with self._connection() as conn:
+            records, users, teams = conn.execute(SQL_COUNT_STORES).fetchone()
+        return {"records": records, "users": users, "teams": teams}
+
+    def get_data_version(self, scope_field: str, value: str) -> int:
+        with self._connection() as conn:
+            row = conn.execute(SQL_GET_VERSION, (f"{scope_field}:{value}",)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_versions(self, conn: sqlite3.Connection, keys: set):
+        """在写事务内递增版本号,其他worker读到的版本随提交一起可见"""
+        conn.executemany(SQL_BUMP_VERSION, [(key,) for key in keys])
+
+    # ===========================
+    # 谈判记录
+    # ===========================
+
+    def get_records(self, filter_dict: dict = None) -> List[NegotiationRecord]:
+        where, params, rest = _where(filter_dict)
+        records = self._query_records(f"SELECT data FROM records WHERE {where}", params)
+        if rest:
+            records = [r for r in records if _match(r, rest)]
+        return records
+
+    def get_records_in_range(self, scope: dict, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None,
+                             time_field: str = "created_at") -> List[NegotiationRecord]:
+        if time_field not in TIME_COLUMNS:
+            raise ValueError(f"不支持的时间字段: {time_field}")
+
+        where, params, rest = _where(scope)
+        if start is not None:
+            where += f" AND {time_field} >= ?"
+            params.append(_ts(start))
+        if end is not None:
+            where += f" AND {time_field} < ?"
+            params.append(_ts(end))
+
+        records = self._query_records(
+            f"SELECT data FROM records WHERE {where} ORDER BY {time_field}, record_id", params
+        )
+        if rest:
+            records = [r for r in records if _match(r, rest)]
+        return records
+
+    def get_earliest_record_time(self, scope: dict, time_field: str = "created_at") -> Optional[datetime]:
+        if time_field not in TIME_COLUMNS:
+            raise ValueError(f"不支持的时间字段: {time_field}")
+
+        where, params, rest = _where(scope)
+        if rest:
+            records = self.get_records_in_range(scope, time_field=time_field)
+            return getattr(records[0], time_field) if records else None
+
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT MIN({time_field}) FROM records WHERE {where}", params).fetchone()
+        return datetime.fromisoformat(row[0]) if row[0] else None
+
+    def get_records_page(self, filter_dict: dict, limit: int,
+                         before: Optional[Tuple[datetime, str]] = None
+                         ) -> Tuple[List[NegotiationRecord], Optional[Tuple[datetime, str]]]:
+        where, params, rest = _where(filter_dict)
+        if before is not None:
+            where += " AND (created_at, record_id) < (?, ?)"
+            params.extend([_ts(before[0]), before[1]])
+
+        sql = f"SELECT data FROM records WHERE {where} ORDER BY created_at DESC, record_id DESC"
+        if rest:
+            # 剩余条件只能在Python中过滤,无法下推LIMIT
+            page = [r for r in self._query_records(sql, params) if _match(r, rest)][:limit + 1]
+        else:
+            page = self._query_records(sql + " LIMIT ?", params + [limit + 1])
+
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            return page, (last.created_at, last.record_id)
+        return page, None
+
+    def get_record_by_id(self, record_id: str) -> Optional[NegotiationRecord]:
+        with self._connection() as conn:
+            row = conn.execute(SQL_GET_RECORD, (record_id,)).fetchone()
+        return NegotiationRecord.model_validate_json(row[0]) if row else None
+
+    def get_records_by_ids(self, record_ids: List[str]) -> Dict[str, NegotiationRecord]:
+        placeholders = ",".join("?" * len(record_ids))
+        records = self._query_records(f"SELECT data FROM records WHERE record_id IN ({placeholders})", list(record_ids))
+        return {record.record_id: record for record in records}
+
+    def create_record(self, record: NegotiationRecord) -> NegotiationRecord:
+        with self._transaction() as conn:
+            row = conn.execute(SQL_GET_RECORD, (record.record_id,)).fetchone()
+            old = NegotiationRecord.model_validate_json(row[0]) if row else None
+            conn.execute(SQL_UPSERT_RECORD, _record_row(record))
+            self._bump_versions(conn, _scope_keys(old, record))
+        return record
+
+    def create_records(self, records: List[NegotiationRecord]) -> List[NegotiationRecord]:
+        """批量写入,整批一个事务,版本号每个范围只递增一次"""
+        if not records:
+            return records
+        with self._transaction() as conn:
+            keys = _scope_keys(*records)
+            for record in records:
+                row = conn.execute(SQL_GET_RECORD, (record.record_id,)).fetchone()
+                if row:
+                    keys |= _scope_keys(NegotiationRecord.model_validate_json(row[0]))
+            conn.executemany(SQL_UPSERT_RECORD, [_record_row(record) for record in records])
+            self._bump_versions(conn, keys)
+        return records
+
+    @contextmanager
+    def _modify_record(self, record_id: str) -> Iterator[Optional[NegotiationRecord]]:
+        """在写事务内读出记录,修改后写回"""
+        with self._transaction() as conn:
+            row = conn.execute(SQL_GET_RECORD, (record_id,)).fetchone()
+            record = NegotiationRecord.model_validate_json(row[0]) if row else None
+            old_keys = _scope_keys(record)
+            yield record
+            if record is not None:
+                record.updated_at = datetime.now()
+                conn.execute(SQL_UPSERT_RECORD, _record_row(record))
+                self._bump_versions(conn, old_keys | _scope_keys(record))
+
+    def update_record(self, record_id: str, updates: dict) -> Optional[NegotiationRecord]:
+        with self._modify_record(record_id) as record:
+            if record is not None:
+                for key, value in updates.items():
+                    if hasattr(record, key) and value is not None:
+                        setattr(record, key, value)
+        return record
+
+    def add_record_todo(self, record_id: str, todo: TodoItem) -> Optional[NegotiationRecord]:
+        with self._modify_record(record_id) as record:
+            if record is not None:
+                record.todos.append(todo)
+        return record
+
+    def complete_record_todo(self, record_id: str, todo_index: int) -> Optional[NegotiationRecord]:
+        with self._modify_record(record_id) as record:
+            if record is not None:
+                todo = record.todos[todo_index]
+                todo.status = TodoStatus.COMPLETED
+                todo.completed_at = datetime.now()
+        return record
+
+    def get_member_stats(self, team_id: str, start: Optional[datetime] = None) -> Dict[str, MemberStats]:
+        # 多worker共享存储时进程内无法增量维护,按需从记录计算
+        return stats_from_records(self.get_records_in_range({"team_id": team_id}, start))
+
+    def search_records(self, filter_dict: dict, query: str,
+                       limit: int = 20) -> Tuple[List[str], List[Tuple[float, NegotiationRecord]]]:
+        """范围内记录临时建索引后检索(无常驻倒排索引)"""
+        terms = parse_query(query)
+        if not terms:
+            return terms, []
+        records = {record.record_id: record for record in self.get_records(filter_dict)}
+        index = RecordSearchIndex.from_records(records.values())
+        return terms, index.search(terms, {}, records.get, lambda record: True, limit)
+
+    def get_due_todos(self, filter_dict: dict, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      limit: int = 50) -> List[Tuple[datetime, NegotiationRecord, int]]:
+        """范围内记录临时建待办索引后查询"""
+        records = {record.record_id: record for record in self.get_records(filter_dict)}
+        index = TodoIndex.from_records(records.values())
+        keys = index.due(filter_dict, start, end, limit, lambda key: True)
+        return [(deadline, records[record_id], i) for deadline, record_id, i in keys]
+
+    def get_top_funders(self, scope_field: str, value: str,
+                        limit: Optional[int] = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        records = self.get_records({scope_field: value})
+        return FunderStatsIndex.from_records(records).top(scope_field, value, limit)
+
+    def get_department_analytics(self, department_id: str, start: datetime) -> Dict[str, Any]:
+        records = self.get_records({"department_id": department_id})
+        return ColumnarStore.from_records(records).department_analytics(department_id, start)
@@ -0,0 +1,258 @@
+"""
+合成数据生成器
+按随机种子确定性地生成组织架构(部门、团队、用户)和谈判记录,用于规模测试和性能基准
+记录以生成器方式产出,千万级规模也无需一次性放入内存;同一种子和参数两次生成的数据完全一致
+"""
+
+from models import (
+    User, Team, Role, NegotiationRecord, VisitType, NegotiationScene, NegotiationOutcome,
+    TodoItem, TodoStatus, NegotiationMetrics, Participant
+)
+import database
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+import random
+import uuid
+
+
+# 默认规模与分布参数
+SYNTHETIC_SEED = 20240101
+RECORDS_PER_USER = 200          # 用户数 ≈ 记录数 / 该值
+MIN_USERS = 10
+MAX_USERS = 50000
+TEAM_SIZE = 8                   # 每组人数(含组长)
+TEAMS_PER_DEPARTMENT = 10
+FUNDER_POOL_SIZE = 2000         # 资方池大小(按 Zipf 分布被拜访,头部资方占大多数记录)
+FUNDER_ZIPF_S = 1.1
+USER_ACTIVITY_SKEW = 1.5        # 用户活跃度的帕累托形状参数,越小越集中
+HISTORY_DAYS = 730              # 记录创建时间分布在最近两年
+METRICS_RATIO = 0.6             # 带商务指标的记录占比
+
+VISIT_TYPE_WEIGHTS = ((VisitType.VISIT, 5), (VisitType.PHONE, 3), (VisitType.NEGOTIATION, 2))
+SCENE_WEIGHTS = (
+    (NegotiationScene.COST, 30), (NegotiationScene.DEPOSIT, 25), (NegotiationScene.RISK, 15),
+    (NegotiationScene.COMPLIANCE, 10), (NegotiationScene.VOLUME, 12), (NegotiationScene.ICEBREAKING, 8)
+)
+OUTCOME_WEIGHTS = (
+    (NegotiationOutcome.SUCCESS, 45), (NegotiationOutcome.IN_PROGRESS, 35), (NegotiationOutcome.FAILED, 20)
+)
+
+_SURNAMES = "李王张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕苏卢蒋蔡贾丁魏薛叶阎"
+_CITIES = ("北京", "上海", "深圳", "杭州", "南京", "成都", "重庆", "武汉", "西安", "苏州",
+           "天津", "长沙", "郑州", "青岛", "宁波", "厦门", "合肥", "福州", "济南", "昆明")
+_FUNDER_BRANDS = ("华信", "中泰", "海通", "恒丰", "安盛", "众联", "富民", "长江", "金桥", "汇通",
+                  "兴业", "广源", "瑞丰", "晋商", "鼎盛", "新网", "锦程", "通商", "盛京", "渤海")
+_FUNDER_KINDS = ("银行", "农商银行", "消费金融", "信托", "村镇银行", "小贷公司")
+
+_OBJECTIVES = {
+    NegotiationScene.COST: ("争取资金成本从{a}%降至{b}%", "维持现有资金成本{a}%不上调"),
+    NegotiationScene.DEPOSIT: ("争取保证金比例从{a}%降至{b}%", "推动阶梯式保证金方案落地"),
+    NegotiationScene.RISK: ("回应对方对M3+逾期率的质疑", "说明风控模型迭代效果,稳定合作预期"),
+    NegotiationScene.COMPLIANCE: ("澄清联合贷模式的合规要求", "确认新规下的合作模式调整方案"),
+    NegotiationScene.VOLUME: ("敲定下季度{c}万元业务量承诺", "争取提高授信额度至{c}万元"),
+    NegotiationScene.ICEBREAKING: ("首次拜访,了解对方合作意向", "介绍平台资产情况,争取准入"),
+}
+_KEY_POINTS = (
+    "资金使用效率", "历史资产表现", "同业报价对比", "逾期率走势", "监管政策变化", "审批通过率",
+    "放款时效", "风险共担比例", "数据透明度", "客群质量", "额度调整节奏", "合作年限"
+)
+_OUR_POSITIONS = ("坚持{b}%,可接受阶梯式调整", "以业务量换价格,承诺{c}万元", "先小规模试点再扩大合作")
+_THEIR_POSITIONS = ("风险评审要求不低于{a}%", "需要看到连续3个月的资产表现", "总行额度紧张,暂不调整")
+_RESULTS = {
+    NegotiationOutcome.SUCCESS: ("同意按{b}%执行,下月生效", "达成一致,签署补充协议"),
+    NegotiationOutcome.IN_PROGRESS: ("对方需内部上会讨论", "初步认可方案,待补充材料"),
+    NegotiationOutcome.FAILED: ("对方坚持原条件,暂未达成一致", "额度收紧,本季度不再调整"),
+}
+_SCENE_LABELS = {
+    NegotiationScene.COST: "资金成本", NegotiationScene.DEPOSIT: "保证金", NegotiationScene.RISK: "风险",
+    NegotiationScene.COMPLIANCE: "合规", NegotiationScene.VOLUME: "业务量", NegotiationScene.ICEBREAKING: "破冰",
+}
+_TODOS = ("准备资产表现报告", "发送合作协议修订版", "安排风控团队对接", "补充历史逾期数据", "预约下次拜访")
+
+
+def _pick(rnd: random.Random, weighted) -> object:
+    values, weights = zip(*weighted)
+    return rnd.choices(values, weights)[0]
+
+
+class SyntheticDataset:
+    """
+    合成数据集
+
+    Args:
+        n_records: 记录数(10^3 ~ 10^7)
+        seed: 随机种子
+        end: 记录时间分布的截止时间,默认当前时间(需要完全可复现时传入固定值)
+    """
+
+    def __init__(self, n_records: int, seed: int = SYNTHETIC_SEED, end: Optional[datetime] = None):
+        self.n_records = n_records
+        self.seed = seed
+        self.end = end or datetime.now()
+        self.teams: List[Team] = []
+        self.users: List[User] = []
+        self.employees: List[User] = []     # 产生记录的一线人员(组员和组长)
+        self.funders: List[str] = []
+        self._build_organization()
+
+    def _build_organization(self):
+        rnd = random.Random(self.seed)
+        n_users = min(max(self.n_records // RECORDS_PER_USER, MIN_USERS), MAX_USERS)
+        n_teams = max(1, n_users // TEAM_SIZE)
+        n_departments = max(1, -(-n_teams // TEAMS_PER_DEPARTMENT))
+
+        def name(suffix: str) -> str:
+            return rnd.choice(_SURNAMES) + suffix
+
+        uid = 0
+
+        def next_user_id() -> str:
+            nonlocal uid
+            uid += 1
+            return f"U{uid:06d}"
+
+        directors = {}
+        for d in range(n_departments):
+            department_id = f"dept_{d + 1:03d}"
+            director = User(user_id=next_user_id(), name=name("总"), role=Role.DIRECTOR,
+                            team_id=department_id, department_id=department_id, manager_id=None)
+            directors[department_id] = director
+            self.users.append(director)
+
+        for t in range(n_teams):
+            team_id = f"team_{t + 1:04d}"
+            department_id = f"dept_{t // TEAMS_PER_DEPARTMENT + 1:03d}"
+            leader = User(user_id=next_user_id(), name=name("组长"), role=Role.TEAM_LEADER,
+                          team_id=team_id, department_id=department_id,
+                          manager_id=directors[department_id].user_id)
+            members = [leader]
+            for _ in range(TEAM_SIZE - 1):
+                members.append(User(user_id=next_user_id(), name=name("商务"), role=Role.EMPLOYEE,
+                                    team_id=team_id, department_id=department_id,
+                                    manager_id=leader.user_id))
+            self.teams.append(Team(team_id=team_id, team_name=f"资金商务{t + 1}组", leader_id=leader.user_id,
+                                   department_id=department_id, members=[m.user_id for m in members]))
+            self.users.extend(members)
+            self.employees.extend(members)
+
+        # 资方名称: 城市 + 字号 + 机构类型,打乱后取前 FUNDER_POOL_SIZE 个,排名越靠前越常被拜访
+        funders = [city + brand + kind for city in _CITIES for brand in _FUNDER_BRANDS for kind in _FUNDER_KINDS]
+        rnd.shuffle(funders)
+        self.funders = funders[:FUNDER_POOL_SIZE]
+
+        # 活跃度和资方热度的累积权重,供 choices(cum_weights=...) 使用
+        self._user_weights = self._cumulative(rnd.paretovariate(USER_ACTIVITY_SKEW) for _ in self.employees)
+        self._funder_weights = self._cumulative(1 / (rank ** FUNDER_ZIPF_S) for rank in range(1, len(self.funders) + 1))
+
+    @staticmethod
+    def _cumulative(weights) -> List[float]:
+        total = 0.0
+        cumulative = []
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        return cumulative
+
+    @property
+    def departments(self) -> List[str]:
+        return sorted({team.department_id for team in self.teams})
+
+    def records(self) -> Iterator[NegotiationRecord]:
+        """按创建时间无序地逐条生成记录(每次调用从头开始,结果一致)"""
+        rnd = random.Random(self.seed + 1)
+        for _ in range(self.n_records):
+            yield self._record(rnd)
+
+    def batches(self, size: int = 1000) -> Iterator[List[NegotiationRecord]]:
+        batch = []
+        for record in self.records():
+            batch.append(record)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _record(self, rnd: random.Random) -> NegotiationRecord:
+        user = rnd.choices(self.employees, cum_weights=self._user_weights)[0]
+        funder = rnd.choices(self.funders, cum_weights=self._funder_weights)[0]
+        scene = _pick(rnd, SCENE_WEIGHTS)
+        outcome = _pick(rnd, OUTCOME_WEIGHTS)
+        created_at = self.end - timedelta(seconds=rnd.random() * HISTORY_DAYS * 86400)
+        visit_date = created_at - timedelta(seconds=rnd.random() * 3 * 86400)
+
+        a = round(rnd.uniform(5, 12), 1)
+        b = round(a - rnd.uniform(0.5, 3), 1)
+        c = rnd.randrange(500, 20000, 100)
+        text = {"a": a, "b": b, "c": c}
+
+        metrics = None
+        if rnd.random() < METRICS_RATIO:
+            deposit_before = round(rnd.uniform(5, 12), 1)
+            metrics = NegotiationMetrics(
+                cost_before=a,
+                cost_after=b if outcome == NegotiationOutcome.SUCCESS else a,
+                deposit_before=deposit_before,
+                deposit_after=round(deposit_before - rnd.uniform(0, 3), 1),
+                volume_commitment=float(c)
+            )
+
+        todos = []
+        for _ in range(rnd.choice((0, 0, 1, 1, 2, 3))):
+            done = rnd.random() < 0.5
+            deadline = created_at + timedelta(days=rnd.randint(3, 30))
+            todos.append(TodoItem(
+                content=rnd.choice(_TODOS),
+                status=TodoStatus.COMPLETED if done else TodoStatus.PENDING,
+                deadline=deadline,
+                created_at=created_at,
+                completed_at=deadline - timedelta(days=rnd.randint(0, 3)) if done else None
+            ))
+
+        result = rnd.choice(_RESULTS[outcome]).format(**text)
+        return NegotiationRecord(
+            record_id=str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+            user_id=user.user_id,
+            user_name=user.name,
+            team_id=user.team_id,
+            department_id=user.department_id,
+            funder_name=funder,
+            visit_type=_pick(rnd, VISIT_TYPE_WEIGHTS),
+            visit_date=visit_date,
+            scene=scene,
+            objective=rnd.choice(_OBJECTIVES[scene]).format(**text),
+            key_points=rnd.sample(_KEY_POINTS, rnd.randint(1, 4)),
+            our_position=rnd.choice(_OUR_POSITIONS).format(**text),
+            their_position=rnd.choice(_THEIR_POSITIONS).format(**text),
+            result=result,
+            metrics=metrics,
+            outcome=outcome,
+            score=rnd.randint(1, 5) if outcome != NegotiationOutcome.IN_PROGRESS else None,
+            todos=todos,
+            minutes=f"{funder}{_SCENE_LABELS[scene]}沟通: {result}",
+            participants=[
+                Participant(name=user.name, role="商务", company="我方", is_our_side=True),
+                Participant(name=rnd.choice(_SURNAMES) + "经理", role="合作负责人", company=funder, is_our_side=False)
+            ],
+            created_at=created_at,
+            updated_at=created_at
+        )
+
+
+
+def load_dataset(dataset: SyntheticDataset, batch_size: int = 1000) -> Tuple[int, int, int]:
+    """
+    将数据集写入当前存储(团队、用户、记录批量写入)
+
+    Returns:
+        (团队数, 用户数, 记录数)
+    """
+    for team in dataset.teams:
+        database.create_team(team)
+    for user in dataset.users:
+        database.create_user(user)
+    count = 0
+    for batch in dataset.batches(batch_size):
+        database.create_records(batch)
+        count += len(batch)
+    return len(dataset.teams), len(dataset.users), count
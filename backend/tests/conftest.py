@@ -0,0 +1,8 @@
+"""
+单元测试公共配置: 以 backend 目录为模块搜索路径(与 benchmarks 一致)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
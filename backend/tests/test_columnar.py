@@ -0,0 +1,79 @@
+"""
+列式镜像: 记录移出后死行被压缩回收,统计结果与只含存活记录的镜像一致
+"""
+
+from datetime import datetime, timedelta
+
+from columnar import ColumnarStore
+from models import NegotiationMetrics, NegotiationOutcome, NegotiationRecord, NegotiationScene, VisitType
+
+
+NOW = datetime(2026, 10, 1, 12, 0)
+SCENES = list(NegotiationScene)
+OUTCOMES = list(NegotiationOutcome)
+
+
+def _record(i: int, **update) -> NegotiationRecord:
+    record = NegotiationRecord(
+        record_id=f"r{i:04d}", user_id=f"U{i % 7:03d}", user_name=f"成员{i % 7}", team_id=f"team_{i % 3:03d}",
+        department_id="dept_001", funder_name=f"资方{i % 11}", visit_type=VisitType.VISIT,
+        visit_date=NOW - timedelta(days=i % 40), scene=SCENES[i % len(SCENES)], objective="测试",
+        outcome=OUTCOMES[i % len(OUTCOMES)],
+        metrics=NegotiationMetrics(cost_before=8.0, cost_after=8.0 - (i % 5) * 0.1, volume_commitment=100.0 + i)
+    )
+    return record.model_copy(update={"created_at": NOW - timedelta(days=i % 40), **update})
+
+
+def test_removed_rows_are_compacted():
+    store = ColumnarStore(capacity=16)
+    records = [_record(i) for i in range(200)]
+    for record in records:
+        store.add(record)
+    for record in records[:150]:
+        store.remove(record)
+
+    live = records[150:]
+    start = NOW - timedelta(days=30)
+    assert store.department_analytics("dept_001", start) == \
+        ColumnarStore.from_records(live).department_analytics("dept_001", start)
+
+    assert store.size == len(live)
+    assert store.dead == 0
+    assert list(store.rows) == [record.record_id for record in live]
+    assert len(store.columns["alive"]) < 200
+
+
+def test_compaction_before_growth_keeps_write_order():
+    store = ColumnarStore(capacity=16)
+    records = [_record(i) for i in range(16)]
+    for record in records:
+        store.add(record)
+    for record in records[:10]:
+        store.remove(record)
+
+    # 已满且死行过半: 压缩代替扩容
+    extra = [_record(i) for i in range(100, 104)]
+    for record in extra:
+        store.add(record)
+
+    assert len(store.columns["alive"]) == 16
+    assert list(store.rows) == [record.record_id for record in records[10:] + extra]
+
+
+def test_update_revives_row_in_place():
+    store = ColumnarStore(capacity=16)
+    records = [_record(i) for i in range(10)]
+    for record in records:
+        store.add(record)
+
+    # 修改: 先 remove(旧值) 再 add(新值),行号不变,不计为死行
+    updated = records[3].model_copy(update={"outcome": NegotiationOutcome.SUCCESS})
+    store.remove(records[3])
+    store.add(updated)
+
+    assert store.dead == 0
+    assert store.rows[updated.record_id] == 3
+    records[3] = updated
+    start = NOW - timedelta(days=30)
+    assert store.department_analytics("dept_001", start) == \
+        ColumnarStore.from_records(records).department_analytics("dept_001", start)
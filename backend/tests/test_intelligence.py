@@ -0,0 +1,72 @@
+"""
+资方内参报告缓存: 并发未命中只查询一次(single-flight),部分报告不缓存
+"""
+
+import asyncio
+from typing import Any, Dict
+
+from intelligence import ReportAssembler, ReportCache, SectionProvider, local_providers
+
+
+class CountingProvider(SectionProvider):
+    """包装数据源并统计调用次数,被包装的数据源本身不做计数"""
+
+    def __init__(self, inner: SectionProvider):
+        super().__init__(inner.timeout_seconds)
+        self.inner = inner
+        self.section = inner.section
+        self.fallback = inner.fallback
+        self.calls = 0
+
+    async def fetch(self, funder_name: str) -> Dict[str, Any]:
+        self.calls += 1
+        return await self.inner.fetch(funder_name)
+
+
+class FailingProvider(SectionProvider):
+    section = "broken"
+    fallback = {"broken": None}
+
+    async def fetch(self, funder_name: str) -> Dict[str, Any]:
+        raise RuntimeError("数据源不可用")
+
+
+def _cache() -> ReportCache:
+    return ReportCache(cacheable=lambda report: report["complete"])
+
+
+def test_concurrent_misses_query_sources_once():
+    providers = [CountingProvider(provider) for provider in local_providers()]
+    assembler = ReportAssembler(providers)
+    cache = _cache()
+
+    async def run():
+        load = lambda: assembler.fetch_report("测试银行")
+        return await asyncio.gather(*(cache.get("测试银行", load) for _ in range(20)))
+
+    reports = asyncio.run(run())
+
+    assert all(report == reports[0] for report in reports)
+    assert reports[0]["complete"]
+    assert [provider.calls for provider in providers] == [1] * len(providers)
+    assert len(cache) == 1
+
+
+def test_partial_report_is_not_cached():
+    provider = CountingProvider(FailingProvider())
+    assembler = ReportAssembler([provider])
+    cache = _cache()
+
+    async def run():
+        load = lambda: assembler.fetch_report("测试银行")
+        first = await cache.get("测试银行", load)
+        second = await cache.get("测试银行", load)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert not first["complete"]
+    assert first["sections"]["broken"]["status"] == "error"
+    assert second["broken"] is None
+    assert provider.calls == 2
+    assert len(cache) == 0
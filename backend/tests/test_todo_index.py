@@ -0,0 +1,72 @@
+"""
+待办截止时间索引: 带时区与不带时区的截止时间混在同一范围内
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from models import NegotiationRecord, TodoItem, TodoStatus
+from todo_index import TodoIndex
+
+
+EAST8 = timezone(timedelta(hours=8))
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+def _record(i: int, deadline: datetime, user_id: str = "U001") -> NegotiationRecord:
+    record = NegotiationRecord(
+        record_id=f"r{i:03d}", user_id=user_id, user_name="测试", team_id="team_001",
+        department_id="dept_001", funder_name="测试银行", visit_type="visit", visit_date=NOW,
+        scene="cost", objective="测试"
+    )
+    todo = TodoItem(content=f"待办{i}", status=TodoStatus.PENDING, created_at=NOW)
+    # model_copy 不经过校验,带时区的截止时间原样进入记录,由索引统一换算
+    return record.model_copy(update={"todos": [todo.model_copy(update={"deadline": deadline})]})
+
+
+def _mixed_records():
+    records = []
+    for i in range(40):
+        deadline = NOW + timedelta(hours=i - 20)
+        if i % 2:
+            deadline = deadline.astimezone(EAST8)
+        records.append(_record(i, deadline, "U001" if i % 3 else "U002"))
+    return records
+
+
+def test_due_mixed_timezones_single_scope():
+    index = TodoIndex.from_records(_mixed_records())
+
+    due = index.due({"team_id": "team_001"}, None, NOW + timedelta(days=1), 100, lambda key: True)
+
+    assert len(due) == 40
+    assert all(deadline.tzinfo is None for deadline, _, _ in due)
+    assert [key[0] for key in due] == sorted(key[0] for key in due)
+
+
+def test_due_mixed_timezones_with_scope_check():
+    records = _mixed_records()
+    owners = {record.record_id: record.user_id for record in records}
+    index = TodoIndex.from_records(records)
+
+    due = index.due({"team_id": "team_001", "user_id": "U002"}, NOW - timedelta(hours=5), NOW, 100,
+                    lambda key: owners[key[1]] == "U002")
+
+    expected = sorted(
+        (NOW + timedelta(hours=i - 20), f"r{i:03d}", 0)
+        for i in range(40) if i % 3 == 0 and -5 <= i - 20 < 0
+    )
+    assert due == expected
+
+
+def test_validated_deadline_is_converted():
+    todo = TodoItem(content="带时区", deadline=datetime(2026, 10, 1, 20, 0, tzinfo=EAST8))
+    assert todo.deadline.tzinfo is None
+    assert todo.deadline == datetime(2026, 10, 1, 20, 0, tzinfo=EAST8).astimezone().replace(tzinfo=None)
+
+
+def test_remove_mixed_timezone_entry():
+    records = _mixed_records()
+    index = TodoIndex.from_records(records)
+    for record in records:
+        index.remove(record)
+    assert index.entries == {}
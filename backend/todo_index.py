@@ -0,0 +1,100 @@
+"""
+待办截止时间索引
+按范围(user_id/team_id/department_id)维护未完成且设置了截止时间的待办,按截止时间升序排列;
+逾期/即将到期查询二分定位区间后顺序读取前 k 条,O(log n + k),不再遍历每条记录的 todos
+作为记录观察者注册: 追加、完成待办都通过整条记录替换(remove 旧记录 / add 新记录)同步到索引
+"""
+
+from models import NegotiationRecord, TodoStatus, to_local_naive
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import bisect
+
+
+# 建索引的范围字段,查询时取最具体的一个(其余条件逐条校验)
+SCOPE_FIELDS = ("user_id", "team_id", "department_id")
+
+# 索引条目: (截止时间, 记录ID, 待办在记录 todos 中的下标)
+TodoKey = Tuple[datetime, str, int]
+
+
+def pending_deadlines(record: NegotiationRecord) -> Iterator[TodoKey]:
+    """记录中未完成且有截止时间的待办;截止时间统一为本地无时区时间,带时区与不带时区的可在同一列表中比较"""
+    for i, todo in enumerate(record.todos):
+        if todo.status == TodoStatus.PENDING and todo.deadline is not None:
+            yield (to_local_naive(todo.deadline), record.record_id, i)
+
+
+class TodoIndex:
+    """(范围字段, 字段值) -> 待办条目(按截止时间升序的有序列表,首个即最早到期)"""
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, Any], List[TodoKey]] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[NegotiationRecord]) -> "TodoIndex":
+        """从记录批量构建(无增量索引的存储后端使用)"""
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    def add(self, record: NegotiationRecord):
+        keys = list(pending_deadlines(record))
+        if not keys:
+            return
+        for field in SCOPE_FIELDS:
+            entries = self.entries.setdefault((field, getattr(record, field)), [])
+            for key in keys:
+                bisect.insort(entries, key)
+
+    def remove(self, record: NegotiationRecord):
+        keys = list(pending_deadlines(record))
+        if not keys:
+            return
+        for field in SCOPE_FIELDS:
+            scope = (field, getattr(record, field))
+            entries = self.entries.get(scope)
+            if not entries:
+                continue
+            for key in keys:
+                pos = bisect.bisect_left(entries, key)
+                if pos < len(entries) and entries[pos] == key:
+                    entries.pop(pos)
+            if not entries:
+                del self.entries[scope]
+
+    def clear(self):
+        self.entries.clear()
+
+    def due(self, scope: dict, start: Optional[datetime], end: Optional[datetime], limit: int,
+            accept: Callable[[TodoKey], bool]) -> List[TodoKey]:
+        """
+        截止时间在 [start, end) 内的未完成待办,按截止时间升序
+
+        Args:
+            scope: 范围条件,至少包含 user_id/team_id/department_id 之一
+            start: 截止时间下限(含),None表示不限
+            end: 截止时间上限(不含),None表示不限
+            limit: 返回条数
+            accept: scope 中其余条件的校验(只有一个条件时不调用)
+        """
+        field = next((field for field in SCOPE_FIELDS if field in scope), None)
+        if field is None:
+            raise ValueError("待办查询需要指定 user_id/team_id/department_id 之一")
+
+        entries = self.entries.get((field, scope[field]), [])
+        lo = bisect.bisect_left(entries, (start,)) if start is not None else 0
+        hi = bisect.bisect_left(entries, (end,)) if end is not None else len(entries)
+        if len(scope) == 1:
+            return entries[lo:min(hi, lo + limit)]
+
+        results = []
+        for pos in range(lo, hi):
+            key = entries[pos]
+            if accept(key):
+                results.append(key)
+                if len(results) == limit:
+                    break
+        return results
+
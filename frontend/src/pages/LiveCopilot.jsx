@@ -1,7 +1,11 @@
 import React, { useState, useRef, useEffect } from 'react';
+import { useAuth } from '../context/AuthContext';
 import './LiveCopilot.css';
 
+const COPILOT_WS_URL = 'ws://localhost:8000/api/realtime/ws';
+
 function LiveCopilot() {
+  const { token } = useAuth();
   const [conversationLog, setConversationLog] = useState([]);
   const [currentInput, setCurrentInput] = useState('');
   const [recommendations, setRecommendations] = useState([]);
@@ -10,6 +14,49 @@ function LiveCopilot() {
   const [transcribing, setTranscribing] = useState(false);
   const [transcriptText, setTranscriptText] = useState('');
   const conversationEndRef = useRef(null);
+  const socketRef = useRef(null);
+  const sessionIdRef = useRef(null);
+
+  // 实时会话: 一场谈判一条WebSocket连接,服务端保留对话上下文并推送话术推荐
+  useEffect(() => {
+    if (!token) {
+      return undefined;
+    }
+
+    const params = new URLSearchParams({ token });
+    if (sessionIdRef.current) {
+      params.set('session_id', sessionIdRef.current);
+    }
+    const socket = new WebSocket(`${COPILOT_WS_URL}?${params}`);
+
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'session') {
+        sessionIdRef.current = message.session_id;
+      } else if (message.type === 'recommendations') {
+        setRecommendations(message.data);
+        setLoading(false);
+      }
+    };
+    socket.onclose = () => {
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+      }
+    };
+    socketRef.current = socket;
+
+    return () => socket.close();
+  }, [token]);
+
+  // 通过会话发送转写片段,连接不可用时返回false
+  const sendFragment = (speaker, text) => {
+    const socket = socketRef.current;
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+      return false;
+    }
+    socket.send(JSON.stringify({ type: 'fragment', speaker, text, final: true }));
+    return true;
+  };
 
   // 自动滚动到最新对话
   useEffect(() => {
@@ -31,6 +78,12 @@ function LiveCopilot() {
 
     // 添加到对话记录
     setConversationLog([...conversationLog, newMessage]);
+
+    if (sendFragment('opponent', currentInput)) {
+      setCurrentInput('');
+      return;
+    }
+
     setLoading(true);
 
     try {
@@ -68,6 +121,7 @@ function LiveCopilot() {
       timestamp: new Date().toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit' })
     };
 
+    sendFragment('self', script.content);
     setConversationLog([...conversationLog, newMessage]);
     setRecommendations([]);
   };
@@ -82,6 +136,7 @@ function LiveCopilot() {
         content: customReply,
         timestamp: new Date().toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit' })
       };
+      sendFragment('self', customReply);
       setConversationLog([...conversationLog, newMessage]);
       setRecommendations([]);
     }